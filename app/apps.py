@@ -8,5 +8,6 @@ class AppConfig(AppConfig):
     def ready(self) -> None:
         from .background.task_signal import task_signal
         from .background.task_handler import task_handler
+        from . import signals  # noqa: F401
 
         task_signal.connect(task_handler)
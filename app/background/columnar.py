@@ -0,0 +1,74 @@
+import io
+from typing import List, Mapping
+
+from django.conf import settings
+
+# pyarrow is optional, the reports are written only as csv without it
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# media type of each columnar format of the reports, as negotiated by get_report
+COLUMNAR_MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+
+def get_columnar_formats() -> List[str]:
+    """Columnar formats written for each report, none when pyarrow is not installed."""
+    if pyarrow is None:
+        return []
+    return [
+        name.strip()
+        for name in settings.REPORT_COLUMNAR_FORMATS.split(",")
+        if name.strip() in COLUMNAR_MEDIA_TYPES
+    ]
+
+
+def build_report_table(columns: Mapping[str, List]) -> "pyarrow.Table":
+    """Arrow table of the report columns, the store id as a string and the rest as 64-bit integers."""
+    (store_id_name, store_ids), *values = columns.items()
+    return pyarrow.table(
+        {
+            store_id_name: pyarrow.array(store_ids, type=pyarrow.string()),
+            **{name: pyarrow.array(column, type=pyarrow.int64()) for name, column in values},
+        }
+    )
+
+
+def read_report_table(csv_data: str, column_names: List[str]) -> "pyarrow.Table":
+    """Arrow table of a report csv, for the reports joined from the csv rows of their chunks."""
+    return pyarrow.csv.read_csv(
+        io.BytesIO(csv_data.encode()),
+        convert_options=pyarrow.csv.ConvertOptions(
+            column_types={
+                name: pyarrow.string() if position == 0 else pyarrow.int64()
+                for position, name in enumerate(column_names)
+            }
+        ),
+    )
+
+
+def write_columnar_files(table: "pyarrow.Table") -> Mapping[str, bytes]:
+    """Serialize the table in every columnar format written for the reports."""
+    return {format: write_columnar_file(table, format) for format in get_columnar_formats()}
+
+
+def write_columnar_file(table: "pyarrow.Table", format: str) -> bytes:
+    """Serialize the table as a zstd compressed Parquet file or Arrow IPC file."""
+    sink = pyarrow.BufferOutputStream()
+    if format == "parquet":
+        pyarrow.parquet.write_table(table, sink, compression="zstd")
+    elif format == "arrow":
+        with pyarrow.ipc.new_file(
+            sink, table.schema, options=pyarrow.ipc.IpcWriteOptions(compression="zstd")
+        ) as writer:
+            writer.write_table(table)
+    else:
+        raise ValueError(f"Unknown columnar format: {format}")
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,139 @@
+import datetime
+import random
+import uuid
+from typing import Iterator, List, Mapping, Optional, Tuple
+
+from django.conf import settings
+
+from app.models import (
+    PollWatermark,
+    Store,
+    StoreDailyRollup,
+    StoreHours,
+    StoreSchedule,
+    StoreStatus,
+)
+
+# timezones of the stores of data/store_timezones.csv
+FLEET_TIMEZONES = [
+    "America/Chicago",
+    "America/New_York",
+    "America/Denver",
+    "America/Los_Angeles",
+    "America/Boise",
+]
+# shapes of the business hours of a synthetic fleet
+# "all_day" stores are open all day, "business" stores from 9 to 17 every day,
+# "mixed" fleets have a third of the stores open all day and the rest with hours of their own on each day
+HOURS_SHAPES = ["all_day", "business", "mixed"]
+
+
+def generate_store_hours(
+    rng: random.Random, shape: str
+) -> Optional[List[Tuple[datetime.time, datetime.time]]]:
+    """Business hours of each week day of a synthetic store, None when it is open all day."""
+    if shape == "all_day" or (shape == "mixed" and rng.random() < 1 / 3):
+        return None
+    if shape == "business":
+        return [(datetime.time(9), datetime.time(17))] * 7
+    return [
+        (
+            datetime.time(rng.randint(5, 11), rng.choice((0, 30))),
+            datetime.time(rng.randint(17, 22), rng.choice((0, 30))),
+        )
+        for _ in range(7)
+    ]
+
+
+def iter_store_polls(
+    rng: random.Random,
+    store_pk: str,
+    since: datetime.datetime,
+    until: datetime.datetime,
+    poll_interval: datetime.timedelta,
+    uptime: float,
+) -> Iterator[StoreStatus]:
+    """Polls of a synthetic store every poll interval, with some jitter, active with the given probability."""
+    timestamp = since + poll_interval * rng.random()
+    while timestamp <= until:
+        # the jitter stays under half the interval, so the timestamps of a store never collide
+        jitter = poll_interval * (rng.random() - 0.5) * 0.5
+        yield StoreStatus(
+            store_id=store_pk,
+            timestamp_utc=min(timestamp + jitter, until),
+            status=(
+                StoreStatus.Status.ACTIVE
+                if rng.random() < uptime
+                else StoreStatus.Status.INACTIVE
+            ),
+        )
+        timestamp += poll_interval
+
+
+def clear_fleet() -> None:
+    """Delete every store and poll, the fleets of the benchmarks are written to an empty database."""
+    for model in (StoreStatus, StoreDailyRollup, StoreSchedule, StoreHours, Store, PollWatermark):
+        model.objects.all().delete()
+
+
+def create_fleet(
+    stores: int,
+    until: datetime.datetime,
+    timezones: Optional[List[str]] = None,
+    hours_shape: str = "mixed",
+    poll_interval: datetime.timedelta = datetime.timedelta(hours=1),
+    uptime: float = 0.9,
+    days: int = 8,
+    seed: int = 0,
+) -> Mapping[str, int]:
+    """
+    Write a synthetic fleet of stores polled for the given days up to the given time,
+    the same fleet for the same arguments. Returns the number of stores and polls written.
+    """
+    if hours_shape not in HOURS_SHAPES:
+        raise ValueError(f"unknown hours shape {hours_shape!r}")
+    rng = random.Random(seed)
+    timezones = timezones or FLEET_TIMEZONES
+    batch_size = settings.POLL_INGEST_BATCH_SIZE
+    since = until - datetime.timedelta(days=days)
+    polls: List[StoreStatus] = list()
+    poll_count = 0
+    for start in range(0, stores, batch_size):
+        fleet = [
+            Store(
+                id=str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                store_id=f"bench-{number:06d}",
+                timezone=rng.choice(timezones),
+            )
+            for number in range(start, min(start + batch_size, stores))
+        ]
+        Store.objects.bulk_create(fleet)
+        store_hours: List[StoreHours] = list()
+        for store in fleet:
+            hours = generate_store_hours(rng, hours_shape)
+            store_hours.extend(
+                StoreHours(store=store, day_of_week=day)
+                if hours is None
+                else StoreHours(
+                    store=store,
+                    day_of_week=day,
+                    start_time_local=hours[day][0],
+                    end_time_local=hours[day][1],
+                )
+                for day in range(7)  # 7 days in a week
+            )
+        StoreHours.objects.bulk_create(store_hours, batch_size=batch_size)
+        for store in fleet:
+            store_uptime = min(max(rng.gauss(uptime, 0.05), 0.0), 1.0)
+            for poll in iter_store_polls(rng, store.id, since, until, poll_interval, store_uptime):
+                polls.append(poll)
+                if len(polls) >= batch_size:
+                    StoreStatus.objects.bulk_create(polls)
+                    poll_count += len(polls)
+                    polls = list()
+    if polls:
+        StoreStatus.objects.bulk_create(polls)
+        poll_count += len(polls)
+    # bulk inserts do not send post_save, the watermark is set once for the fleet
+    PollWatermark.objects.update_or_create(pk=1, defaults={"timestamp_utc": until})
+    return {"stores": stores, "polls": poll_count}
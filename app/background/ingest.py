@@ -0,0 +1,142 @@
+import codecs
+import csv
+import datetime
+import itertools
+import json
+from typing import Iterable, Iterator, List, Literal, Mapping, Optional, Set, Tuple
+
+from django.db import connection
+
+from app.models import Store, StoreDailyRollup, StoreHours, StoreStatus
+
+from .utils import parse_utc_timestamp
+
+# poll = (store_id, timestamp_utc, status)
+Poll = Tuple[str, datetime.datetime, int]
+
+
+def parse_status(status: str) -> int:
+    """Status of a poll, given either as its label or as its stored integer."""
+    statuses = {label: value for value, label in StoreStatus.Status.choices}
+    status = str(status).strip().lower()
+    if status in statuses:
+        return statuses[status]
+    if status.isdigit() and int(status) in statuses.values():
+        return int(status)
+    raise ValueError(f"unknown status {status!r}")
+
+
+def iter_csv_polls(lines: Iterable[str]) -> Iterator[Poll]:
+    """Parse CSV lines with the store_id, status and timestamp_utc columns of data/store_status.csv."""
+    for line_number, row in enumerate(csv.DictReader(lines), start=2):
+        try:
+            yield (
+                row["store_id"].strip(),
+                parse_utc_timestamp(row["timestamp_utc"]),
+                parse_status(row["status"]),
+            )
+        except (KeyError, AttributeError, ValueError) as error:
+            raise ValueError(f"invalid poll on line {line_number}: {error}") from error
+
+
+def iter_ndjson_polls(lines: Iterable[str]) -> Iterator[Poll]:
+    """Parse newline delimited JSON objects with the store_id, status and timestamp_utc keys."""
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            poll = json.loads(line)
+            yield (
+                str(poll["store_id"]).strip(),
+                parse_utc_timestamp(poll["timestamp_utc"]),
+                parse_status(poll["status"]),
+            )
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"invalid poll on line {line_number}: {error}") from error
+
+
+POLL_PARSERS = {
+    "csv": iter_csv_polls,
+    "ndjson": iter_ndjson_polls,
+}
+
+
+def iter_polls(stream: Iterable[bytes], format: Literal["csv", "ndjson"]) -> Iterator[Poll]:
+    """Parse the polls of a binary stream or its lines one by one, without reading it whole."""
+    if format not in POLL_PARSERS:
+        raise ValueError(f"unknown poll format {format!r}")
+    return POLL_PARSERS[format](codecs.iterdecode(stream, "utf-8"))
+
+
+def iter_poll_batches(polls: Iterable[Poll], batch_size: int) -> Iterator[List[Poll]]:
+    polls = iter(polls)
+    while batch := list(itertools.islice(polls, batch_size)):
+        yield batch
+
+
+def load_store_pks(store_ids: Optional[Iterable[str]] = None) -> Mapping[str, str]:
+    """Map the store_id of the stores to their primary key."""
+    stores = Store.objects.all()
+    if store_ids is not None:
+        stores = stores.filter(store_id__in=list(store_ids))
+    return dict(stores.values_list("store_id", "id"))
+
+
+def create_stores(store_ids: Set[str]) -> Mapping[str, str]:
+    """Create the stores polled for the first time, open all day like the stores loaded without hours."""
+    stores = [Store(store_id=store_id) for store_id in store_ids]
+    Store.objects.bulk_create(stores, ignore_conflicts=True)
+    # the primary keys are read back, a concurrent ingestion may have created some of the stores
+    store_pks = load_store_pks(store_ids)
+    created = [store for store in stores if store_pks[store.store_id] == str(store.id)]
+    StoreHours.objects.bulk_create(
+        [
+            StoreHours(store=store, day_of_week=day)
+            for store in created
+            for day in range(7)  # 7 days in a week
+        ]
+    )
+    return store_pks
+
+
+def upsert_polls(
+    polls: List[Poll], store_pks: Mapping[str, str]
+) -> Tuple[int, int, Optional[datetime.datetime]]:
+    """
+    Write a batch of polls with a single multi-row upsert on (store, timestamp_utc).
+    Unknown stores are created and added to store_pks. A poll sent again replaces the stored status,
+    so a batch can be retried safely.
+    Returns the number of polls written, the number of stores created and the latest timestamp.
+    """
+    new_store_ids = {store_id for store_id, _, _ in polls if store_id not in store_pks}
+    if new_store_ids:
+        store_pks.update(create_stores(new_store_ids))
+    # the last status of a poll repeated in the batch wins
+    statuses: Mapping[Tuple[str, datetime.datetime], int] = dict()
+    for store_id, timestamp, status in polls:
+        statuses[(store_pks[store_id], timestamp)] = status
+    # the backends with ON DUPLICATE KEY UPDATE do not take the conflicting fields
+    unique_fields = (
+        ["store", "timestamp_utc"]
+        if connection.features.supports_update_conflicts_with_target
+        else None
+    )
+    StoreStatus.objects.bulk_create(
+        [
+            StoreStatus(store_id=store_pk, timestamp_utc=timestamp, status=status)
+            for (store_pk, timestamp), status in statuses.items()
+        ],
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=["status"],
+    )
+    # the rollups of the days that got new polls are computed again by the next report
+    StoreDailyRollup.objects.filter(
+        store_id__in={store_pk for store_pk, _ in statuses},
+        date__in={timestamp.date() for _, timestamp in statuses},
+    ).delete()
+    # imported here as the online states load the stores through the services, which ingest through this module
+    from .online import update_uptime_states
+
+    update_uptime_states(statuses)
+    return len(statuses), len(new_store_ids), max(timestamp for _, timestamp in statuses)
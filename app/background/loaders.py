@@ -0,0 +1,171 @@
+import datetime
+import itertools
+import operator
+from typing import Iterator, List, Literal, Mapping, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+
+from app.models import Store, StoreHours, StoreSchedule, StoreStatus
+from app.services import WatermarkService
+
+
+def iter_store_statuses(
+    since: datetime.datetime,
+    until: Optional[datetime.datetime] = None,
+    store_ids: Optional[List[str]] = None,
+    exclude: Optional[Tuple[datetime.datetime, datetime.datetime]] = None,
+) -> Iterator[Tuple[str, List[Tuple[datetime.datetime, Literal["active", "inactive"]]]]]:
+    """Stream the statuses polled since the given time, one store at a time and sorted by timestamp."""
+    store_statuses = StoreStatus.objects.filter(timestamp_utc__gte=since)
+    if until is not None:
+        store_statuses = store_statuses.filter(timestamp_utc__lt=until)
+    if exclude is not None:
+        # skip the statuses polled in the [start, end) range
+        store_statuses = store_statuses.exclude(
+            timestamp_utc__gte=exclude[0], timestamp_utc__lt=exclude[1]
+        )
+    if store_ids is not None:
+        store_statuses = store_statuses.filter(store__store_id__in=store_ids)
+    rows = iter_status_pages(store_statuses, settings.REPORT_STATUS_CHUNK_SIZE)
+    # the statuses are stored as integers, the engines work with their labels
+    labels = dict(StoreStatus.Status.choices)
+    for store_id, store_rows in itertools.groupby(rows, key=operator.itemgetter(1)):
+        yield store_id, [
+            (timestamp, labels[status]) for _, _, timestamp, status in store_rows
+        ]
+
+
+def iter_status_pages(
+    store_statuses: QuerySet, page_size: int
+) -> Iterator[Tuple[str, str, datetime.datetime, int]]:
+    """
+    Plain (store pk, store_id, timestamp, status) tuples ordered by store and timestamp, so that the
+    statuses of a store are contiguous and already sorted, fetched one page at a time after the last
+    row of the previous page. Each page is a query of its own on the (store, timestamp_utc) index,
+    so the database client never buffers more than a page, which a streamed cursor does not ensure:
+    mysqlclient reads the whole result of a query before the first row is returned.
+    """
+    page = store_statuses
+    while True:
+        rows = list(
+            page.order_by("store_id", "timestamp_utc").values_list(
+                "store_id", "store__store_id", "timestamp_utc", "status"
+            )[:page_size]
+        )
+        yield from rows
+        if len(rows) < page_size:
+            return
+        # a store has at most one status per timestamp, the next page starts right after the last row
+        store_pk, _, timestamp, _ = rows[-1]
+        page = store_statuses.filter(store_id__gte=store_pk).filter(
+            Q(store_id__gt=store_pk) | Q(timestamp_utc__gt=timestamp)
+        )
+
+
+def get_last_updated_timestamp() -> datetime.datetime:
+    # getting the last updated timestamp from the watermark kept up to date on ingest
+    return WatermarkService.get_last_updated_timestamp()
+
+
+def filter_store_ids(
+    store_ids: Optional[List[str]] = None, timezone: Optional[str] = None
+) -> QuerySet:
+    """
+    Store ids of the stores matching the given filters, as a query the loaders filter on as a subquery,
+    so that the stores of a timezone are not sent back to the database as a list of ids.
+    """
+    stores = Store.objects.all()
+    if store_ids is not None:
+        stores = stores.filter(store_id__in=store_ids)
+    if timezone is not None:
+        stores = stores.filter(timezone=timezone)
+    return stores.values_list("store_id", flat=True)
+
+
+def load_store_timezones(store_ids: Optional[List[str]] = None) -> Mapping[str, str]:
+    stores = Store.objects.all()
+    if store_ids is not None:
+        # load only the timezones of the given stores
+        stores = stores.filter(store_id__in=store_ids)
+    # create a dictionary for mapping store_id and timezone
+    stores_timezones: Mapping[str, str] = dict()
+    for store in stores:
+        stores_timezones[store.store_id] = store.timezone
+    return stores_timezones
+
+
+def time_to_offset(local_time: datetime.time) -> int:
+    # seconds since the local midnight
+    return local_time.hour * 3600 + local_time.minute * 60 + local_time.second
+
+
+def offset_to_time(offset: int) -> datetime.time:
+    return datetime.time(offset // 3600, offset // 60 % 60, offset % 60)
+
+
+# a week day without business hours is open all day, like the default StoreHours
+ALL_DAY_OFFSETS: List[int] = [
+    time_to_offset(datetime.time(0, 0, 0)),
+    time_to_offset(datetime.time(23, 59, 59)),
+] * 7
+ALL_DAY_HOURS: List[Tuple[datetime.time, datetime.time]] = [
+    (datetime.time(0, 0, 0), datetime.time(23, 59, 59))
+] * 7
+
+
+def build_store_schedules(store_ids: Optional[List[str]] = None) -> None:
+    """Precompute the weekly schedule of the stores without one, new or invalidated by a change of their hours."""
+    stores = Store.objects.filter(schedule__isnull=True)
+    if store_ids is not None:
+        stores = stores.filter(store_id__in=store_ids)
+    # schedules = {store pk: [start, end, ...] of each week day}
+    schedules: Mapping[str, List[int]] = {
+        store_pk: list(ALL_DAY_OFFSETS) for store_pk in stores.values_list("id", flat=True)
+    }
+    if not schedules:
+        return
+    store_hours = StoreHours.objects.filter(store__in=stores).values_list(
+        "store_id", "day_of_week", "start_time_local", "end_time_local"
+    )
+    for store_pk, day, start_time_local, end_time_local in store_hours:
+        schedules[store_pk][2 * day : 2 * day + 2] = [
+            time_to_offset(start_time_local),
+            time_to_offset(end_time_local),
+        ]
+    StoreSchedule.objects.bulk_create(
+        [
+            StoreSchedule(store_id=store_pk, hours=hours, open_all_day=hours == ALL_DAY_OFFSETS)
+            for store_pk, hours in schedules.items()
+        ],
+        batch_size=settings.REPORT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def load_store_hours(
+    store_ids: Optional[List[str]] = None,
+) -> Mapping[str, List[Tuple[datetime.time, datetime.time]]]:
+    build_store_schedules(store_ids=store_ids)
+    schedules = StoreSchedule.objects.all()
+    if store_ids is not None:
+        # load only the hours of the given stores
+        schedules = schedules.filter(store__store_id__in=store_ids)
+    # create a dictionary for mapping store_id and store hours from the precomputed schedules
+    # store_hours_dict = {store_id: [(start_time, end_time), ...]}
+    store_hours_dict: Mapping[str, List[Tuple[datetime.time, datetime.time]]] = dict()
+    # most stores share their hours, so each offset is converted only once
+    times: Mapping[int, datetime.time] = dict()
+    for store_id, hours, open_all_day in schedules.values_list(
+        "store__store_id", "hours", "open_all_day"
+    ):
+        if open_all_day:
+            store_hours_dict[store_id] = ALL_DAY_HOURS
+            continue
+        for offset in hours:
+            if offset not in times:
+                times[offset] = offset_to_time(offset)
+        store_hours_dict[store_id] = [
+            (times[hours[day]], times[hours[day + 1]]) for day in range(0, 14, 2)
+        ]
+    return store_hours_dict
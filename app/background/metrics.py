@@ -0,0 +1,137 @@
+import bisect
+import contextlib
+import time
+from typing import Iterable, Iterator, List, Mapping, Optional, TypeVar
+
+T = TypeVar("T")
+
+# upper bounds, in seconds, of the buckets of the histogram of the compute time of a store
+STORE_COMPUTE_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+class ReportMetrics:
+    """Timings and row counts of the generation of a report, stored with it and exported to Prometheus."""
+
+    def __init__(self, metrics: Optional[Mapping] = None):
+        metrics = metrics or dict()
+        # seconds spent in each phase
+        self.phases: Mapping[str, float] = dict(metrics.get("phases", {}))
+        # rows and stores counted along the phases
+        self.counts: Mapping[str, int] = dict(metrics.get("counts", {}))
+        histogram = metrics.get("store_compute_seconds", {})
+        # number of stores in each bucket, the last one is unbounded
+        self.store_compute_buckets: List[int] = list(
+            histogram.get("buckets", [0] * (len(STORE_COMPUTE_BUCKETS) + 1))
+        )
+        self.store_compute_sum: float = histogram.get("sum", 0.0)
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def count_statuses(self, store_statuses: Iterable[T]) -> Iterator[T]:
+        """Count the stores and statuses of a stream of store statuses as they are consumed."""
+        for store_id, statuses in store_statuses:
+            self.count("stores_polled")
+            self.count("statuses", len(statuses))
+            yield store_id, statuses
+
+    def observe_store_compute(self, seconds: float, stores: int = 1) -> None:
+        """Record the compute time of each of the given stores, computed together in the given seconds."""
+        if not stores:
+            return
+        bucket = bisect.bisect_left(STORE_COMPUTE_BUCKETS, seconds / stores)
+        self.store_compute_buckets[bucket] += stores
+        self.store_compute_sum += seconds
+
+    def merge(self, other: "ReportMetrics") -> None:
+        """Add the metrics of a chunk of the report."""
+        for name, seconds in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        for name, value in other.counts.items():
+            self.count(name, value)
+        for bucket, stores in enumerate(other.store_compute_buckets):
+            self.store_compute_buckets[bucket] += stores
+        self.store_compute_sum += other.store_compute_sum
+
+    def to_dict(self) -> Mapping:
+        return {
+            "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            "counts": self.counts,
+            "store_compute_seconds": {
+                "buckets": self.store_compute_buckets,
+                "sum": round(self.store_compute_sum, 6),
+                "count": sum(self.store_compute_buckets),
+            },
+        }
+
+
+def format_labels(**labels: str) -> str:
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+class ReportMetricsSum:
+    """Metrics of the computed reports summed up, kept in one row instead of read from every report."""
+
+    def __init__(self, metrics_sum: Optional[Mapping] = None):
+        metrics_sum = metrics_sum or dict()
+        self.reports: int = metrics_sum.get("reports", 0)
+        # number of reports timed in each phase
+        self.phase_reports: Mapping[str, int] = dict(metrics_sum.get("phase_reports", {}))
+        self.total = ReportMetrics(metrics_sum.get("total"))
+
+    def add(self, metrics: Mapping) -> None:
+        """Add the metrics of a computed report."""
+        report_metrics = ReportMetrics(metrics)
+        self.reports += 1
+        self.total.merge(report_metrics)
+        for name in report_metrics.phases:
+            self.phase_reports[name] = self.phase_reports.get(name, 0) + 1
+
+    def to_dict(self) -> Mapping:
+        return {
+            "reports": self.reports,
+            "phase_reports": self.phase_reports,
+            "total": self.total.to_dict(),
+        }
+
+
+def render_prometheus(metrics_sum: ReportMetricsSum) -> str:
+    """Prometheus text exposition of the metrics of the computed reports, summed over all of them."""
+    total, phase_reports, reports = metrics_sum.total, metrics_sum.phase_reports, metrics_sum.reports
+    lines = [
+        "# HELP report_generated_total Reports generated with metrics.",
+        "# TYPE report_generated_total counter",
+        f"report_generated_total {reports}",
+        "# HELP report_phase_seconds Seconds spent in each phase of the report generation.",
+        "# TYPE report_phase_seconds summary",
+    ]
+    for name, seconds in sorted(total.phases.items()):
+        lines.append(f"report_phase_seconds_sum{format_labels(phase=name)} {seconds:.6f}")
+        lines.append(f"report_phase_seconds_count{format_labels(phase=name)} {phase_reports[name]}")
+    lines += [
+        "# HELP report_rows_total Rows and stores counted while generating the reports.",
+        "# TYPE report_rows_total counter",
+    ]
+    for name, value in sorted(total.counts.items()):
+        lines.append(f"report_rows_total{format_labels(kind=name)} {value}")
+    lines += [
+        "# HELP report_store_compute_seconds Compute time of a store, averaged over the stores computed together.",
+        "# TYPE report_store_compute_seconds histogram",
+    ]
+    cumulative = 0
+    for bound, stores in zip(
+        [*map(str, STORE_COMPUTE_BUCKETS), "+Inf"], total.store_compute_buckets
+    ):
+        cumulative += stores
+        lines.append(f"report_store_compute_seconds_bucket{format_labels(le=bound)} {cumulative}")
+    lines.append(f"report_store_compute_seconds_sum {total.store_compute_sum:.6f}")
+    lines.append(f"report_store_compute_seconds_count {cumulative}")
+    return "\n".join(lines) + "\n"
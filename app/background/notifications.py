@@ -0,0 +1,69 @@
+import asyncio
+import functools
+import json
+from typing import Iterable, Mapping, Optional
+
+import redis
+from django.conf import settings
+from redis import asyncio as aioredis
+
+
+def get_report_channel(report_id: str) -> str:
+    return f"report:{report_id}"
+
+
+@functools.lru_cache(maxsize=1)
+def get_redis() -> redis.Redis:
+    return redis.Redis.from_url(settings.REPORT_EVENTS_REDIS_URL)
+
+
+def publish_report_status(report_ids: Iterable[str], status: str) -> None:
+    """Publish the new status of the given reports to the clients subscribed to them."""
+    try:
+        for report_id in report_ids:
+            get_redis().publish(
+                get_report_channel(report_id),
+                json.dumps({"report_id": str(report_id), "status": status}),
+            )
+    except redis.RedisError as error:
+        # the clients still get the status from get_report/
+        print("Report notification failed : ", error)
+
+
+class ReportSubscription:
+    """Subscription to the status notifications of a report, used as an async context manager"""
+
+    def __init__(self, report_id: str):
+        self.report_id = report_id
+
+    async def __aenter__(self) -> "ReportSubscription":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        self.client = aioredis.Redis.from_url(settings.REPORT_EVENTS_REDIS_URL)
+        self.pubsub = self.client.pubsub()
+        try:
+            await self.pubsub.subscribe(get_report_channel(self.report_id))
+        except BaseException:
+            await self.close()
+            raise
+
+    async def close(self) -> None:
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+    async def get(self, timeout: float) -> Optional[Mapping[str, str]]:
+        """Wait up to timeout seconds for the next notification of the report."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (remaining := deadline - loop.time()) > 0:
+            message = await self.pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=remaining
+            )
+            if message is not None:
+                return json.loads(message["data"])
+        return None
@@ -0,0 +1,336 @@
+import datetime
+import time
+from typing import List, Mapping, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from app.models import Store, StoreStatus, StoreUptimeState
+
+from .loaders import iter_store_statuses, load_store_hours, load_store_timezones
+from .metrics import ReportMetrics
+from .rollups import get_closed_days, replay_legacy_rounding
+from .vectorized import (
+    EPOCH,
+    REPORT_KEYS,
+    REPORT_WINDOWS,
+    US_PER_DAY,
+    build_status_arrays,
+    datetime_to_us,
+    report_window_microseconds,
+    status_intervals,
+)
+
+# record of a poll in the state of a store
+POLL_DTYPE = np.dtype([("timestamp", "<i8"), ("active", "?")])
+
+# set in the cache while the states follow the ingested polls, the states kept before it are stale
+UPTIME_STATES_CACHE_KEY = "uptime-states-online"
+# whether this process, ingesting polls with the online reports disabled, has marked the states stale
+uptime_states_marked_stale = False
+
+
+def pack_polls(poll_ts: np.ndarray, poll_active: np.ndarray) -> bytes:
+    polls = np.empty(len(poll_ts), dtype=POLL_DTYPE)
+    polls["timestamp"] = poll_ts
+    polls["active"] = poll_active
+    return polls.tobytes()
+
+
+def unpack_polls(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=POLL_DTYPE)
+
+
+def us_to_datetime(value: int) -> datetime.datetime:
+    return EPOCH + datetime.timedelta(microseconds=value)
+
+
+def get_state_since(timestamp: int) -> int:
+    # start of the utc day of the first polls read by a report of the given time
+    return (timestamp - 7 * US_PER_DAY) // US_PER_DAY * US_PER_DAY
+
+
+def compute_day_totals(
+    poll_store: np.ndarray,
+    poll_ts: np.ndarray,
+    poll_active: np.ndarray,
+    store_ids: List[str],
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+) -> Mapping[str, Mapping[str, List[int]]]:
+    """
+    Uptime and downtime in microseconds, and number of polls, of each utc day of the polls of the
+    given stores, as the daily rollups count them.
+    """
+    totals: Mapping[str, Mapping[str, List[int]]] = {store_id: dict() for store_id in store_ids}
+    poll_day = poll_ts // US_PER_DAY
+    for day in np.unique(poll_day).tolist():
+        on_day = poll_day == day
+        interval_store, start, end, active = status_intervals(
+            poll_store[on_day],
+            poll_ts[on_day],
+            poll_active[on_day],
+            store_ids,
+            store_hours,
+            stores_timezones,
+        )
+        duration = end - start
+        uptime = np.bincount(
+            interval_store[active], weights=duration[active], minlength=len(store_ids)
+        ).astype(np.int64)
+        downtime = np.bincount(
+            interval_store[~active], weights=duration[~active], minlength=len(store_ids)
+        ).astype(np.int64)
+        poll_count = np.bincount(poll_store[on_day], minlength=len(store_ids))
+        for store in np.flatnonzero(poll_count).tolist():
+            totals[store_ids[store]][str(day)] = [
+                int(uptime[store]),
+                int(downtime[store]),
+                int(poll_count[store]),
+            ]
+    return totals
+
+
+def set_state_polls(
+    state: StoreUptimeState, since: int, poll_ts: np.ndarray, poll_active: np.ndarray
+) -> None:
+    state.since_utc = us_to_datetime(since)
+    state.polls = pack_polls(poll_ts, poll_active)
+    if len(poll_ts):
+        state.last_timestamp_utc = us_to_datetime(int(poll_ts[-1]))
+        state.last_status = (
+            StoreStatus.Status.ACTIVE if poll_active[-1] else StoreStatus.Status.INACTIVE
+        )
+    # the days before the state are not complete
+    state.days = {
+        day: totals for day, totals in state.days.items() if int(day) * US_PER_DAY >= since
+    }
+
+
+def ensure_uptime_states(
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+    last_updated_timestamp: datetime.datetime,
+    store_ids: Optional[List[str]] = None,
+) -> None:
+    """Build the missing states of the stores from their polls, for new stores or invalidated states."""
+    stores = Store.objects.filter(uptime_state__isnull=True)
+    if store_ids is not None:
+        stores = stores.filter(store_id__in=store_ids)
+    store_pks = dict(stores.values_list("store_id", "id"))
+    # the stores created since the business hours were loaded are left to the next report
+    missing = [store_id for store_id in store_pks if store_id in store_hours]
+    since = get_state_since(datetime_to_us(last_updated_timestamp))
+    for start in range(0, len(missing), settings.REPORT_BATCH_SIZE):
+        batch = missing[start : start + settings.REPORT_BATCH_SIZE]
+        polled_ids, poll_store, poll_ts, poll_active = build_status_arrays(
+            iter_store_statuses(since=us_to_datetime(since), store_ids=batch)
+        )
+        day_totals = compute_day_totals(
+            poll_store, poll_ts, poll_active, polled_ids, store_hours, stores_timezones
+        )
+        store_begin = np.searchsorted(poll_store, np.arange(len(polled_ids) + 1))
+        # stores without polls get an empty state, so only new or invalidated states are missing
+        states = {store_id: StoreUptimeState(store_id=store_pks[store_id]) for store_id in batch}
+        for store, store_id in enumerate(polled_ids):
+            states[store_id].days = day_totals[store_id]
+            segment = slice(store_begin[store], store_begin[store + 1])
+            set_state_polls(states[store_id], since, poll_ts[segment], poll_active[segment])
+        for store_id, state in states.items():
+            if store_id not in day_totals:
+                set_state_polls(state, since, poll_ts[:0], poll_active[:0])
+        StoreUptimeState.objects.bulk_create(states.values(), ignore_conflicts=True)
+
+
+def mark_uptime_states_stale() -> None:
+    """The states miss the polls ingested from now on, once per process."""
+    global uptime_states_marked_stale
+    if not uptime_states_marked_stale:
+        cache.delete(UPTIME_STATES_CACHE_KEY)
+        uptime_states_marked_stale = True
+
+
+def clear_stale_uptime_states() -> None:
+    """Delete every state once the online reports are enabled, if polls were ingested without them."""
+    if cache.add(UPTIME_STATES_CACHE_KEY, True, timeout=None):
+        StoreUptimeState.objects.all().delete()
+
+
+def update_uptime_states(statuses: Mapping[Tuple[str, datetime.datetime], int]) -> None:
+    """
+    Add a batch of polls, by store primary key and timestamp, to the states of their stores, and
+    compute again the totals of the days they were polled on.
+    The stores without a state are left to the next report, which builds it from all their polls.
+    """
+    if not settings.REPORT_ONLINE:
+        # the states are built again once the online reports are enabled
+        mark_uptime_states_stale()
+        return
+    clear_stale_uptime_states()
+    store_pks = {store_pk for store_pk, _ in statuses}
+    # new_polls = {store pk: {microseconds since the epoch: active}}
+    new_polls: Mapping[str, Mapping[int, bool]] = dict()
+    for (store_pk, timestamp), status in statuses.items():
+        new_polls.setdefault(store_pk, dict())[datetime_to_us(timestamp)] = (
+            status == StoreStatus.Status.ACTIVE
+        )
+    with transaction.atomic():
+        # locked in the order of their stores, so that concurrent batches do not deadlock
+        states = list(
+            StoreUptimeState.objects.select_for_update()
+            .filter(store_id__in=store_pks)
+            .order_by("store_id")
+        )
+        if not states:
+            return
+        store_ids = dict(
+            Store.objects.filter(id__in=[state.store_id for state in states]).values_list(
+                "id", "store_id"
+            )
+        )
+        store_hours = load_store_hours(store_ids=list(store_ids.values()))
+        stores_timezones = load_store_timezones(store_ids=list(store_ids.values()))
+        # the polls of the days polled again, computed together for every store of the batch
+        lengths: List[int] = list()
+        day_ts: List[np.ndarray] = list()
+        day_active: List[np.ndarray] = list()
+        for state in states:
+            polls = unpack_polls(state.polls)
+            timestamps = dict(zip(polls["timestamp"].tolist(), polls["active"].tolist()))
+            timestamps.update(new_polls[state.store_id])
+            # the state keeps the polls a report of its latest poll, or of any later time, reads
+            since = max(
+                datetime_to_us(state.since_utc), get_state_since(max(timestamps))
+            )
+            poll_ts = np.array(sorted(ts for ts in timestamps if ts >= since), dtype=np.int64)
+            poll_active = np.array([timestamps[ts] for ts in poll_ts.tolist()], dtype=bool)
+            set_state_polls(state, since, poll_ts, poll_active)
+            days = {ts // US_PER_DAY for ts in new_polls[state.store_id] if ts >= since}
+            on_days = np.isin(poll_ts // US_PER_DAY, list(days))
+            lengths.append(int(on_days.sum()))
+            day_ts.append(poll_ts[on_days])
+            day_active.append(poll_active[on_days])
+        state_store_ids = [store_ids[state.store_id] for state in states]
+        day_totals = compute_day_totals(
+            np.repeat(np.arange(len(states)), lengths),
+            np.concatenate(day_ts),
+            np.concatenate(day_active),
+            state_store_ids,
+            store_hours,
+            stores_timezones,
+        )
+        now = timezone.now()
+        for state, store_id in zip(states, state_store_ids):
+            state.days.update(day_totals[store_id])
+            state.updated_at = now
+        StoreUptimeState.objects.bulk_update(
+            states,
+            ["last_status", "last_timestamp_utc", "since_utc", "polls", "days", "updated_at"],
+            batch_size=settings.REPORT_BATCH_SIZE,
+        )
+
+
+def build_report_columns_online(
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+    last_updated_timestamp: datetime.datetime,
+    store_ids: Optional[List[str]] = None,
+    metrics: Optional[ReportMetrics] = None,
+) -> Mapping[str, List]:
+    """
+    Compute the report columns from the state of each store instead of its polls.
+    The closed days of the last week are summed from the totals of the states, and only the polls of
+    the open days are computed. Like the incremental reports, the totals are summed exactly in microseconds,
+    and the stores whose totals are whole minutes are computed again from their polls to round as tick does.
+    """
+    metrics = metrics or ReportMetrics()
+    with metrics.phase("online_states"):
+        clear_stale_uptime_states()
+        ensure_uptime_states(store_hours, stores_timezones, last_updated_timestamp, store_ids)
+    last_updated = datetime_to_us(last_updated_timestamp)
+    week_start = last_updated - 7 * US_PER_DAY
+    closed_days = [
+        str(day)
+        for day in get_closed_days(store_hours, stores_timezones, last_updated_timestamp)
+    ]
+    states = StoreUptimeState.objects.all()
+    if store_ids is not None:
+        states = states.filter(store__store_id__in=store_ids)
+    with metrics.phase("status_load"):
+        # in the order of their stores, as the statuses are streamed in by the other engines
+        rows = list(
+            states.order_by("store_id").values_list("store__store_id", "polls", "days")
+        )
+    start = time.perf_counter()
+    with metrics.phase("compute"):
+        polled_ids: List[str] = list()
+        closed_totals: List[Tuple[int, int]] = list()
+        lengths: List[int] = list()
+        open_ts: List[np.ndarray] = list()
+        open_active: List[np.ndarray] = list()
+        for store_id, polls, days in rows:
+            if store_id not in store_hours:
+                continue
+            polls = unpack_polls(polls)
+            timestamps = polls["timestamp"]
+            # the polls of the open days of the last week, the closed days are summed from their totals
+            window = (timestamps >= week_start) & (timestamps <= last_updated)
+            if closed_days:
+                window &= (timestamps < int(closed_days[0]) * US_PER_DAY) | (
+                    timestamps >= (int(closed_days[-1]) + 1) * US_PER_DAY
+                )
+            closed = [days[day] for day in closed_days if day in days and days[day][2]]
+            if not closed and not window.any():
+                continue
+            polled_ids.append(store_id)
+            closed_totals.append(
+                (sum(totals[0] for totals in closed), sum(totals[1] for totals in closed))
+            )
+            lengths.append(int(window.sum()))
+            open_ts.append(timestamps[window])
+            open_active.append(polls["active"][window])
+        metrics.count("stores_polled", len(polled_ids))
+        metrics.count("statuses", sum(lengths))
+        microseconds = report_window_microseconds(
+            *status_intervals(
+                np.repeat(np.arange(len(polled_ids)), lengths),
+                np.concatenate(open_ts) if open_ts else np.empty(0, dtype=np.int64),
+                np.concatenate(open_active) if open_active else np.empty(0, dtype=bool),
+                polled_ids,
+                store_hours,
+                stores_timezones,
+            ),
+            store_count=len(polled_ids),
+            last_updated_timestamp=last_updated_timestamp,
+        )
+        closed_microseconds = np.array(closed_totals, dtype=np.int64).reshape(-1, 2)
+        microseconds["uptime_last_week"] += closed_microseconds[:, 0]
+        microseconds["downtime_last_week"] += closed_microseconds[:, 1]
+        units = {
+            f"{prefix}_{suffix}": unit
+            for suffix, _, unit in REPORT_WINDOWS
+            for prefix in ("uptime", "downtime")
+        }
+        columns = {
+            "store_id": polled_ids,
+            **{key: (microseconds[key] // units[key]).tolist() for key in REPORT_KEYS},
+        }
+    metrics.observe_store_compute(time.perf_counter() - start, len(polled_ids))
+    with metrics.phase("legacy_rounding"):
+        replayed = replay_legacy_rounding(
+            {
+                store_id: [int(microseconds[key][store]) for key in REPORT_KEYS]
+                for store, store_id in enumerate(polled_ids)
+            },
+            store_hours,
+            stores_timezones,
+            last_updated_timestamp,
+        )
+    metrics.count("stores_replayed", len(replayed))
+    for store, store_id in enumerate(polled_ids):
+        for key, value in zip(REPORT_KEYS, replayed.get(store_id, ())):
+            columns[key][store] = value
+    return columns
@@ -1,8 +1,33 @@
+import datetime
+from typing import List, Optional
+
+
 class TaskParams:
     """Paramaters for processing the task in background, so that we know what to expect in the params."""
 
-    def __init__(self, report_id: str):
+    def __init__(
+        self,
+        report_id: str,
+        last_updated_timestamp: Optional[str] = None,
+        store_ids: Optional[List[str]] = None,
+        timezone: Optional[str] = None,
+        profile: Optional[str] = None,
+    ):
         self.report_id = report_id
+        # filters of the stores in the report, every store if not given
+        self.store_ids = store_ids
+        self.timezone = timezone
+        # profiler the report is generated under, "cprofile" or "sampling", not profiled if not given
+        self.profile = profile
+        # iso timestamp of the latest poll the report is computed up to, the current watermark if not given
+        self.last_updated_timestamp = (
+            datetime.datetime.fromisoformat(last_updated_timestamp)
+            if last_updated_timestamp
+            else None
+        )
 
     def __repr__(self):
-        return f"TaskParams(report_id={self.report_id})"
+        return (
+            f"TaskParams(report_id={self.report_id}, last_updated_timestamp={self.last_updated_timestamp}, "
+            f"store_ids={self.store_ids}, timezone={self.timezone}, profile={self.profile})"
+        )
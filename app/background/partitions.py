@@ -0,0 +1,163 @@
+import datetime
+from typing import List, Mapping, Optional
+
+from django.conf import settings
+from django.db import connection
+
+from app.models import StoreStatus
+from app.services import WatermarkService
+
+# partition of the polls past the last daily partition, split as the days come
+FUTURE_PARTITION = "pfuture"
+
+
+def partition_name(day: datetime.date) -> str:
+    return f"p{day:%Y%m%d}"
+
+
+def partition_day(name: str) -> Optional[datetime.date]:
+    """Day of the polls of a daily partition, None for the future partition."""
+    try:
+        return datetime.datetime.strptime(name, "p%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def format_partition(day: datetime.date) -> str:
+    # the partition of a day holds the polls before the next day, so the
+    # first partition also holds every poll before its day
+    return (
+        f"PARTITION {partition_name(day)} VALUES LESS THAN "
+        f"(TO_DAYS('{day + datetime.timedelta(days=1):%Y-%m-%d}'))"
+    )
+
+
+def format_partitions(days: List[datetime.date]) -> str:
+    return ", ".join(
+        [*map(format_partition, days), f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE"]
+    )
+
+
+def iter_days(start: datetime.date, end: datetime.date) -> List[datetime.date]:
+    """Days from start to end, inclusive."""
+    return [start + datetime.timedelta(days=day) for day in range((end - start).days + 1)]
+
+
+def get_partitions() -> List[str]:
+    """Names of the partitions of the status table in order, none when it is not partitioned."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+            "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION",
+            [StoreStatus._meta.db_table],
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def validate_retention(retention_days: Optional[int]) -> None:
+    # the reports read the polls of the last 7 days
+    if retention_days is not None and retention_days < 7:
+        raise ValueError("The polls must be kept for at least 7 days, or without a retention")
+
+
+def get_retention_cutoff(retention_days: Optional[int]) -> Optional[datetime.date]:
+    """First day of the polls kept, counted back from the latest poll, None when every poll is kept."""
+    if retention_days is None or not StoreStatus.objects.exists():
+        return None
+    last_updated_timestamp = WatermarkService.get_last_updated_timestamp()
+    return (last_updated_timestamp - datetime.timedelta(days=retention_days)).date()
+
+
+def get_last_day(ahead_days: int, today: datetime.date) -> datetime.date:
+    """Last day of the partitions, ahead of the current day and of the latest poll."""
+    # the polls ingested ahead of the clock, such as replayed ones, get their partitions too
+    last_day = today
+    if StoreStatus.objects.exists():
+        last_day = max(last_day, WatermarkService.get_last_updated_timestamp().date())
+    return last_day + datetime.timedelta(days=ahead_days)
+
+
+def partition_table(
+    retention_days: Optional[int] = None,
+    ahead_days: Optional[int] = None,
+    today: Optional[datetime.date] = None,
+) -> List[str]:
+    """
+    Rebuild the status table into daily partitions, once and on MySQL only, and return their names.
+    The rebuild copies the whole table, so it is run explicitly by the partition_polls command.
+    """
+    retention_days = settings.POLL_RETENTION_DAYS if retention_days is None else retention_days
+    ahead_days = settings.POLL_PARTITIONS_AHEAD if ahead_days is None else ahead_days
+    validate_retention(retention_days)
+    if connection.vendor != "mysql":
+        raise ValueError(f"The polls are partitioned on MySQL only, not on {connection.vendor}")
+    if get_partitions():
+        raise ValueError("The polls are already partitioned")
+    today = today or datetime.datetime.now(datetime.timezone.utc).date()
+    cutoff = get_retention_cutoff(retention_days)
+    # the polls before the first kept day fall in its own partition,
+    # which is then dropped with the expired days
+    first_day = (cutoff or today) - datetime.timedelta(days=1)
+    days = iter_days(first_day, get_last_day(ahead_days, today))
+    table = connection.ops.quote_name(StoreStatus._meta.db_table)
+    with connection.cursor() as cursor:
+        # every unique key of a partitioned table includes its partitioning column
+        cursor.execute(
+            f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp_utc) "
+            f"PARTITION BY RANGE (TO_DAYS(timestamp_utc)) ({format_partitions(days)})"
+        )
+    return [partition_name(day) for day in days]
+
+
+def manage_partitions(
+    retention_days: Optional[int] = None,
+    ahead_days: Optional[int] = None,
+    today: Optional[datetime.date] = None,
+) -> Mapping[str, object]:
+    """
+    Create the partitions of the coming days and drop the days past their retention.
+    Only a table partitioned by partition_table is partitioned further, the expired polls of
+    other tables and databases are deleted instead. Without a retention period every poll is kept.
+    """
+    retention_days = settings.POLL_RETENTION_DAYS if retention_days is None else retention_days
+    ahead_days = settings.POLL_PARTITIONS_AHEAD if ahead_days is None else ahead_days
+    validate_retention(retention_days)
+    today = today or datetime.datetime.now(datetime.timezone.utc).date()
+    cutoff = get_retention_cutoff(retention_days)
+    partitions = get_partitions() if connection.vendor == "mysql" else []
+    if not partitions:
+        deleted = 0
+        if cutoff is not None:
+            deleted, _ = StoreStatus.objects.filter(
+                timestamp_utc__lt=datetime.datetime.combine(
+                    cutoff, datetime.time(), tzinfo=datetime.timezone.utc
+                )
+            ).delete()
+        return {"created": [], "dropped": [], "deleted": deleted}
+
+    table = connection.ops.quote_name(StoreStatus._meta.db_table)
+    last_day = get_last_day(ahead_days, today)
+    created: List[str] = list()
+    with connection.cursor() as cursor:
+        days = [day for day in map(partition_day, partitions) if day is not None]
+        first_day = days[-1] + datetime.timedelta(days=1) if days else cutoff or today
+        if first_day <= last_day:
+            days = iter_days(first_day, last_day)
+            # the future partition only holds the polls ingested past the last day
+            cursor.execute(
+                f"ALTER TABLE {table} REORGANIZE PARTITION {FUTURE_PARTITION} "
+                f"INTO ({format_partitions(days)})"
+            )
+            created = [partition_name(day) for day in days]
+        dropped: List[str] = list()
+        if cutoff is not None:
+            dropped = [
+                name
+                for name in get_partitions()
+                if partition_day(name) is not None and partition_day(name) < cutoff
+            ]
+        if dropped:
+            # dropping a partition drops its polls at once, instead of deleting them row by row
+            cursor.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(dropped)}")
+    return {"created": created, "dropped": dropped, "deleted": 0}
@@ -0,0 +1,101 @@
+import collections
+import contextlib
+import cProfile
+import marshal
+import sys
+import threading
+from types import FrameType
+from typing import IO, Iterator, List, Literal, Mapping, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+
+from app.models import Report
+
+# profilers a report can be generated under
+# "cprofile" records every call, "sampling" records the stack of the task at a fixed interval
+PROFILERS = ["cprofile", "sampling"]
+# suffix and content type of the file of each profiler
+PROFILE_FILES: Mapping[str, Tuple[str, str]] = {
+    "cprofile": ("pstats", "application/octet-stream"),
+    "sampling": ("collapsed", "text/plain"),
+}
+
+
+def format_frame(frame: FrameType) -> str:
+    # the frame format of py-spy, so the stacks load in the same flame graph tools
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Record the stack of a thread at a fixed interval from a background thread, as collapsed stacks."""
+
+    def __init__(self, interval: float, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks: Mapping[str, int] = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack: List[str] = list()
+            while frame is not None:
+                stack.append(format_frame(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def collapsed(self) -> bytes:
+        """One line per stack, its frames from the root separated by semicolons followed by its sample count."""
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        ).encode()
+
+
+@contextlib.contextmanager
+def profile_report(
+    report: Report, profiler: Literal["cprofile", "sampling"]
+) -> Iterator[None]:
+    """Run the block under the given profiler, and save the profile next to the file of the report."""
+    if profiler == "cprofile":
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+        profile.create_stats()
+        # the format of pstats.Stats.dump_stats, loaded back with pstats.Stats(path)
+        content = marshal.dumps(profile.stats)
+    elif profiler == "sampling":
+        sampler = SamplingProfiler(interval=settings.REPORT_PROFILE_INTERVAL)
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+        content = sampler.collapsed()
+    else:
+        raise ValueError(f"Unknown profiler: {profiler}")
+    suffix, _ = PROFILE_FILES[profiler]
+    storage = storages["reports"]
+    if report.profile_path:
+        storage.delete(report.profile_path)
+    report.profile_path = storage.save(
+        f"reports/{report.report_id}.{suffix}", ContentFile(content)
+    )
+
+
+def open_profile_file(report: Report) -> IO[bytes]:
+    return storages["reports"].open(report.profile_path, "rb")
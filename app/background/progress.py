@@ -0,0 +1,128 @@
+import time
+from typing import Iterable, Iterator, Mapping, Optional, TypeVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+T = TypeVar("T")
+
+
+def get_progress_key(report_id: str) -> str:
+    return f"report-progress:{report_id}"
+
+
+def get_stores_key(report_id: str) -> str:
+    # counter of the stores processed by the chunk tasks of a distributed report
+    return f"report-progress:{report_id}:stores"
+
+
+class ReportProgress:
+    """
+    Progress of the generation of a report, kept in the cache instead of the report row.
+    The updates are published at most once every REPORT_PROGRESS_INTERVAL seconds, and on every new phase.
+    """
+
+    def __init__(self, report_id: Optional[str] = None):
+        # the progress of a computation outside of a report task, such as a chunk, is only timed
+        self.report_id = str(report_id) if report_id is not None else None
+        self.phase: Optional[str] = None
+        # wall clock time, the phases of a distributed report run in several processes
+        self.phase_started = time.time()
+        # elapsed seconds of each finished phase
+        self.phases: Mapping[str, float] = dict()
+        self.stores_processed = 0
+        self.stores_total: Optional[int] = None
+        self.published = 0.0
+
+    @classmethod
+    def resume(cls, report_id: str) -> "ReportProgress":
+        """Continue the progress published by the task that started the report."""
+        progress = cls(report_id)
+        published = cache.get(get_progress_key(progress.report_id))
+        if published is not None:
+            progress.phase = published["phase"]
+            progress.phase_started = published["phase_started"]
+            progress.phases = published["phases"]
+            progress.stores_total = published["stores_total"]
+            progress.stores_processed = cache.get(
+                get_stores_key(progress.report_id), published["stores_processed"]
+            )
+        return progress
+
+    def start_phase(self, phase: str, stores_total: Optional[int] = None) -> None:
+        self.end_phase()
+        self.phase = phase
+        self.phase_started = time.time()
+        if stores_total is not None:
+            self.stores_total = stores_total
+        self.publish(force=True)
+
+    def end_phase(self) -> None:
+        if self.phase is not None:
+            self.phases[self.phase] = round(time.time() - self.phase_started, 3)
+
+    def track(self, items: Iterable[T]) -> Iterator[T]:
+        """Count the stores of a stream of store statuses as they are consumed."""
+        for item in items:
+            yield item
+            self.stores_processed += 1
+            self.publish()
+
+    def publish(self, force: bool = False) -> None:
+        now = time.time()
+        if self.report_id is None:
+            return
+        if not force and now - self.published < settings.REPORT_PROGRESS_INTERVAL:
+            return
+        self.published = now
+        cache.set(
+            get_progress_key(self.report_id),
+            {
+                "phase": self.phase,
+                "stores_processed": self.stores_processed,
+                "stores_total": self.stores_total,
+                "phase_started": self.phase_started,
+                "phases": self.phases,
+            },
+            timeout=settings.REPORT_INFLIGHT_TIMEOUT,
+        )
+
+    def finish(self) -> Mapping[str, float]:
+        """Clear the progress of the complete report and return the elapsed seconds of each phase."""
+        self.end_phase()
+        if self.report_id is not None:
+            clear_report_progress(self.report_id)
+        return self.phases
+
+
+def clear_report_progress(report_id: str) -> None:
+    """Drop the progress of a report once it is complete or failed."""
+    cache.delete_many([get_progress_key(str(report_id)), get_stores_key(str(report_id))])
+
+
+def add_stores_processed(report_id: str, count: int) -> None:
+    """Add the stores of a chunk of a distributed report to its progress."""
+    key = get_stores_key(report_id)
+    # the counter is created by the first chunk, incr fails on a missing key
+    if not cache.add(key, count, timeout=settings.REPORT_INFLIGHT_TIMEOUT):
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.add(key, count, timeout=settings.REPORT_INFLIGHT_TIMEOUT)
+
+
+def get_report_progress(report_id: str) -> Optional[Mapping]:
+    """Last published progress of a running report, None before its task starts."""
+    progress = cache.get(get_progress_key(report_id))
+    if progress is None:
+        return None
+    stores_processed = cache.get(get_stores_key(report_id))
+    if stores_processed is not None:
+        progress["stores_processed"] = stores_processed
+    # the current phase is timed when it is read, its updates are throttled
+    phase_started = progress.pop("phase_started")
+    progress["phases"] = {
+        **progress["phases"],
+        progress["phase"]: round(time.time() - phase_started, 3),
+    }
+    return progress
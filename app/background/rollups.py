@@ -0,0 +1,271 @@
+import datetime
+import itertools
+import time
+from typing import List, Mapping, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+
+from app.models import Store, StoreDailyRollup
+
+from .loaders import iter_store_statuses
+from .metrics import ReportMetrics
+from .progress import ReportProgress
+from .utils import business_window_to_utc
+from .vectorized import (
+    EPOCH,
+    REPORT_KEYS,
+    REPORT_WINDOWS,
+    US_PER_DAY,
+    US_PER_MINUTE,
+    build_report_columns_vectorized,
+    build_status_arrays,
+    datetime_to_us,
+    report_window_microseconds,
+    status_intervals,
+)
+
+
+def get_closed_days(
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+    last_updated_timestamp: datetime.datetime,
+) -> List[int]:
+    """
+    Utc days, counted from the epoch, whose business hours lie inside the last week and end
+    before the last day of the report, for every store.
+    Such a day adds up in full to the last week and never to the last day or hour,
+    so its uptime and downtime do not change until new statuses are polled for it.
+    """
+    last_updated = datetime_to_us(last_updated_timestamp)
+    week_start = last_updated - 7 * US_PER_DAY
+    day_start = last_updated - US_PER_DAY
+    closed_days: List[int] = list()
+    # the statuses of a day are all part of the report only when the day starts inside the week
+    for day in range(-(-week_start // US_PER_DAY), day_start // US_PER_DAY + 1):
+        utc_date = EPOCH + datetime.timedelta(days=day)
+        windows = {
+            (stores_timezones[store_id], *hours[utc_date.weekday()])
+            for store_id, hours in store_hours.items()
+        }
+        closed = True
+        for timezone, start_time_local, end_time_local in windows:
+            start, end = business_window_to_utc(
+                timezone, utc_date.date(), start_time_local, end_time_local
+            )
+            if datetime_to_us(start) < week_start or datetime_to_us(end) > day_start:
+                closed = False
+                break
+        if closed:
+            closed_days.append(day)
+    return closed_days
+
+
+def compute_daily_rollups(
+    day: int,
+    store_ids: List[str],
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+) -> Mapping[str, Tuple[int, int, int]]:
+    """Uptime and downtime in microseconds, and number of polls, of the given stores for a utc day."""
+    day_start = EPOCH + datetime.timedelta(days=day)
+    store_statuses = iter_store_statuses(
+        since=day_start, until=day_start + datetime.timedelta(days=1), store_ids=store_ids
+    )
+    polled_ids, poll_store, poll_ts, poll_active = build_status_arrays(store_statuses)
+    interval_store, start, end, active = status_intervals(
+        poll_store, poll_ts, poll_active, polled_ids, store_hours, stores_timezones
+    )
+    # every interval of a closed day is counted in full
+    duration = end - start
+    uptime = np.bincount(
+        interval_store[active], weights=duration[active], minlength=len(polled_ids)
+    ).astype(np.int64)
+    downtime = np.bincount(
+        interval_store[~active], weights=duration[~active], minlength=len(polled_ids)
+    ).astype(np.int64)
+    poll_count = np.bincount(poll_store, minlength=len(polled_ids))
+    rollups = {store_id: (0, 0, 0) for store_id in store_ids}
+    for store, store_id in enumerate(polled_ids):
+        rollups[store_id] = (
+            int(uptime[store]),
+            int(downtime[store]),
+            int(poll_count[store]),
+        )
+    return rollups
+
+
+def ensure_daily_rollups(
+    days: List[int],
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+    store_ids: Optional[List[str]] = None,
+) -> None:
+    """Persist the missing rollups of the given closed days, for every store."""
+    stores = Store.objects.all()
+    if store_ids is not None:
+        stores = stores.filter(store_id__in=store_ids)
+    store_pks = dict(stores.values_list("store_id", "id"))
+    for day in days:
+        date = (EPOCH + datetime.timedelta(days=day)).date()
+        rollups = StoreDailyRollup.objects.filter(date=date)
+        if store_ids is not None:
+            rollups = rollups.filter(store__store_id__in=store_ids)
+        # stores without polls get an empty rollup, so only new or invalidated rollups are missing
+        computed = set(rollups.values_list("store__store_id", flat=True))
+        missing = [store_id for store_id in store_pks if store_id not in computed]
+        for start in range(0, len(missing), settings.REPORT_BATCH_SIZE):
+            batch = missing[start : start + settings.REPORT_BATCH_SIZE]
+            StoreDailyRollup.objects.bulk_create(
+                [
+                    StoreDailyRollup(
+                        store_id=store_pks[store_id],
+                        date=date,
+                        uptime_microseconds=uptime,
+                        downtime_microseconds=downtime,
+                        poll_count=poll_count,
+                    )
+                    for store_id, (uptime, downtime, poll_count) in compute_daily_rollups(
+                        day, batch, store_hours, stores_timezones
+                    ).items()
+                ],
+                ignore_conflicts=True,
+            )
+
+
+def replay_legacy_rounding(
+    totals: Mapping[str, List[int]],
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+    last_updated_timestamp: datetime.datetime,
+) -> Mapping[str, List[int]]:
+    """
+    Report values of the stores with an exact total, in microseconds, of a whole minute, computed again
+    from all their polls of the last week by the vectorized engine.
+    The tick engine sums float seconds, which can land just below a whole minute, and the exact totals
+    of the closed days cannot tell when it does.
+    """
+    store_ids = [
+        store_id
+        for store_id, values in totals.items()
+        if any(value > 0 and value % US_PER_MINUTE == 0 for value in values)
+    ]
+    if not store_ids:
+        return dict()
+    columns = build_report_columns_vectorized(
+        iter_store_statuses(
+            since=last_updated_timestamp - datetime.timedelta(days=7),
+            until=last_updated_timestamp + datetime.timedelta(microseconds=1),
+            store_ids=store_ids,
+        ),
+        store_hours,
+        stores_timezones,
+        last_updated_timestamp,
+    )
+    return {
+        store_id: [columns[key][store] for key in REPORT_KEYS]
+        for store, store_id in enumerate(columns["store_id"])
+    }
+
+
+def build_report_data_incremental(
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+    last_updated_timestamp: datetime.datetime,
+    store_ids: Optional[List[str]] = None,
+    until: Optional[datetime.datetime] = None,
+    progress: Optional[ReportProgress] = None,
+    metrics: Optional[ReportMetrics] = None,
+) -> List[Mapping[str, int]]:
+    """
+    Compute the report data from the statuses of the open days only, and add the closed days
+    of the last week from their daily rollups.
+    The totals are summed exactly in microseconds, the stores whose totals the tick engine
+    may round differently are computed again from their polls.
+    """
+    metrics = metrics or ReportMetrics()
+    closed_days = get_closed_days(store_hours, stores_timezones, last_updated_timestamp)
+    closed_range = None
+    if closed_days:
+        with metrics.phase("rollups"):
+            ensure_daily_rollups(closed_days, store_hours, stores_timezones, store_ids)
+        closed_range = (
+            EPOCH + datetime.timedelta(days=closed_days[0]),
+            EPOCH + datetime.timedelta(days=closed_days[-1] + 1),
+        )
+    # totals = {store_id: [microseconds of each report key, ...]}
+    totals: Mapping[str, List[int]] = dict()
+    store_statuses = metrics.count_statuses(
+        iter_store_statuses(
+            since=last_updated_timestamp - datetime.timedelta(days=7),
+            until=until,
+            store_ids=store_ids,
+            exclude=closed_range,
+        )
+    )
+    if progress is not None:
+        store_statuses = progress.track(store_statuses)
+    while True:
+        with metrics.phase("status_load"):
+            batch = list(itertools.islice(store_statuses, settings.REPORT_BATCH_SIZE))
+        if not batch:
+            break
+        start = time.perf_counter()
+        with metrics.phase("compute"):
+            batch_ids, poll_store, poll_ts, poll_active = build_status_arrays(batch)
+            microseconds = report_window_microseconds(
+                *status_intervals(
+                    poll_store, poll_ts, poll_active, batch_ids, store_hours, stores_timezones
+                ),
+                store_count=len(batch_ids),
+                last_updated_timestamp=last_updated_timestamp,
+            )
+        metrics.observe_store_compute(time.perf_counter() - start, len(batch))
+        for store, store_id in enumerate(batch_ids):
+            totals[store_id] = [int(microseconds[key][store]) for key in REPORT_KEYS]
+    if closed_days:
+        rollups = StoreDailyRollup.objects.filter(
+            date__gte=closed_range[0].date(),
+            date__lt=closed_range[1].date(),
+            poll_count__gt=0,
+        )
+        if store_ids is not None:
+            rollups = rollups.filter(store__store_id__in=store_ids)
+        for store_id, uptime, downtime in (
+            rollups.values("store__store_id")
+            .annotate(uptime=Sum("uptime_microseconds"), downtime=Sum("downtime_microseconds"))
+            .values_list("store__store_id", "uptime", "downtime")
+        ):
+            store_totals = totals.setdefault(store_id, [0] * len(REPORT_KEYS))
+            store_totals[REPORT_KEYS.index("uptime_last_week")] += uptime
+            store_totals[REPORT_KEYS.index("downtime_last_week")] += downtime
+    with metrics.phase("legacy_rounding"):
+        replayed = replay_legacy_rounding(
+            totals, store_hours, stores_timezones, last_updated_timestamp
+        )
+    metrics.count("stores_replayed", len(replayed))
+    stores = Store.objects.all()
+    if store_ids is not None:
+        stores = stores.filter(store_id__in=store_ids)
+    store_pks = dict(stores.values_list("store_id", "id"))
+    units = {
+        f"{prefix}_{suffix}": unit
+        for suffix, _, unit in REPORT_WINDOWS
+        for prefix in ("uptime", "downtime")
+    }
+    # the stores are listed in the order the statuses are streamed in
+    return [
+        {
+            **(
+                dict(zip(REPORT_KEYS, replayed[store_id]))
+                if store_id in replayed
+                else {
+                    key: value // units[key]
+                    for key, value in zip(REPORT_KEYS, totals[store_id])
+                }
+            ),
+            "store_id": store_id,
+        }
+        for store_id in sorted(totals, key=store_pks.get)
+    ]
@@ -0,0 +1,57 @@
+import datetime
+import zlib
+from typing import Callable, Iterable, List, Literal, Mapping, Tuple
+
+import django
+from billiard.pool import Pool
+
+
+def get_shard(store_id: str, shard_count: int) -> int:
+    """Stable shard of a store, the same in every process unlike the builtin hash."""
+    return zlib.crc32(store_id.encode()) % shard_count
+
+
+def build_report_data_sharded(
+    engine: Callable[..., List[Mapping[str, int]]],
+    shard_count: int,
+    store_statuses: Iterable[
+        Tuple[str, List[Tuple[datetime.datetime, Literal["active", "inactive"]]]]
+    ],
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+    last_updated_timestamp: datetime.datetime,
+) -> List[Mapping[str, int]]:
+    """
+    Split the stores into shards by store_id hash and compute them on a process pool.
+    The pool is billiard's, as the processes of the prefork pool of celery are daemonic and
+    the pools of multiprocessing cannot be started from them.
+    """
+    # position of each store, to merge the shards back in the order of the serial path
+    positions: Mapping[str, int] = dict()
+    shards: List[List[Tuple[str, list]]] = [list() for _ in range(shard_count)]
+    for store_id, statuses in store_statuses:
+        positions[store_id] = len(positions)
+        shards[get_shard(store_id, shard_count)].append((store_id, statuses))
+    report_data: List[Mapping[str, int]] = list()
+    # the initializer sets up django in the workers when they are not forked
+    with Pool(processes=shard_count, initializer=django.setup) as pool:
+        results = [
+            pool.apply_async(
+                engine,
+                kwds=dict(
+                    store_statuses=shard,
+                    # each shard gets only the hours and timezones of its stores
+                    store_hours={store_id: store_hours[store_id] for store_id, _ in shard},
+                    stores_timezones={
+                        store_id: stores_timezones[store_id] for store_id, _ in shard
+                    },
+                    last_updated_timestamp=last_updated_timestamp,
+                ),
+            )
+            for shard in shards
+            if shard
+        ]
+        for result in results:
+            report_data.extend(result.get())
+    report_data.sort(key=lambda store_data: positions[store_data["store_id"]])
+    return report_data
@@ -0,0 +1,203 @@
+import datetime
+import time
+from typing import List, Mapping, Optional, Tuple
+
+import numpy as np
+from django.db import connection
+
+from app.models import Store, StoreStatus
+
+from .metrics import ReportMetrics
+from .vectorized import (
+    REPORT_KEYS,
+    REPORT_WINDOWS,
+    US_PER_DAY,
+    business_windows,
+    datetime_to_us,
+)
+
+# table of the business hours of every store and utc day of the report, filled for each report
+WINDOWS_TABLE = "report_business_windows"
+
+# expressions of each database supported by the sql engine
+SQL_FUNCTIONS = {
+    "mysql": {
+        "timestamp_us": "TIMESTAMPDIFF(MICROSECOND, '1970-01-01 00:00:00', {column})",
+        "day": "{value} DIV {US_PER_DAY}",
+        "greatest": "GREATEST",
+        "least": "LEAST",
+    },
+    # the timestamps are stored as text, with their microseconds after the seconds when not zero
+    "sqlite": {
+        "timestamp_us": (
+            "(CAST(strftime('%%s', {column}) AS INTEGER) * 1000000"
+            " + CAST(substr({column}, 21, 6) AS INTEGER))"
+        ),
+        "day": "{value} / {US_PER_DAY}",
+        "greatest": "MAX",
+        "least": "MIN",
+    },
+}
+
+
+def get_sql_functions() -> Mapping[str, str]:
+    if connection.vendor not in SQL_FUNCTIONS:
+        raise ValueError(f"The sql report engine does not support {connection.vendor}")
+    return SQL_FUNCTIONS[connection.vendor]
+
+
+def build_business_windows(
+    store_pks: Mapping[str, str],
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+    first_day: int,
+    last_day: int,
+) -> List[Tuple[str, str, int, int, int]]:
+    """Business hours of every store on every utc day from first_day to last_day, as (store pk, store, day, start, end) rows."""
+    store_ids = [store_id for store_id in store_hours if store_id in store_pks]
+    days = np.arange(first_day, last_day + 1)
+    group_store = np.repeat(np.arange(len(store_ids)), len(days))
+    group_day = np.tile(days, len(store_ids))
+    start, end = business_windows(
+        group_store, group_day, store_ids, store_hours, stores_timezones
+    )
+    return [
+        (store_pks[store_ids[store]], store_ids[store], day, window_start, window_end)
+        for store, day, window_start, window_end in zip(
+            group_store.tolist(), group_day.tolist(), start.tolist(), end.tolist()
+        )
+    ]
+
+
+def format_report_query(store_filter: str, last_updated: int) -> str:
+    """
+    Query of the uptime and downtime of every store in microseconds.
+    A poll holds its status until the next poll of the day during the business hours, the last one until
+    their end and the first one back to their start, like the sweep engine. A day polled only outside of
+    its business hours is down. The statuses of a store are never moved out of the database.
+    """
+    functions = get_sql_functions()
+    greatest, least = functions["greatest"], functions["least"]
+    timestamp_us = functions["timestamp_us"].format(column="statuses.timestamp_utc")
+    day = functions["day"].format(value="polls.ts", US_PER_DAY=US_PER_DAY)
+    # the exact overlap of each segment with the last hour, day and week
+    overlaps = {
+        suffix: f"{greatest}({least}(segment_end, {last_updated})"
+        f" - {greatest}(segment_start, {last_updated - width}), 0)"
+        for suffix, width, _ in REPORT_WINDOWS
+    }
+    statuses = {"uptime": StoreStatus.Status.ACTIVE, "downtime": StoreStatus.Status.INACTIVE}
+    sums = [
+        f"SUM(CASE WHEN active = {statuses[prefix]} THEN {overlaps[suffix]} ELSE 0 END) AS {key}"
+        for key in REPORT_KEYS
+        for prefix, suffix in [key.split("_", 1)]
+    ]
+    return f"""
+        WITH polls AS (
+            SELECT statuses.store_id AS store_pk, statuses.status, {timestamp_us} AS ts
+            FROM {StoreStatus._meta.db_table} AS statuses
+            WHERE statuses.timestamp_utc >= %s AND statuses.timestamp_utc < %s {store_filter}
+        ),
+        day_polls AS (
+            SELECT polls.store_pk, windows.store_id, windows.day, windows.start_us,
+                windows.end_us, polls.status, polls.ts,
+                CASE WHEN polls.ts BETWEEN windows.start_us AND windows.end_us THEN 1 ELSE 0 END AS inside
+            FROM polls
+            JOIN {WINDOWS_TABLE} AS windows
+                ON windows.store_pk = polls.store_pk AND windows.day = {day}
+        ),
+        ranked AS (
+            SELECT store_pk, store_id, start_us, end_us, status, ts, inside,
+                LAG(ts) OVER day_window AS previous_ts,
+                LEAD(ts) OVER day_window AS next_ts,
+                SUM(inside) OVER (PARTITION BY store_pk, day) AS polls_inside
+            FROM day_polls
+            WINDOW day_window AS (PARTITION BY store_pk, day, inside ORDER BY ts)
+        ),
+        segments AS (
+            SELECT store_pk, store_id,
+                CASE WHEN previous_ts IS NULL THEN start_us ELSE ts END AS segment_start,
+                CASE
+                    WHEN inside = 1 THEN COALESCE(next_ts, end_us)
+                    WHEN polls_inside = 0 THEN end_us
+                    ELSE start_us
+                END AS segment_end,
+                CASE WHEN inside = 1 THEN status ELSE {StoreStatus.Status.INACTIVE} END AS active
+            FROM ranked
+            WHERE inside = 1 OR previous_ts IS NULL
+        )
+        SELECT store_id, {", ".join(sums)}
+        FROM segments
+        GROUP BY store_pk, store_id
+        ORDER BY store_pk
+    """
+
+
+def build_report_columns_sql(
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+    last_updated_timestamp: datetime.datetime,
+    store_ids: Optional[List[str]] = None,
+    metrics: Optional[ReportMetrics] = None,
+) -> Mapping[str, List]:
+    """
+    Compute the report columns in the database, with window functions over the polls of each store,
+    so that only one row per store is fetched instead of its polls.
+    The business hours of every store and day are written to a temporary table joined with the polls.
+    """
+    metrics = metrics or ReportMetrics()
+    last_updated = datetime_to_us(last_updated_timestamp)
+    since = last_updated_timestamp - datetime.timedelta(days=7)
+    until = last_updated_timestamp + datetime.timedelta(microseconds=1)
+    stores = Store.objects.all()
+    if store_ids is not None:
+        stores = stores.filter(store_id__in=store_ids)
+    store_pks = dict(stores.values_list("store_id", "id"))
+    if not store_pks:
+        return {key: list() for key in ["store_id", *REPORT_KEYS]}
+    with metrics.phase("business_windows"):
+        windows = build_business_windows(
+            store_pks,
+            store_hours,
+            stores_timezones,
+            datetime_to_us(since) // US_PER_DAY,
+            last_updated // US_PER_DAY,
+        )
+    params = [
+        connection.ops.adapt_datetimefield_value(since),
+        connection.ops.adapt_datetimefield_value(until),
+    ]
+    store_filter = ""
+    if store_ids is not None:
+        # only the polls of the given stores are read, the store ids may be a query of their own
+        stores_query, stores_params = stores.values("id").query.sql_with_params()
+        store_filter = f"AND statuses.store_id IN ({stores_query})"
+        params.extend(stores_params)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {WINDOWS_TABLE} (store_pk VARCHAR(36), store_id VARCHAR(255),"
+            " day BIGINT, start_us BIGINT, end_us BIGINT)"
+        )
+        try:
+            with metrics.phase("business_windows"):
+                cursor.executemany(
+                    f"INSERT INTO {WINDOWS_TABLE} VALUES (%s, %s, %s, %s, %s)", windows
+                )
+            start = time.perf_counter()
+            with metrics.phase("compute"):
+                cursor.execute(format_report_query(store_filter, last_updated), params)
+                rows = cursor.fetchall()
+            metrics.observe_store_compute(time.perf_counter() - start, len(rows))
+        finally:
+            cursor.execute(f"DROP TABLE {WINDOWS_TABLE}")
+    metrics.count("stores_polled", len(rows))
+    units = {
+        f"{prefix}_{suffix}": unit
+        for suffix, _, unit in REPORT_WINDOWS
+        for prefix in ("uptime", "downtime")
+    }
+    columns: Mapping[str, List] = {"store_id": [row[0] for row in rows]}
+    for index, key in enumerate(REPORT_KEYS, start=1):
+        # the sums of MySQL are decimals
+        columns[key] = [int(row[index]) // units[key] for row in rows]
+    return columns
@@ -0,0 +1,103 @@
+import gzip
+import hashlib
+from typing import IO, Iterator, Mapping
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+
+from app.models import Report
+
+
+class GzipReader(gzip.GzipFile):
+    """Decompressing reader streamed only once, so responses do not decompress it to find its length."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # the name of the compressed file would give responses its compressed size
+        self.name = ""
+
+    def seekable(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        # GzipFile closes only the files it opened itself, not the storage file it is given
+        fileobj = self.fileobj
+        try:
+            super().close()
+        finally:
+            if fileobj is not None:
+                fileobj.close()
+
+
+def save_report_file(report: Report, csv_data: str) -> None:
+    """Write the csv of a report to the reports storage as gzip, and set its path, size and checksum."""
+    # a fixed mtime keeps the file and its checksum the same for the same csv
+    content = csv_data.encode()
+    compressed = gzip.compress(content, mtime=0)
+    storage = storages["reports"]
+    if report.file_path:
+        storage.delete(report.file_path)
+    report.file_path = storage.save(
+        f"reports/{report.report_id}.csv.gz", ContentFile(compressed)
+    )
+    report.file_size = len(compressed)
+    report.content_size = len(content)
+    report.checksum = hashlib.sha256(compressed).hexdigest()
+
+
+def save_columnar_files(report: Report, files: Mapping[str, bytes]) -> None:
+    """Write the columnar files of a report next to its csv, and set their paths by format."""
+    storage = storages["reports"]
+    for path in report.columnar_files.values():
+        storage.delete(path)
+    report.columnar_files = {
+        format: storage.save(f"reports/{report.report_id}.{format}", ContentFile(content))
+        for format, content in files.items()
+    }
+
+
+def open_columnar_file(report: Report, format: str) -> IO[bytes]:
+    """Open the file of a complete report in one of its columnar formats."""
+    return storages["reports"].open(report.columnar_files[format], "rb")
+
+
+def open_report_file(report: Report, compressed: bool = True) -> IO[bytes]:
+    """Open the file of a complete report, decompressing it on the fly when not compressed."""
+    file = storages["reports"].open(report.file_path, "rb")
+    if compressed:
+        return file
+    return GzipReader(fileobj=file)
+
+
+def columnar_file_size(report: Report, format: str) -> int:
+    """Size of the file of a complete report in one of its columnar formats."""
+    return storages["reports"].size(report.columnar_files[format])
+
+
+def iter_file_range(file: IO[bytes], start: int, end: int, chunk_size: int) -> Iterator[bytes]:
+    """Stream the bytes start to end, inclusive, of an open file in chunks, and close it."""
+    with file:
+        if start:
+            # the stored files seek directly, the csv is decompressed up to the start
+            file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def iter_report_file(
+    report: Report, compressed: bool, start: int, end: int, chunk_size: int
+) -> Iterator[bytes]:
+    """Stream the bytes start to end, inclusive, of the file of a complete report in chunks."""
+    yield from iter_file_range(open_report_file(report, compressed=compressed), start, end, chunk_size)
+
+
+def iter_columnar_file(
+    report: Report, format: str, start: int, end: int, chunk_size: int
+) -> Iterator[bytes]:
+    """Stream the bytes start to end, inclusive, of a columnar file of a complete report in chunks."""
+    yield from iter_file_range(open_columnar_file(report, format), start, end, chunk_size)
@@ -1,11 +1,32 @@
+from django.conf import settings
 from django.dispatch import receiver
 from .task_signal import task_signal
-from .tasks import generate_report
+from .tasks import generate_report, generate_report_distributed
 from .params import TaskParams
 
 
 @receiver(task_signal, weak=False)
 def task_handler(*args, **kwargs):
     """Handle the task signal and start the report generation task in background powered by Celery."""
-    task_params = TaskParams(report_id=kwargs.get("report_id"))
-    generate_report.delay(report_id=task_params.report_id)
+    task_params = TaskParams(
+        report_id=kwargs.get("report_id"),
+        last_updated_timestamp=kwargs.get("last_updated_timestamp"),
+        store_ids=kwargs.get("store_ids"),
+        timezone=kwargs.get("timezone"),
+        profile=kwargs.get("profile"),
+    )
+    task_kwargs = dict(
+        report_id=task_params.report_id,
+        store_ids=task_params.store_ids,
+        timezone=task_params.timezone,
+    )
+    if task_params.last_updated_timestamp is not None:
+        task_kwargs["last_updated_timestamp"] = task_params.last_updated_timestamp.isoformat()
+    if task_params.profile is not None:
+        # a profiled report runs in a single task, so that the whole run is in its profile
+        generate_report.delay(**task_kwargs, profile=task_params.profile)
+    elif settings.REPORT_DISTRIBUTED:
+        # split the report into chunks of stores computed across the worker nodes
+        generate_report_distributed.delay(**task_kwargs)
+    else:
+        generate_report.delay(**task_kwargs)
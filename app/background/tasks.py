@@ -1,28 +1,48 @@
+import contextlib
 import datetime
-from typing import List, Literal, Mapping, Tuple
+import itertools
+import time
+from typing import Iterable, List, Literal, Mapping, Optional, Tuple
 
 import pandas as pd
-import pytz
+from celery import chord, group
+from django.conf import settings
 
-from app.models import Report, Store, StoreHours, StoreStatus
+from app.models import Report, StoreStatus
+from app.services import ReportCacheService, ReportService
 
-from .celery import app
+from .celery import CeleryTask, app
+from .columnar import (
+    build_report_table,
+    get_columnar_formats,
+    read_report_table,
+    write_columnar_files,
+)
+from .notifications import publish_report_status
+from .online import build_report_columns_online
+from .loaders import (
+    filter_store_ids,
+    get_last_updated_timestamp,
+    iter_store_statuses,
+    load_store_hours,
+    load_store_timezones,
+)
+from .rollups import build_report_data_incremental, ensure_daily_rollups, get_closed_days
+from .metrics import ReportMetrics
 from .params import TaskParams
-
-
-def get_day_of_week(datetime: datetime.datetime) -> int:
-    return datetime.weekday()
-
-
-def local_time_to_utc_datetime(
-    local_time: datetime.time, timezone: str, utc_time_for_date: datetime.datetime
-) -> datetime.datetime:
-    local_timezone = pytz.timezone(timezone)
-    local_date_time = local_timezone.localize(
-        datetime.datetime.combine(utc_time_for_date.date(), local_time)
-    )
-    utc_datetime = local_date_time.astimezone(pytz.utc)
-    return utc_datetime
+from .partitions import manage_partitions
+from .profiling import profile_report
+from .progress import ReportProgress, add_stores_processed, clear_report_progress
+from .sharding import build_report_data_sharded
+from .sql import build_report_columns_sql
+from .storage import save_columnar_files, save_report_file
+from .sweep import build_report_columns_sweep, build_report_data_sweep
+from .utils import (
+    business_window_cache_stats,
+    business_window_to_utc,
+    get_day_of_week,
+)
+from .vectorized import build_report_columns_vectorized, build_report_data_vectorized
 
 
 def update_count_last_hour(
@@ -143,11 +163,8 @@ def build_report_data_for_store(
         ]
         # converting the local start and end time to utc
         # as the status timestamps are in utc
-        start_time_utc = local_time_to_utc_datetime(
-            start_time_local, store_timezone, each_day[0][0]
-        )
-        end_time_utc = local_time_to_utc_datetime(
-            end_time_local, store_timezone, each_day[0][0]
+        start_time_utc, end_time_utc = business_window_to_utc(
+            store_timezone, each_day[0][0].date(), start_time_local, end_time_local
         )
         # filtering the statuses based on the start and end time of the store
         # in order to consider only the statuses during the business hours
@@ -162,6 +179,9 @@ def build_report_data_for_store(
             current_time += datetime.timedelta(minutes=15)
         if current_time - datetime.timedelta(minutes=15) < end_time_utc:
             all_time_intervals_of_business_hours.append((end_time_utc, None))
+        # business hours ending before they start, such as overnight hours, count no time
+        if not all_time_intervals_of_business_hours:
+            continue
         # append the status from polled data to the time intervals of business hours
         for log in filtered_business_hours:
             all_time_intervals_of_business_hours.append((log[0], log[1]))
@@ -225,101 +245,287 @@ def build_report_data_for_store(
     return store_data
 
 
-def generate_csv_from_dict(data: List[dict]) -> str:
-    df = pd.DataFrame(data)
-    # reordering the columns
-    df = df[
-        [
-            "store_id",
-            "uptime_last_hour",
-            "uptime_last_day",
-            "uptime_last_week",
-            "downtime_last_hour",
-            "downtime_last_day",
-            "downtime_last_week",
-        ]
-    ]
-    # renaming the columns
-    df.columns = [
-        "store_id",
-        "uptime_last_hour (in minutes)",
-        "uptime_last_day (in hours)",
-        "uptime_last_week (in hours)",
-        "downtime_last_hour (in minutes)",
-        "downtime_last_day (in hours)",
-        "downtime_last_week (in hours)",
-    ]
+# keys of the report data of a store, in the order of the report columns
+REPORT_DATA_COLUMNS = [
+    "store_id",
+    "uptime_last_hour",
+    "uptime_last_day",
+    "uptime_last_week",
+    "downtime_last_hour",
+    "downtime_last_day",
+    "downtime_last_week",
+]
+# columns of the generated csv
+REPORT_CSV_COLUMNS = [
+    "store_id",
+    "uptime_last_hour (in minutes)",
+    "uptime_last_day (in hours)",
+    "uptime_last_week (in hours)",
+    "downtime_last_hour (in minutes)",
+    "downtime_last_day (in hours)",
+    "downtime_last_week (in hours)",
+]
+
+
+def columns_from_report_data(data: List[dict]) -> Mapping[str, List]:
+    # the report data of the engines computing a dict per store, as one list per column
+    return {key: [store_data[key] for store_data in data] for key in REPORT_DATA_COLUMNS}
+
+
+def named_report_columns(columns: Mapping[str, List]) -> Mapping[str, List]:
+    # the report columns under their names in the generated files
+    return {name: columns[key] for key, name in zip(REPORT_DATA_COLUMNS, REPORT_CSV_COLUMNS)}
+
+
+def generate_csv_from_columns(columns: Mapping[str, List], header: bool = True) -> str:
+    df = pd.DataFrame(named_report_columns(columns))
     # storing the data in csv format
-    return df.to_csv(index=False, header=True)
+    return df.to_csv(index=False, header=header)
 
 
-def build_complete_report() -> str:
-    # getting the last updated timestamp in the db
-    last_updated_timestamp = (
-        StoreStatus.objects.order_by("-timestamp_utc").first().timestamp_utc
-    )
-    # filter the data in store_statuses for the last 7 days as we are considering only for past week
-    store_statuses = StoreStatus.objects.select_related("store").filter(
-        timestamp_utc__gte=last_updated_timestamp - datetime.timedelta(days=7)
-    )
-    # get all the store hours and stores
-    store_hours = StoreHours.objects.select_related("store").all()
-    stores = Store.objects.all()
-    # create a dictionary for mapping store_id and timezone
-    stores_timezones: Mapping[str, str] = dict()
-    for store in stores:
-        stores_timezones[store.store_id] = store.timezone
-    # create a dictionary for mapping store_id and store hours
-    # store_hours_dict = {store_id: [(start_time, end_time), ...]}
-    store_hours_dict: Mapping[str, List[Tuple[datetime.time, datetime.time]]] = dict()
-    for store_hour in store_hours:
-        if not store_hour.store.store_id in store_hours_dict:
-            store_hours_dict[store_hour.store.store_id] = [
-                (0, 0)
-            ] * 7  # list of tuple of start_time and end_time for each day
-        store_hours_dict[store_hour.store.store_id][store_hour.day_of_week] = (
-            store_hour.start_time_local,
-            store_hour.end_time_local,
-        )  # updating the start_time and end_time for each day
-    store_hours = store_hours_dict
-    # create a dictionary for mapping store_id and store statuses
-    # store_statuses_dict = {store_id: [(timestamp_utc, status), ...]}
-    store_statuses_dict: Mapping[
-        str, List[Tuple[datetime.datetime, Literal["active", "inactive"]]]
-    ] = dict()
-    for store_status in store_statuses:
-        if not store_status.store.store_id in store_statuses_dict:
-            store_statuses_dict[store_status.store.store_id] = list()
-        store_statuses_dict[store_status.store.store_id].append(
-            (store_status.timestamp_utc, store_status.status)
-        )
-    store_statuses = store_statuses_dict
-    # deleting instances to release memory
-    del store_hours_dict
-    del store_statuses_dict
-    del stores
+def generate_csv_from_dict(data: List[dict], header: bool = True) -> str:
+    return generate_csv_from_columns(columns_from_report_data(data), header=header)
+
+
+def build_report_data(
+    store_statuses: Iterable[
+        Tuple[str, List[Tuple[datetime.datetime, Literal["active", "inactive"]]]]
+    ],
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+    last_updated_timestamp: datetime.datetime,
+) -> List[Mapping[str, int]]:
     report_data: List[Mapping[str, int]] = list()
     # iterate over all the stores and generate report data for each store
-    for store_id in store_statuses.keys():
-        # sort the store statuses based on timestamp
-        store_statuses[store_id].sort(key=lambda x: x[0])
+    for store_id, statuses in store_statuses:
         # for each store generate the report data
         store_report_data = build_report_data_for_store(
             store_id=store_id,
-            store_statuses=store_statuses[store_id],
+            store_statuses=statuses,
             store_hours=store_hours[store_id],
             store_timezone=stores_timezones[store_id],
             last_updated_timestamp=last_updated_timestamp,
         )
         # append the report data to the report_data list
         report_data.append(store_report_data)
+    return report_data
+
+
+# engines computing the report data, selected with the REPORT_ENGINE setting
+# "tick" computes each store on its own, "vectorized" computes all the stores at once,
+# "sweep" computes the exact overlap of the statuses with the windows, without the 15 minutes grid
+# and "sql" computes the same overlaps in the database
+REPORT_ENGINES = {
+    "tick": build_report_data,
+    "vectorized": build_report_data_vectorized,
+    "sweep": build_report_data_sweep,
+}
+# engines computing the report columns directly, without the report data of each store
+REPORT_COLUMN_ENGINES = {
+    "vectorized": build_report_columns_vectorized,
+    "sweep": build_report_columns_sweep,
+}
+# engines computing the report columns in the database, without loading the statuses
+REPORT_DATABASE_ENGINES = {
+    "sql": build_report_columns_sql,
+}
 
-    # generate csv from the report data
-    csv_data: str = generate_csv_from_dict(report_data)
+
+def build_report_columns(
+    engine: Optional[str] = None,
+    shards: Optional[int] = None,
+    store_ids: Optional[List[str]] = None,
+    last_updated_timestamp: Optional[datetime.datetime] = None,
+    incremental: Optional[bool] = None,
+    timezone: Optional[str] = None,
+    progress: Optional[ReportProgress] = None,
+    metrics: Optional[ReportMetrics] = None,
+    online: Optional[bool] = None,
+) -> Mapping[str, List]:
+    engine = engine or settings.REPORT_ENGINE
+    shards = shards or settings.REPORT_SHARDS
+    incremental = settings.REPORT_INCREMENTAL if incremental is None else incremental
+    online = settings.REPORT_ONLINE if online is None else online
+    if engine not in REPORT_ENGINES and engine not in REPORT_DATABASE_ENGINES:
+        raise ValueError(f"Unknown report engine: {engine}")
+    progress = progress or ReportProgress()
+    metrics = metrics or ReportMetrics()
+    # the business window cache lives as long as the process, its lookups are counted per report
+    window_cache = business_window_cache_stats()
+    progress.start_phase("loading")
+    if last_updated_timestamp is None:
+        with metrics.phase("watermark"):
+            last_updated_timestamp = get_last_updated_timestamp()
+    with metrics.phase("store_hours"):
+        if timezone is not None:
+            # only the stores of the timezone, pushed down into the queries as a subquery of their store ids
+            store_ids = filter_store_ids(store_ids=store_ids, timezone=timezone)
+        store_hours = load_store_hours(store_ids=store_ids)
+    with metrics.phase("store_timezones"):
+        stores_timezones = load_store_timezones(store_ids=store_ids)
+    metrics.count("stores", len(store_hours))
+    progress.start_phase("computing", stores_total=len(store_hours))
+    # the polls after the end of the report window are not part of it
+    until = last_updated_timestamp + datetime.timedelta(microseconds=1)
+    # stream the statuses of the last 7 days one store at a time, as we are considering only for past week
+    # the stream is lazy, so nothing is loaded when the incremental path does not consume it
+    store_statuses = progress.track(
+        metrics.count_statuses(
+            iter_store_statuses(
+                since=last_updated_timestamp - datetime.timedelta(days=7),
+                until=until,
+                store_ids=store_ids,
+            )
+        )
+    )
+    # the online states hold the polls of the week before the latest poll, not of earlier windows
+    if online and last_updated_timestamp >= get_last_updated_timestamp():
+        # one state per store, the closed days are summed from its totals and the rest from its polls
+        columns = build_report_columns_online(
+            store_hours=store_hours,
+            stores_timezones=stores_timezones,
+            last_updated_timestamp=last_updated_timestamp,
+            store_ids=store_ids,
+            metrics=metrics,
+        )
+    # compute the report data of all the stores with the selected engine
+    elif incremental:
+        # sum the closed days from their daily rollups, only the rest is computed from the statuses
+        report_data = build_report_data_incremental(
+            store_hours=store_hours,
+            stores_timezones=stores_timezones,
+            last_updated_timestamp=last_updated_timestamp,
+            store_ids=store_ids,
+            until=until,
+            progress=progress,
+            metrics=metrics,
+        )
+        columns = columns_from_report_data(report_data)
+    elif engine in REPORT_DATABASE_ENGINES:
+        # one row per store is fetched, the statuses are never loaded
+        columns = REPORT_DATABASE_ENGINES[engine](
+            store_hours=store_hours,
+            stores_timezones=stores_timezones,
+            last_updated_timestamp=last_updated_timestamp,
+            store_ids=store_ids,
+            metrics=metrics,
+        )
+    elif shards > 1:
+        # spread the stores over a pool of processes to use all the cores of the worker
+        # the statuses are loaded while the shards are filled, so they are timed with the compute
+        with metrics.phase("compute"):
+            report_data = build_report_data_sharded(
+                engine=REPORT_ENGINES[engine],
+                shard_count=shards,
+                store_statuses=store_statuses,
+                store_hours=store_hours,
+                stores_timezones=stores_timezones,
+                last_updated_timestamp=last_updated_timestamp,
+            )
+        columns = columns_from_report_data(report_data)
+    else:
+        # the statuses are loaded and computed in batches, so that both are timed apart
+        # the tick engine computes each store on its own, so each store is timed on its own
+        batch_size = 1 if engine == "tick" else settings.REPORT_BATCH_SIZE
+        columns = {key: list() for key in REPORT_DATA_COLUMNS}
+        while True:
+            with metrics.phase("status_load"):
+                batch = list(itertools.islice(store_statuses, batch_size))
+            if not batch:
+                break
+            start = time.perf_counter()
+            with metrics.phase("compute"):
+                engine_kwargs = dict(
+                    store_statuses=batch,
+                    store_hours=store_hours,
+                    stores_timezones=stores_timezones,
+                    last_updated_timestamp=last_updated_timestamp,
+                )
+                if engine in REPORT_COLUMN_ENGINES:
+                    batch_columns = REPORT_COLUMN_ENGINES[engine](**engine_kwargs)
+                else:
+                    batch_columns = columns_from_report_data(
+                        REPORT_ENGINES[engine](**engine_kwargs)
+                    )
+            metrics.observe_store_compute(time.perf_counter() - start, len(batch))
+            for key in REPORT_DATA_COLUMNS:
+                columns[key].extend(batch_columns[key])
+    # the stores without polls in the last week have nothing to compute
+    progress.stores_processed = progress.stores_total
+
+    metrics.count("report_rows", len(columns["store_id"]))
+    window_cache_end = business_window_cache_stats()
+    for name in ("hits", "misses"):
+        metrics.count(f"business_window_cache_{name}", window_cache_end[name] - window_cache[name])
+    return columns
+
+
+def business_window_hit_rate(metrics: ReportMetrics) -> float:
+    """Hit rate of the business window cache over the lookups of a report."""
+    hits = metrics.counts.get("business_window_cache_hits", 0)
+    lookups = hits + metrics.counts.get("business_window_cache_misses", 0)
+    return hits / lookups if lookups else 0.0
+
+
+def build_complete_report(
+    engine: Optional[str] = None,
+    shards: Optional[int] = None,
+    store_ids: Optional[List[str]] = None,
+    last_updated_timestamp: Optional[datetime.datetime] = None,
+    header: bool = True,
+    incremental: Optional[bool] = None,
+    timezone: Optional[str] = None,
+    progress: Optional[ReportProgress] = None,
+    metrics: Optional[ReportMetrics] = None,
+    online: Optional[bool] = None,
+) -> str:
+    progress = progress or ReportProgress()
+    metrics = metrics or ReportMetrics()
+    columns = build_report_columns(
+        engine=engine,
+        shards=shards,
+        store_ids=store_ids,
+        last_updated_timestamp=last_updated_timestamp,
+        incremental=incremental,
+        timezone=timezone,
+        progress=progress,
+        metrics=metrics,
+        online=online,
+    )
+
+    progress.start_phase("formatting")
+    if not columns["store_id"] and not header:
+        return ""
+    # generate csv from the report columns
+    with metrics.phase("csv"):
+        csv_data: str = generate_csv_from_columns(columns, header=header)
+    metrics.count("csv_bytes", len(csv_data))
     return csv_data
 
 
-@app.task(bind=True)
+def fail_report(report_id: str) -> None:
+    """Mark a running report and the reports merged into it as failed, and release its in flight lock."""
+    report = Report.objects.filter(report_id=report_id, status="Running").first()
+    if report is None:
+        return
+    report.status = "Failed"
+    report.save(update_fields=["status"])
+    clear_report_progress(report_id)
+    merged_report_ids = ReportCacheService.fail_merged_reports(report)
+    # the clients waiting for the report stop waiting, and trigger it again
+    publish_report_status([report_id, *merged_report_ids], report.status)
+    print("Report Failed : ", report_id)
+
+
+class ReportTask(CeleryTask):
+    """Task generating a report, which fails with it instead of leaving it running."""
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        fail_report(kwargs["report_id"])
+        return super().on_failure(exc, task_id, args, kwargs, einfo)
+
+
+@app.task(bind=True, base=ReportTask)
 def generate_report(self, *args, **kwargs) -> None:
     # getting the report ID from the task params
     task_params = TaskParams(**kwargs)
@@ -328,10 +534,188 @@ def generate_report(self, *args, **kwargs) -> None:
     print("Generating Report : ", report_id)
     print("-" * 50)
     report = Report.objects.get(report_id=report_id)
-    csv_data = build_complete_report()
-    report.report = csv_data
+    # the progress is published to the cache, the report row is written only once complete
+    progress = ReportProgress(report_id)
+    # the timings and row counts are stored with the report once complete
+    metrics = ReportMetrics()
+    # the report is profiled only on request, nothing is traced otherwise
+    profiler = (
+        profile_report(report, task_params.profile)
+        if task_params.profile is not None
+        else contextlib.nullcontext()
+    )
+    with profiler:
+        columns = build_report_columns(
+            store_ids=task_params.store_ids,
+            last_updated_timestamp=task_params.last_updated_timestamp,
+            timezone=task_params.timezone,
+            progress=progress,
+            metrics=metrics,
+        )
+        progress.start_phase("formatting")
+        with metrics.phase("csv"):
+            csv_data = generate_csv_from_columns(columns)
+        metrics.count("csv_bytes", len(csv_data))
+        columnar_files: Mapping[str, bytes] = dict()
+        if get_columnar_formats():
+            # the Parquet and Arrow files are built from the columns, not parsed back from the csv
+            with metrics.phase("columnar"):
+                columnar_files = write_columnar_files(
+                    build_report_table(named_report_columns(columns))
+                )
+        progress.start_phase("saving")
+        with metrics.phase("save"):
+            save_report_file(report, csv_data)  # writing the compressed csv to the reports storage
+            save_columnar_files(report, columnar_files)
+    report.status = "Complete"
+    report.metrics = metrics.to_dict()
+    report.save()  # saving to db
+    ReportService.add_report_metrics(report.metrics)
+    merged_report_ids = ReportCacheService.complete_merged_reports(report)
+    # waking up the clients waiting for the report, instead of them polling the db
+    publish_report_status([report_id, *merged_report_ids], report.status)
+    print("Report phases (in seconds) : ", progress.finish())
+    print("Business window cache hit rate : ", business_window_hit_rate(metrics))
+    print("-" * 50)
+    print("Report Generated : ", report_id)
+    print("-" * 50)
+
+
+@app.task(bind=True, base=ReportTask)
+def generate_report_distributed(self, *args, **kwargs) -> None:
+    # getting the report ID from the task params
+    task_params = TaskParams(**kwargs)
+    report_id = task_params.report_id
+    print("-" * 50)
+    print("Distributing Report : ", report_id)
+    print("-" * 50)
+    progress = ReportProgress(report_id)
+    progress.start_phase("loading")
+    last_updated_timestamp = (
+        task_params.last_updated_timestamp or get_last_updated_timestamp()
+    )
+    # only the stores polled in the last 7 days are part of the report
+    polled_stores = StoreStatus.objects.filter(
+        timestamp_utc__gte=last_updated_timestamp - datetime.timedelta(days=7),
+        timestamp_utc__lte=last_updated_timestamp,
+    )
+    if task_params.store_ids is not None:
+        polled_stores = polled_stores.filter(store__store_id__in=task_params.store_ids)
+    if task_params.timezone is not None:
+        polled_stores = polled_stores.filter(store__timezone=task_params.timezone)
+    # in the order of the store pks like the serial report, so that the joined chunks
+    # give the same file, checksum and ETag
+    store_ids = [
+        store_id
+        for _, store_id in polled_stores.order_by("store_id")
+        .values_list("store_id", "store__store_id")
+        .distinct()
+    ]
+    chunk_size = settings.REPORT_CHUNK_SIZE
+    # the chunk tasks count their stores, the join task resumes the progress
+    progress.start_phase("computing", stores_total=len(store_ids))
+    # each chunk of stores is computed by its own task, on any worker node
+    chunks = group(
+        generate_report_chunk.s(
+            store_ids=store_ids[start : start + chunk_size],
+            last_updated_timestamp=last_updated_timestamp.isoformat(),
+            engine=settings.REPORT_ENGINE,
+            report_id=report_id,
+        )
+        for start in range(0, len(store_ids), chunk_size)
+    )
+    # the csv fragments of the chunks are joined into the report once all of them are done,
+    # the report fails when one of the chunks or their join fails
+    chord(chunks)(
+        join_report_chunks.s(report_id=report_id).on_error(
+            fail_report_chunks.si(report_id=report_id)
+        )
+    )
+
+
+@app.task(bind=True)
+def generate_report_chunk(
+    self,
+    store_ids: List[str],
+    last_updated_timestamp: str,
+    engine: str,
+    report_id: Optional[str] = None,
+) -> Mapping:
+    # csv rows of the given stores, without the header, and the metrics of their computation
+    metrics = ReportMetrics()
+    csv_data = build_complete_report(
+        engine=engine,
+        shards=1,
+        store_ids=store_ids,
+        last_updated_timestamp=datetime.datetime.fromisoformat(last_updated_timestamp),
+        header=False,
+        metrics=metrics,
+    )
+    if report_id is not None:
+        add_stores_processed(report_id, len(store_ids))
+    return {"csv": csv_data, "metrics": metrics.to_dict()}
+
+
+@app.task(bind=True)
+def fail_report_chunks(self, report_id: str) -> None:
+    # error callback of the chord of a distributed report
+    fail_report(report_id)
+
+
+@app.task(bind=True)
+def join_report_chunks(self, chunks: List[Mapping], report_id: str) -> None:
+    report = Report.objects.get(report_id=report_id)
+    progress = ReportProgress.resume(report_id)
+    progress.start_phase("saving")
+    # the phases of the chunks are summed, the seconds of all the workers spent on the report
+    metrics = ReportMetrics()
+    for chunk in chunks:
+        metrics.merge(ReportMetrics(chunk["metrics"]))
+    csv_data = generate_csv_from_dict([]) + "".join(chunk["csv"] for chunk in chunks)
+    columnar_files: Mapping[str, bytes] = dict()
+    if get_columnar_formats():
+        # the csv rows of the chunks are parsed once, by the arrow csv reader
+        with metrics.phase("columnar"):
+            columnar_files = write_columnar_files(read_report_table(csv_data, REPORT_CSV_COLUMNS))
+    with metrics.phase("save"):
+        save_report_file(report, csv_data)
+        save_columnar_files(report, columnar_files)
     report.status = "Complete"
+    report.metrics = metrics.to_dict()
     report.save()  # saving to db
+    ReportService.add_report_metrics(report.metrics)
+    merged_report_ids = ReportCacheService.complete_merged_reports(report)
+    # waking up the clients waiting for the report, instead of them polling the db
+    publish_report_status([report_id, *merged_report_ids], report.status)
+    print("Report phases (in seconds) : ", progress.finish())
+    print("Business window cache hit rate : ", business_window_hit_rate(metrics))
     print("-" * 50)
     print("Report Generated : ", report_id)
     print("-" * 50)
+
+
+@app.task(bind=True)
+def update_daily_rollups(self, *args, **kwargs) -> None:
+    # persist the rollups of the days closed since the last run, ahead of the next incremental report
+    last_updated_timestamp = get_last_updated_timestamp()
+    store_hours = load_store_hours()
+    stores_timezones = load_store_timezones()
+    ensure_daily_rollups(
+        days=get_closed_days(store_hours, stores_timezones, last_updated_timestamp),
+        store_hours=store_hours,
+        stores_timezones=stores_timezones,
+    )
+
+
+@app.task(bind=True)
+def manage_poll_partitions(self, *args, **kwargs) -> None:
+    # partition the polls of the coming days ahead of their ingestion, and drop the expired days
+    partitions = manage_partitions()
+    print("Poll partitions : ", partitions)
+
+
+@app.task(bind=True)
+def materialize_report(self, *args, **kwargs) -> None:
+    # compute the report of every store ahead of the requests, served as the latest report once complete
+    report_id = ReportService.start_report_generation(scheduled=True)
+    print("Report Scheduled : ", report_id)
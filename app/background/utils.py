@@ -0,0 +1,63 @@
+import datetime
+import functools
+from typing import Mapping, Tuple
+
+import pytz
+from django.conf import settings
+
+
+def get_day_of_week(datetime: datetime.datetime) -> int:
+    return datetime.weekday()
+
+
+def local_time_to_utc_datetime(
+    local_time: datetime.time, timezone: str, utc_time_for_date: datetime.datetime
+) -> datetime.datetime:
+    local_timezone = pytz.timezone(timezone)
+    local_date_time = local_timezone.localize(
+        datetime.datetime.combine(utc_time_for_date.date(), local_time)
+    )
+    utc_datetime = local_date_time.astimezone(pytz.utc)
+    return utc_datetime
+
+
+@functools.lru_cache(maxsize=settings.REPORT_WINDOW_CACHE_SIZE)
+def business_window_to_utc(
+    timezone: str,
+    date: datetime.date,
+    start_time_local: datetime.time,
+    end_time_local: datetime.time,
+) -> Tuple[datetime.datetime, datetime.datetime]:
+    """
+    Utc start and end of the business hours of a store on a date.
+    Most stores share a few timezones and business hours, so the windows are cached; the date is part
+    of the key as the utc offset of a timezone changes with daylight saving time.
+    """
+    utc_time_for_date = datetime.datetime.combine(date, datetime.time())
+    return (
+        local_time_to_utc_datetime(start_time_local, timezone, utc_time_for_date),
+        local_time_to_utc_datetime(end_time_local, timezone, utc_time_for_date),
+    )
+
+
+def business_window_cache_stats() -> Mapping[str, float]:
+    """Hits, misses, size and hit rate of the business window cache since the process started."""
+    info = business_window_to_utc.cache_info()
+    lookups = info.hits + info.misses
+    return dict(
+        hits=info.hits,
+        misses=info.misses,
+        size=info.currsize,
+        hit_rate=info.hits / lookups if lookups else 0.0,
+    )
+
+
+def parse_utc_timestamp(timestamp: str) -> datetime.datetime:
+    """Parse a poll timestamp such as "2023-01-22 12:09:39.388884 UTC", naive timestamps are utc."""
+    timestamp = str(timestamp).strip()
+    if timestamp.endswith(" UTC"):
+        timestamp = timestamp[: -len(" UTC")] + "+00:00"
+    parsed = datetime.datetime.fromisoformat(timestamp)
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.astimezone(datetime.timezone.utc)
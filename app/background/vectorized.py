@@ -0,0 +1,309 @@
+import datetime
+import itertools
+from typing import Iterable, Iterator, List, Literal, Mapping, Tuple
+
+import numpy as np
+import pandas as pd
+import pytz
+from django.conf import settings
+
+from .utils import business_window_to_utc
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=pytz.utc)
+US_PER_SECOND = 1_000_000
+US_PER_MINUTE = 60 * US_PER_SECOND
+US_PER_HOUR = 60 * US_PER_MINUTE
+US_PER_DAY = 24 * US_PER_HOUR
+# interval between the synthetic ticks of the business hours grid
+TICK_US = 15 * US_PER_MINUTE
+# (suffix of the report key, width of the window, unit of the reported value)
+REPORT_WINDOWS = (
+    ("last_hour", US_PER_HOUR, US_PER_MINUTE),
+    ("last_day", US_PER_DAY, US_PER_HOUR),
+    ("last_week", 7 * US_PER_DAY, US_PER_HOUR),
+)
+
+# keys of the report data of a store, in the order `build_report_data_for_store` returns them
+REPORT_KEYS = [
+    "uptime_last_hour",
+    "uptime_last_day",
+    "uptime_last_week",
+    "downtime_last_hour",
+    "downtime_last_day",
+    "downtime_last_week",
+]
+
+
+def datetime_to_us(value: datetime.datetime) -> int:
+    """Convert an aware datetime to integer microseconds since the epoch."""
+    return (value - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def build_status_arrays(
+    store_statuses: Iterable[
+        Tuple[str, List[Tuple[datetime.datetime, Literal["active", "inactive"]]]]
+    ],
+) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Flatten the statuses of every store, already sorted by timestamp, into (store, timestamp, status) columns."""
+    store_ids: List[str] = list()
+    lengths: List[int] = list()
+    timestamps: List[datetime.datetime] = list()
+    statuses: List[str] = list()
+    for store_id, polls in store_statuses:
+        store_ids.append(store_id)
+        lengths.append(len(polls))
+        for timestamp, status in polls:
+            timestamps.append(timestamp)
+            statuses.append(status)
+    poll_store = np.repeat(np.arange(len(store_ids)), lengths)
+    poll_ts = pd.DatetimeIndex(pd.to_datetime(timestamps, utc=True)).as_unit("us").asi8
+    poll_active = np.array(statuses, dtype=object) == "active"
+    return store_ids, poll_store, poll_ts, poll_active
+
+
+def business_windows(
+    group_store: np.ndarray,
+    group_day: np.ndarray,
+    store_ids: List[str],
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Business hours of every (store, utc day) group as utc microsecond bounds."""
+    start = np.empty(len(group_store), dtype=np.int64)
+    end = np.empty(len(group_store), dtype=np.int64)
+    # most stores share a timezone and business hours, so convert each window only once
+    windows: Mapping[Tuple[str, int, datetime.time, datetime.time], Tuple[int, int]] = dict()
+    for group, (store, day) in enumerate(zip(group_store.tolist(), group_day.tolist())):
+        store_id = store_ids[store]
+        utc_date = EPOCH + datetime.timedelta(days=day)
+        (start_time_local, end_time_local) = store_hours[store_id][utc_date.weekday()]
+        key = (stores_timezones[store_id], day, start_time_local, end_time_local)
+        if key not in windows:
+            start_time_utc, end_time_utc = business_window_to_utc(
+                key[0], utc_date.date(), start_time_local, end_time_local
+            )
+            windows[key] = (datetime_to_us(start_time_utc), datetime_to_us(end_time_utc))
+        start[group], end[group] = windows[key]
+    return start, end
+
+
+def status_intervals(
+    poll_store: np.ndarray,
+    poll_ts: np.ndarray,
+    poll_active: np.ndarray,
+    store_ids: List[str],
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Intervals between consecutive points of the 15 minutes business hours grid of every store and day.
+    Each interval carries the interpolated status of its end point, exactly like `build_report_data_for_store`.
+    Returns the (store, start, end, active) columns in store and timestamp order.
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if not len(poll_ts):
+        return empty, empty, empty, np.empty(0, dtype=bool)
+    # dividing the polls of every store into utc days
+    poll_day = poll_ts // US_PER_DAY
+    new_group = np.ones(len(poll_ts), dtype=bool)
+    new_group[1:] = (poll_store[1:] != poll_store[:-1]) | (poll_day[1:] != poll_day[:-1])
+    poll_group = np.cumsum(new_group) - 1
+    group_store = poll_store[new_group]
+    start, end = business_windows(
+        group_store, poll_day[new_group], store_ids, store_hours, stores_timezones
+    )
+    # ticks of 15 mins from the start of the business hours, plus the end when it is not on the grid
+    tick_count = np.where(end >= start, (end - start) // TICK_US + 1, 0)
+    tick_group = np.repeat(np.arange(len(start)), tick_count)
+    tick_offset = np.arange(len(tick_group)) - np.repeat(
+        np.cumsum(tick_count) - tick_count, tick_count
+    )
+    tick_ts = start[tick_group] + tick_offset * TICK_US
+    end_group = np.flatnonzero(start + (tick_count - 1) * TICK_US < end)
+    # only the polls during the business hours are considered
+    inside = (poll_ts >= start[poll_group]) & (poll_ts <= end[poll_group])
+    point_group = np.concatenate((tick_group, end_group, poll_group[inside]))
+    point_ts = np.concatenate((tick_ts, end[end_group], poll_ts[inside]))
+    # -1 marks a tick without status, 0 / 1 an inactive / active poll
+    point_value = np.concatenate(
+        (
+            np.full(len(tick_group) + len(end_group), -1, dtype=np.int8),
+            poll_active[inside].astype(np.int8),
+        )
+    )
+    # stable sort on (group, timestamp) so ticks come before the polls of the same timestamp
+    order = np.argsort(point_ts, kind="stable")
+    order = order[np.argsort(point_group[order], kind="stable")]
+    point_group = point_group[order]
+    point_ts = point_ts[order]
+    point_value = point_value[order]
+    # forward fill the status from the last poll of the group, backward fill from its first poll
+    position = np.arange(len(point_ts))
+    is_poll = point_value >= 0
+    last_poll = np.maximum.accumulate(np.where(is_poll, position, -1))
+    group_begin = np.searchsorted(point_group, np.arange(len(start)))
+    first_poll = np.full(len(start), -1)
+    poll_position = np.flatnonzero(is_poll)
+    poll_groups, first_index = np.unique(point_group[poll_position], return_index=True)
+    first_poll[poll_groups] = poll_position[first_index]
+    source = np.where(
+        last_poll >= group_begin[point_group], last_poll, first_poll[point_group]
+    )
+    # groups without any poll during business hours have no status, which counts as downtime
+    point_active = (source >= 0) & (point_value[source] == 1)
+    # points sharing a timestamp collapse into the last one, as a series index does in `to_dict`
+    keep = np.ones(len(point_ts), dtype=bool)
+    keep[:-1] = (point_group[1:] != point_group[:-1]) | (point_ts[1:] != point_ts[:-1])
+    point_group = point_group[keep]
+    point_ts = point_ts[keep]
+    point_active = point_active[keep]
+    # every interval takes the status of its end point
+    same_group = point_group[1:] == point_group[:-1]
+    return (
+        group_store[point_group[1:][same_group]],
+        point_ts[:-1][same_group],
+        point_ts[1:][same_group],
+        point_active[1:][same_group],
+    )
+
+
+def _legacy_float_total(microseconds: np.ndarray) -> float:
+    # accumulate the seconds one by one as floats, as `update_count_last_*` do
+    total = 0
+    for value in microseconds.tolist():
+        total += value / US_PER_SECOND
+    return total
+
+
+def iter_window_durations(
+    interval_start: np.ndarray,
+    interval_end: np.ndarray,
+    interval_active: np.ndarray,
+    last_updated_timestamp: datetime.datetime,
+) -> Iterator[Tuple[str, int, np.ndarray, np.ndarray]]:
+    """Yield the report key, its unit, the counted microseconds of each interval and the intervals selected for it."""
+    last_updated = datetime_to_us(last_updated_timestamp)
+    for suffix, width, unit in REPORT_WINDOWS:
+        # an interval counts only when it starts inside the window, and is clamped at the last update
+        counted = (interval_start >= last_updated - width) & (
+            interval_start <= last_updated
+        )
+        duration = np.where(
+            counted, np.minimum(interval_end, last_updated) - interval_start, 0
+        )
+        yield f"uptime_{suffix}", unit, duration, counted & interval_active
+        yield f"downtime_{suffix}", unit, duration, counted & ~interval_active
+
+
+def report_window_microseconds(
+    interval_store: np.ndarray,
+    interval_start: np.ndarray,
+    interval_end: np.ndarray,
+    interval_active: np.ndarray,
+    store_count: int,
+    last_updated_timestamp: datetime.datetime,
+) -> Mapping[str, np.ndarray]:
+    """Exact uptime and downtime of every store for the last hour, day and week in microseconds."""
+    return {
+        key: np.bincount(
+            interval_store[selected], weights=duration[selected], minlength=store_count
+        ).astype(np.int64)
+        for key, _, duration, selected in iter_window_durations(
+            interval_start, interval_end, interval_active, last_updated_timestamp
+        )
+    }
+
+
+def report_window_totals(
+    interval_store: np.ndarray,
+    interval_start: np.ndarray,
+    interval_end: np.ndarray,
+    interval_active: np.ndarray,
+    store_count: int,
+    last_updated_timestamp: datetime.datetime,
+) -> Mapping[str, List[int]]:
+    """Uptime and downtime of every store for the last hour, day and week in report units."""
+    store_begin = np.searchsorted(interval_store, np.arange(store_count + 1))
+    totals: Mapping[str, List[int]] = dict()
+    for key, unit, duration, selected in iter_window_durations(
+        interval_start, interval_end, interval_active, last_updated_timestamp
+    ):
+        # exact sums in microseconds, reduced per store
+        total = np.bincount(
+            interval_store[selected], weights=duration[selected], minlength=store_count
+        ).astype(np.int64)
+        values = (total // unit).tolist()
+        # summing float seconds can land just below a whole minute, reproduce it
+        fractional = np.bincount(
+            interval_store[selected],
+            weights=duration[selected] % US_PER_SECOND != 0,
+            minlength=store_count,
+        )
+        for store in np.flatnonzero(
+            (total > 0) & (total % US_PER_MINUTE == 0) & (fractional > 0)
+        ).tolist():
+            segment = slice(store_begin[store], store_begin[store + 1])
+            seconds = _legacy_float_total(duration[segment][selected[segment]])
+            values[store] = int(seconds // 60 // (unit // US_PER_MINUTE))
+        totals[key] = values
+    return totals
+
+
+def build_report_data_vectorized(
+    store_statuses: Iterable[
+        Tuple[str, List[Tuple[datetime.datetime, Literal["active", "inactive"]]]]
+    ],
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+    last_updated_timestamp: datetime.datetime,
+) -> List[Mapping[str, int]]:
+    """Compute the report data of the stores over columnar arrays, one batch of stores at a time."""
+    columns = build_report_columns_vectorized(
+        store_statuses, store_hours, stores_timezones, last_updated_timestamp
+    )
+    return [
+        {**{key: columns[key][store] for key in REPORT_KEYS}, "store_id": store_id}
+        for store, store_id in enumerate(columns["store_id"])
+    ]
+
+
+def build_report_columns_vectorized(
+    store_statuses: Iterable[
+        Tuple[str, List[Tuple[datetime.datetime, Literal["active", "inactive"]]]]
+    ],
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+    last_updated_timestamp: datetime.datetime,
+) -> Mapping[str, List]:
+    """Compute the store ids and each report key of the stores as columns, without a dict per store."""
+    columns: Mapping[str, List] = {key: list() for key in ["store_id", *REPORT_KEYS]}
+    store_statuses = iter(store_statuses)
+    # batches keep the memory flat while the statuses are streamed from the database
+    while batch := list(itertools.islice(store_statuses, settings.REPORT_BATCH_SIZE)):
+        batch_columns = build_batch_report_columns(
+            batch, store_hours, stores_timezones, last_updated_timestamp
+        )
+        for key, column in batch_columns.items():
+            columns[key].extend(column)
+    return columns
+
+
+def build_batch_report_columns(
+    store_statuses: Iterable[
+        Tuple[str, List[Tuple[datetime.datetime, Literal["active", "inactive"]]]]
+    ],
+    store_hours: Mapping[str, List[Tuple[datetime.time, datetime.time]]],
+    stores_timezones: Mapping[str, str],
+    last_updated_timestamp: datetime.datetime,
+) -> Mapping[str, List]:
+    """Compute the report columns of a batch of stores in one pass."""
+    store_ids, poll_store, poll_ts, poll_active = build_status_arrays(store_statuses)
+    intervals = status_intervals(
+        poll_store, poll_ts, poll_active, store_ids, store_hours, stores_timezones
+    )
+    totals = report_window_totals(
+        *intervals,
+        store_count=len(store_ids),
+        last_updated_timestamp=last_updated_timestamp,
+    )
+    return {"store_id": list(store_ids), **{key: list(totals[key]) for key in REPORT_KEYS}}
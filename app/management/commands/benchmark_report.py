@@ -0,0 +1,315 @@
+import datetime
+import itertools
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app.background.fleet import FLEET_TIMEZONES, HOURS_SHAPES, clear_fleet, create_fleet
+from app.background.loaders import (
+    iter_store_statuses,
+    load_store_hours,
+    load_store_timezones,
+)
+from app.background.metrics import ReportMetrics
+from app.background.tasks import (
+    REPORT_DATABASE_ENGINES,
+    REPORT_ENGINES,
+    build_complete_report,
+    build_report_data_for_store,
+    generate_csv_from_dict,
+)
+
+# end of the polls of the synthetic fleets, fixed so that every run computes the same reports
+FLEET_UNTIL = datetime.datetime(2024, 10, 1, 18, 13, 22, tzinfo=datetime.timezone.utc)
+
+
+def summarize(seconds: List[float], items: int) -> Mapping[str, float]:
+    """Latency percentiles of the timed runs, and the throughput of the items of a run at the median latency."""
+    return {
+        "runs": len(seconds),
+        "items": items,
+        "mean_seconds": float(np.mean(seconds)),
+        "min_seconds": float(np.min(seconds)),
+        "p50_seconds": float(np.percentile(seconds, 50)),
+        "p90_seconds": float(np.percentile(seconds, 90)),
+        "p99_seconds": float(np.percentile(seconds, 99)),
+        "max_seconds": float(np.max(seconds)),
+        "throughput_per_second": items / float(np.percentile(seconds, 50)) if items else 0.0,
+    }
+
+
+def time_runs(run: Callable[[], object], repeat: int, warmup: int) -> List[float]:
+    for _ in range(warmup):
+        run()
+    seconds: List[float] = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def peak_memory(run: Callable[[], object]) -> int:
+    """Peak bytes allocated by one more run, traced apart from the timed runs as tracing slows them down."""
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the report generation on synthetic fleets of stores, "
+        "run with --settings=config.settings_bench"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stores",
+            type=int,
+            nargs="+",
+            default=[1000, 14000],
+            help="Sizes of the fleets, 1000 14000 100000 runs the full suite",
+        )
+        parser.add_argument(
+            "--timezones",
+            nargs="+",
+            default=FLEET_TIMEZONES,
+            help="Timezones the stores are spread over",
+        )
+        parser.add_argument(
+            "--hours",
+            choices=HOURS_SHAPES,
+            default="mixed",
+            help="Shape of the business hours of the stores",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=60,
+            help="Minutes between the polls of a store",
+        )
+        parser.add_argument(
+            "--uptime", type=float, default=0.9, help="Share of the polls that are active"
+        )
+        parser.add_argument(
+            "--days", type=int, default=8, help="Days of polls of each store"
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Seed of the fleets, the same seed writes the same fleets"
+        )
+        parser.add_argument(
+            "--engines",
+            nargs="+",
+            choices=[*REPORT_ENGINES, *REPORT_DATABASE_ENGINES],
+            default=["vectorized"],
+            help="Engines benchmarked on the complete report",
+        )
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=1000,
+            help="Number of stores build_report_data_for_store is timed on",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="Timed runs of each benchmark"
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=1, help="Runs before the timed runs of each benchmark"
+        )
+        parser.add_argument(
+            "--output",
+            help="JSON file the results are written to, benchmarks/<commit>.json by default",
+        )
+        parser.add_argument(
+            "--compare",
+            help="JSON results of an earlier run to compare the median latencies with",
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "REPORT_BENCHMARK", False):
+            raise CommandError(
+                "The benchmark deletes every store and poll, run it with --settings=config.settings_bench"
+            )
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1")
+        # the tables are created from the models on the empty benchmark database
+        call_command("migrate", run_syncdb=True, verbosity=0)
+        commit = get_commit()
+        results = {
+            "commit": commit,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "numpy": np.__version__,
+                "pandas": pd.__version__,
+                "database": f"{connection.vendor}:{settings.DATABASES['default']['NAME']}",
+            },
+            "options": {
+                key: options[key]
+                for key in (
+                    "timezones", "hours", "poll_interval", "uptime", "days", "seed",
+                    "engines", "sample", "repeat", "warmup",
+                )
+            },
+            "fleets": [self.benchmark_fleet(stores, options) for stores in options["stores"]],
+        }
+        output = Path(options["output"] or f"benchmarks/{commit[:12] if commit else 'local'}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+        self.stdout.write(f"Results written to {output}")
+        if options["compare"]:
+            self.compare(json.loads(Path(options["compare"]).read_text()), results)
+
+    def benchmark_fleet(self, stores: int, options) -> Mapping:
+        clear_fleet()
+        # the watermark and the store data hash of the previous fleet are cached
+        cache.clear()
+        start = time.perf_counter()
+        fleet = create_fleet(
+            stores=stores,
+            until=FLEET_UNTIL,
+            timezones=options["timezones"],
+            hours_shape=options["hours"],
+            poll_interval=datetime.timedelta(minutes=options["poll_interval"]),
+            uptime=options["uptime"],
+            days=options["days"],
+            seed=options["seed"],
+        )
+        self.stdout.write(
+            f"{fleet['stores']} stores, {fleet['polls']} polls written in "
+            f"{time.perf_counter() - start:.1f} s"
+        )
+        repeat, warmup = options["repeat"], options["warmup"]
+        since = FLEET_UNTIL - datetime.timedelta(days=7)
+        until = FLEET_UNTIL + datetime.timedelta(microseconds=1)
+        store_hours = load_store_hours()
+        stores_timezones = load_store_timezones()
+        benchmarks: Mapping[str, Mapping] = dict()
+
+        # the tick engine on its own, on statuses already loaded
+        sample = list(
+            itertools.islice(iter_store_statuses(since=since, until=until), options["sample"])
+        )
+
+        def compute_store(store_id, statuses):
+            build_report_data_for_store(
+                store_id=store_id,
+                store_statuses=statuses,
+                store_hours=store_hours[store_id],
+                store_timezone=stores_timezones[store_id],
+                last_updated_timestamp=FLEET_UNTIL,
+            )
+
+        def compute_sample():
+            for store_id, statuses in sample:
+                compute_store(store_id, statuses)
+
+        # each store is timed on its own, for the latencies of a single store
+        store_seconds: List[float] = list()
+        for store_id, statuses in sample:
+            store_seconds.extend(
+                time_runs(lambda: compute_store(store_id, statuses), repeat, warmup)
+            )
+        benchmarks["build_report_data_for_store"] = {
+            # the latencies are of a single store
+            **summarize(store_seconds, 1),
+            "peak_memory_bytes": peak_memory(compute_sample),
+        }
+        self.write_benchmark("build_report_data_for_store", benchmarks)
+
+        # the complete report, from the database to the csv
+        for engine in options["engines"]:
+            metrics = ReportMetrics()
+
+            def build_report():
+                build_complete_report(
+                    engine=engine,
+                    shards=1,
+                    incremental=False,
+                    last_updated_timestamp=FLEET_UNTIL,
+                )
+
+            seconds = time_runs(build_report, repeat, warmup)
+            build_complete_report(
+                engine=engine,
+                shards=1,
+                incremental=False,
+                last_updated_timestamp=FLEET_UNTIL,
+                metrics=metrics,
+            )
+            name = f"build_complete_report[{engine}]"
+            benchmarks[name] = {
+                **summarize(seconds, stores),
+                "peak_memory_bytes": peak_memory(build_report),
+                "phases": metrics.to_dict()["phases"],
+            }
+            self.write_benchmark(name, benchmarks)
+
+        # the csv step on its own, on the report data of every store
+        report_data = REPORT_ENGINES["vectorized"](
+            store_statuses=iter_store_statuses(since=since, until=until),
+            store_hours=store_hours,
+            stores_timezones=stores_timezones,
+            last_updated_timestamp=FLEET_UNTIL,
+        )
+        benchmarks["generate_csv_from_dict"] = {
+            **summarize(
+                time_runs(lambda: generate_csv_from_dict(report_data), repeat, warmup),
+                len(report_data),
+            ),
+            "peak_memory_bytes": peak_memory(lambda: generate_csv_from_dict(report_data)),
+        }
+        self.write_benchmark("generate_csv_from_dict", benchmarks)
+        return {**fleet, "benchmarks": benchmarks}
+
+    def write_benchmark(self, name: str, benchmarks: Mapping[str, Mapping]) -> None:
+        result = benchmarks[name]
+        self.stdout.write(
+            f"  {name}: p50 {result['p50_seconds'] * 1000:.2f} ms, "
+            f"p99 {result['p99_seconds'] * 1000:.2f} ms, "
+            f"{result['throughput_per_second']:.0f}/s, "
+            f"peak {result['peak_memory_bytes'] / 2**20:.1f} MiB"
+        )
+
+    def compare(self, baseline: Mapping, results: Mapping) -> None:
+        """Print the ratio of the median latencies of each benchmark to the baseline's."""
+        self.stdout.write(f"Compared with {baseline.get('commit') or 'the baseline'}:")
+        baseline_fleets = {fleet["stores"]: fleet for fleet in baseline["fleets"]}
+        for fleet in results["fleets"]:
+            if fleet["stores"] not in baseline_fleets:
+                continue
+            for name, result in fleet["benchmarks"].items():
+                baseline_result = baseline_fleets[fleet["stores"]]["benchmarks"].get(name)
+                if baseline_result is None:
+                    continue
+                ratio = result["p50_seconds"] / baseline_result["p50_seconds"]
+                self.stdout.write(f"  {fleet['stores']} stores, {name}: {ratio:.2f}x the p50 latency")
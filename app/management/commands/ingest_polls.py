@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.services import IngestService
+
+
+class Command(BaseCommand):
+    help = "Ingest batches of polls from CSV or NDJSON files, or from the standard input"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="*",
+            default=["-"],
+            help="Files of polls, - reads the standard input",
+        )
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="Format of the polls, guessed from the file suffix by default",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Number of polls written by each upsert",
+        )
+
+    def handle(self, *args, **options):
+        for path in options["paths"]:
+            poll_format = options["format"] or {
+                ".csv": "csv",
+                ".ndjson": "ndjson",
+                ".jsonl": "ndjson",
+            }.get(Path(path).suffix)
+            if poll_format is None:
+                raise CommandError(f"Cannot guess the format of {path}, use --format")
+            try:
+                if path == "-":
+                    counts = IngestService.ingest_polls(
+                        sys.stdin.buffer, poll_format, options["batch_size"]
+                    )
+                else:
+                    with open(path, "rb") as stream:
+                        counts = IngestService.ingest_polls(
+                            stream, poll_format, options["batch_size"]
+                        )
+            except (OSError, ValueError) as error:
+                raise CommandError(f"{path}: {error}") from error
+            self.stdout.write(
+                f"{path}: {counts['received']} polls received, {counts['written']} written, "
+                f"{counts['stores_created']} stores created"
+            )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.background.partitions import manage_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the partitions of the coming days of the polls partitioned by partition_polls, "
+        "and drop or delete the days past their retention"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            help="Days of polls kept before the latest poll, POLL_RETENTION_DAYS by default",
+        )
+        parser.add_argument(
+            "--ahead-days",
+            type=int,
+            help="Days of partitions created ahead of the current day",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            partitions = manage_partitions(
+                retention_days=options["retention_days"], ahead_days=options["ahead_days"]
+            )
+        except ValueError as error:
+            raise CommandError(str(error)) from error
+        self.stdout.write(
+            f"{len(partitions['created'])} partitions created, "
+            f"{len(partitions['dropped'])} dropped, {partitions['deleted']} polls deleted"
+        )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.background.partitions import partition_table
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the status table into daily partitions on MySQL, once before celery beat "
+        "or manage_partitions manage them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            help="Days of polls kept before the latest poll, POLL_RETENTION_DAYS by default",
+        )
+        parser.add_argument(
+            "--ahead-days",
+            type=int,
+            help="Days of partitions created ahead of the current day",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            partitions = partition_table(
+                retention_days=options["retention_days"], ahead_days=options["ahead_days"]
+            )
+        except ValueError as error:
+            raise CommandError(str(error)) from error
+        self.stdout.write(f"{len(partitions)} partitions created")
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 00:55
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_alter_report_report'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoreDailyRollup',
+            fields=[
+                ('id', models.CharField(default=uuid.uuid4, editable=False, max_length=36, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('uptime_microseconds', models.BigIntegerField(default=0)),
+                ('downtime_microseconds', models.BigIntegerField(default=0)),
+                ('poll_count', models.IntegerField(default=0)),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.store')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('store', 'date'), name='unique_store_daily_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:10
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+def forwards_func(apps, schema_editor):
+    # declaring models
+    StoreStatus = apps.get_model("app", "StoreStatus")
+    StoreStatusCompact = apps.get_model("app", "StoreStatusCompact")
+    quote_name = schema_editor.quote_name
+    # copying the statuses in a single statement, converting the status to an integer
+    # and numbering the rows in the order they were polled
+    schema_editor.execute(
+        "INSERT INTO {new} ({store}, {status}, {timestamp}) "
+        "SELECT {store}, CASE WHEN {status} = 'active' THEN 1 ELSE 0 END, {timestamp} "
+        "FROM {old} ORDER BY {timestamp}".format(
+            new=quote_name(StoreStatusCompact._meta.db_table),
+            old=quote_name(StoreStatus._meta.db_table),
+            store=quote_name("store_id"),
+            status=quote_name("status"),
+            timestamp=quote_name("timestamp_utc"),
+        )
+    )
+
+
+def reverse_func(apps, schema_editor):
+    # declaring models
+    StoreStatus = apps.get_model("app", "StoreStatus")
+    StoreStatusCompact = apps.get_model("app", "StoreStatusCompact")
+    batch_size = 5000
+    store_status_objects = []
+    # bulk creating store status objects with uuid keys and string statuses
+    for status in StoreStatusCompact.objects.order_by("id").iterator(chunk_size=batch_size):
+        store_status_objects.append(
+            StoreStatus(
+                id=uuid.uuid4(),
+                store_id=status.store_id,
+                status="active" if status.status == 1 else "inactive",
+                timestamp_utc=status.timestamp_utc,
+            )
+        )
+        if len(store_status_objects) >= batch_size:
+            StoreStatus.objects.bulk_create(store_status_objects)
+            store_status_objects = []
+    if store_status_objects:
+        StoreStatus.objects.bulk_create(store_status_objects)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_storedailyrollup'),
+        # the content type of the renamed model is renamed back with the current content types
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoreStatusCompact',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'inactive'), (1, 'active')])),
+                ('timestamp_utc', models.DateTimeField()),
+                ('store', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.store')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['store', 'timestamp_utc', 'status'], name='storestatus_store_time_idx'), models.Index(fields=['timestamp_utc'], name='storestatus_time_idx')],
+            },
+        ),
+        migrations.RunPython(forwards_func, reverse_func),
+        migrations.DeleteModel(
+            name='StoreStatus',
+        ),
+        migrations.RenameModel(
+            old_name='StoreStatusCompact',
+            new_name='StoreStatus',
+        ),
+    ]
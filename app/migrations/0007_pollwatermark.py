@@ -0,0 +1,39 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:24
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def forwards_func(apps, schema_editor):
+    # declaring models
+    PollWatermark = apps.get_model("app", "PollWatermark")
+    StoreStatus = apps.get_model("app", "StoreStatus")
+    # seeding the watermark with the latest poll already stored
+    PollWatermark.objects.create(
+        timestamp_utc=StoreStatus.objects.aggregate(Max("timestamp_utc"))[
+            "timestamp_utc__max"
+        ]
+    )
+
+
+def reverse_func(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_compact_storestatus'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollWatermark',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, editable=False, primary_key=True, serialize=False)),
+                ('timestamp_utc', models.DateTimeField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(forwards_func, reverse_func),
+    ]
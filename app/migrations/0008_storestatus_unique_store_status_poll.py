@@ -0,0 +1,40 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:52
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def forwards_func(apps, schema_editor):
+    # declaring models
+    StoreStatus = apps.get_model("app", "StoreStatus")
+    # keeping only the latest status of the polls stored more than once
+    duplicates = (
+        StoreStatus.objects.values("store", "timestamp_utc")
+        .annotate(count=Count("id"), latest=Max("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        StoreStatus.objects.filter(
+            store=duplicate["store"], timestamp_utc=duplicate["timestamp_utc"]
+        ).exclude(id=duplicate["latest"]).delete()
+
+
+def reverse_func(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0007_pollwatermark"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards_func, reverse_func),
+        migrations.AddConstraint(
+            model_name="storestatus",
+            constraint=models.UniqueConstraint(
+                fields=("store", "timestamp_utc"), name="unique_store_status_poll"
+            ),
+        ),
+    ]
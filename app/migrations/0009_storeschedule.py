@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_storestatus_unique_store_status_poll'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoreSchedule',
+            fields=[
+                ('store', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='schedule', serialize=False, to='app.store')),
+                ('hours', models.JSONField()),
+                ('open_all_day', models.BooleanField(default=False)),
+            ],
+        ),
+    ]
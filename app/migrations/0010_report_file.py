@@ -0,0 +1,64 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:31
+
+import gzip
+import hashlib
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import migrations, models
+
+
+def forwards_func(apps, schema_editor):
+    # declaring models
+    Report = apps.get_model("app", "Report")
+    storage = storages["reports"]
+    # moving the csv of the complete reports to gzip files
+    for report in Report.objects.filter(status="Complete").iterator():
+        compressed = gzip.compress(report.report.encode(), mtime=0)
+        report.file_path = storage.save(
+            f"reports/{report.report_id}.csv.gz", ContentFile(compressed)
+        )
+        report.file_size = len(compressed)
+        report.checksum = hashlib.sha256(compressed).hexdigest()
+        report.save(update_fields=["file_path", "file_size", "checksum"])
+
+
+def reverse_func(apps, schema_editor):
+    # declaring models
+    Report = apps.get_model("app", "Report")
+    storage = storages["reports"]
+    # moving the csv of the complete reports back to the database
+    for report in Report.objects.exclude(file_path="").iterator():
+        with storage.open(report.file_path, "rb") as file:
+            report.report = gzip.decompress(file.read()).decode()
+        report.save(update_fields=["report"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_storeschedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='checksum',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='file_path',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='file_size',
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.RunPython(forwards_func, reverse_func),
+        migrations.RemoveField(
+            model_name='report',
+            name='report',
+        ),
+    ]
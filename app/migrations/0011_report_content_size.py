@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:52
+
+import gzip
+
+from django.core.files.storage import storages
+from django.db import migrations, models
+
+
+def forwards_func(apps, schema_editor):
+    # declaring models
+    Report = apps.get_model("app", "Report")
+    storage = storages["reports"]
+    # measuring the csv of the reports already stored
+    for report in Report.objects.exclude(file_path="").iterator():
+        with storage.open(report.file_path, "rb") as file:
+            report.content_size = len(gzip.decompress(file.read()))
+        report.save(update_fields=["content_size"])
+
+
+def reverse_func(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_report_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='content_size',
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.RunPython(forwards_func, reverse_func),
+    ]
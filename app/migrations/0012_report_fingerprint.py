@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 03:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_report_content_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='fingerprint',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
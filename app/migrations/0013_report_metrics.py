@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_report_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='metrics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_report_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='profile_path',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
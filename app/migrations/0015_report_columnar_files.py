@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_report_profile_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='columnar_files',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
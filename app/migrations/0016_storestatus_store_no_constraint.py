@@ -0,0 +1,19 @@
+# Generated by Django 5.1.1 on 2026-10-18 04:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_report_columnar_files'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='storestatus',
+            name='store',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.store'),
+        ),
+    ]
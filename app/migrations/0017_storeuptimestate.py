@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-18 04:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_storestatus_store_no_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoreUptimeState',
+            fields=[
+                ('store', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='uptime_state', serialize=False, to='app.store')),
+                ('last_status', models.PositiveSmallIntegerField(choices=[(0, 'inactive'), (1, 'active')], null=True)),
+                ('last_timestamp_utc', models.DateTimeField(null=True)),
+                ('since_utc', models.DateTimeField()),
+                ('polls', models.BinaryField(default=bytes)),
+                ('days', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
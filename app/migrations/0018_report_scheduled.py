@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_storeuptimestate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='scheduled',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 05:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_report_scheduled'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='status',
+            field=models.CharField(choices=[('Running', 'Running'), ('Complete', 'Complete'), ('Failed', 'Failed')], default='Running', max_length=32),
+        ),
+    ]
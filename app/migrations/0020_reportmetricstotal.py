@@ -0,0 +1,44 @@
+# Generated by Django 5.1.1 on 2026-10-18 05:20
+
+from django.db import migrations, models
+
+from app.background.metrics import ReportMetricsSum
+
+
+def forwards_func(apps, schema_editor):
+    # declaring models
+    Report = apps.get_model("app", "Report")
+    ReportMetricsTotal = apps.get_model("app", "ReportMetricsTotal")
+    # seeding the sum with the metrics of the reports already computed
+    metrics_sum = ReportMetricsSum()
+    for metrics in (
+        Report.objects.filter(status="Complete")
+        .exclude(metrics={})
+        .values_list("metrics", flat=True)
+        .iterator(chunk_size=2000)
+    ):
+        metrics_sum.add(metrics)
+    ReportMetricsTotal.objects.create(metrics=metrics_sum.to_dict())
+
+
+def reverse_func(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0019_alter_report_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportMetricsTotal',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, editable=False, primary_key=True, serialize=False)),
+                ('metrics', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(forwards_func, reverse_func),
+    ]
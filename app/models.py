@@ -30,20 +30,124 @@ class StoreHours(models.Model):
         return f"{self.store.store_id} - {self.day_of_week} - {self.start_time_local} - {self.end_time_local}"
 
 
+class StoreSchedule(models.Model):
+    """Model containing a store's weekly business hours, precomputed from its StoreHours"""
+
+    store = models.OneToOneField(
+        Store, on_delete=models.CASCADE, primary_key=True, related_name="schedule"
+    )
+    # [start, end] of each week day from monday, in seconds since the local midnight
+    hours = models.JSONField()
+    open_all_day = models.BooleanField(default=False)
+
+    def __repr__(self) -> str:
+        return f"{self.store.store_id} - {self.hours} - {self.open_all_day}"
+
+
 class StoreStatus(models.Model):
     """Model containing store's poll results"""
 
+    class Status(models.IntegerChoices):
+        INACTIVE = 0, "inactive"
+        ACTIVE = 1, "active"
+
+    id = models.BigAutoField(primary_key=True)
+    # indexed as the leading column of the (store, timestamp_utc) index,
+    # without a database constraint as partitioned tables cannot have foreign keys
+    store = models.ForeignKey(
+        Store, on_delete=models.CASCADE, db_index=False, db_constraint=False
+    )
+    status = models.PositiveSmallIntegerField(choices=Status.choices)
+    timestamp_utc = models.DateTimeField(null=False)
+
+    class Meta:
+        indexes = [
+            # covers the report's range scans on the statuses of each store
+            models.Index(
+                fields=["store", "timestamp_utc", "status"],
+                name="storestatus_store_time_idx",
+            ),
+            models.Index(fields=["timestamp_utc"], name="storestatus_time_idx"),
+        ]
+        constraints = [
+            # a store is polled at most once at a time, so ingestion can upsert on it
+            models.UniqueConstraint(
+                fields=["store", "timestamp_utc"], name="unique_store_status_poll"
+            ),
+        ]
+
+    def __repr__(self) -> str:
+        return f"{self.store.store_id} - {self.get_status_display()} - {self.timestamp_utc}"
+
+
+class PollWatermark(models.Model):
+    """Singleton model containing the timestamp of the latest ingested poll"""
+
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1, editable=False)
+    timestamp_utc = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __repr__(self) -> str:
+        return f"{self.timestamp_utc} - {self.updated_at}"
+
+
+class ReportMetricsTotal(models.Model):
+    """Singleton model containing the metrics of every computed report summed up"""
+
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1, editable=False)
+    # ReportMetricsSum.to_dict, updated as each report completes
+    metrics = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __repr__(self) -> str:
+        return f"{self.metrics.get('reports', 0)} - {self.updated_at}"
+
+
+class StoreDailyRollup(models.Model):
+    """Model containing a store's uptime and downtime during the business hours of a closed utc day"""
+
     id = models.CharField(
         max_length=36, primary_key=True, default=uuid.uuid4, editable=False
     )
     store = models.ForeignKey(Store, on_delete=models.CASCADE)
-    status = models.CharField(
-        max_length=32, choices=[("active", "active"), ("inactive", "inactive")]
+    date = models.DateField()
+    uptime_microseconds = models.BigIntegerField(default=0)
+    downtime_microseconds = models.BigIntegerField(default=0)
+    poll_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["store", "date"], name="unique_store_daily_rollup"
+            )
+        ]
+
+    def __repr__(self) -> str:
+        return f"{self.store.store_id} - {self.date} - {self.uptime_microseconds} - {self.downtime_microseconds}"
+
+
+class StoreUptimeState(models.Model):
+    """Model containing a store's online uptime state, updated as its polls are ingested"""
+
+    store = models.OneToOneField(
+        Store, on_delete=models.CASCADE, primary_key=True, related_name="uptime_state"
     )
-    timestamp_utc = models.DateTimeField(null=False)
+    # latest poll of the store, none for a store not polled since the state was built
+    last_status = models.PositiveSmallIntegerField(
+        choices=StoreStatus.Status.choices, null=True
+    )
+    last_timestamp_utc = models.DateTimeField(null=True)
+    # start of the utc day from which every poll of the store is in the state
+    since_utc = models.DateTimeField()
+    # polls of the last week, packed as (microseconds since the epoch, active) records
+    polls = models.BinaryField(default=bytes)
+    # {utc day counted from the epoch: [uptime microseconds, downtime microseconds, poll count]}
+    # of the business hours of each day of the polls
+    days = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __repr__(self) -> str:
-        return f"{self.store.store_id} - {self.status} - {self.timestamp_utc}"
+        return f"{self.store.store_id} - {self.last_status} - {self.last_timestamp_utc}"
 
 
 class Report(models.Model):
@@ -52,12 +156,29 @@ class Report(models.Model):
         max_length=36, primary_key=True, default=uuid.uuid4, editable=False
     )
     report_id = models.CharField(max_length=36, unique=True, default=uuid.uuid4)
-    report = models.TextField(blank=True)
+    # hash of the poll watermark and store data the report is computed from, reports sharing it are equal
+    fingerprint = models.CharField(max_length=64, blank=True, db_index=True)
+    # gzip compressed csv of a complete report, in the reports storage
+    file_path = models.CharField(max_length=255, blank=True)
+    file_size = models.PositiveBigIntegerField(null=True)
+    # size of the uncompressed csv, the length of the downloads that are not compressed
+    content_size = models.PositiveBigIntegerField(null=True)
+    # sha256 of the compressed file
+    checksum = models.CharField(max_length=64, blank=True)
+    # paths of the Parquet and Arrow files of the report by format, next to its csv
+    columnar_files = models.JSONField(default=dict, blank=True)
+    # timings of the phases and row counts of the computation, empty for a report reusing another's file
+    metrics = models.JSONField(default=dict, blank=True)
+    # profile of a report generated under a profiler, in the reports storage next to its file
+    profile_path = models.CharField(max_length=255, blank=True)
+    # computed ahead of the requests by celery beat, the latest complete one is served as the latest report
+    scheduled = models.BooleanField(default=False)
     generated_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(
         max_length=32,
         default="Running",
-        choices=[("Running", "Running"), ("Complete", "Complete")],
+        # a failed report is not retried, triggering it again starts a new one
+        choices=[("Running", "Running"), ("Complete", "Complete"), ("Failed", "Failed")],
     )
 
     def __repr__(self) -> str:
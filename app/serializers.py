@@ -1,25 +1,62 @@
+import datetime
+
+import pytz
 from rest_framework import serializers
 
+from .background.profiling import PROFILERS
 from .models import Report
 
 
+class TriggerReportRequestSerializer(serializers.Serializer):
+    """Serializer for the query parameters of TriggerReportAPIView"""
+    # comma separated, or repeated, store ids
+    store_ids = serializers.ListField(child=serializers.CharField(), required=False)
+    timezone = serializers.CharField(required=False)
+    # end of the report window, the latest poll by default
+    until = serializers.DateTimeField(required=False, default_timezone=datetime.timezone.utc)
+    # profiler the report is generated under, to find out why a report is slow
+    profile = serializers.ChoiceField(choices=PROFILERS, required=False)
+
+    def validate_store_ids(self, value):
+        store_ids = [
+            store_id.strip() for item in value for store_id in item.split(",") if store_id.strip()
+        ]
+        if not store_ids:
+            raise serializers.ValidationError("At least one store id is required.")
+        return store_ids
+
+    def validate_timezone(self, value):
+        if value not in pytz.all_timezones_set:
+            raise serializers.ValidationError(f"Unknown timezone {value}.")
+        return value
+
+
 class TriggerReportResponseSerializer(serializers.Serializer):
     """Serializer for TriggerReportAPIView"""
     report_id = serializers.CharField()
 
 
+class ReportProgressSerializer(serializers.Serializer):
+    """Serializer for the progress of a running report"""
+    phase = serializers.CharField()
+    stores_processed = serializers.IntegerField()
+    stores_total = serializers.IntegerField(allow_null=True)
+    # elapsed seconds of each phase, the current one included
+    phases = serializers.DictField(child=serializers.FloatField())
+
+
 class GetReportRunningResponseSerializer(serializers.Serializer):
     """Serializer for GetReportAPIView when report is running"""
     status = serializers.CharField()
+    # null until the task of the report starts
+    progress = ReportProgressSerializer(allow_null=True)
 
     class Meta:
         model = Report
 
 
-class GetReportCompleteResponseSerializer(serializers.Serializer):
-    """Serializer for GetReportAPIView when report is complete"""
-    status = serializers.CharField()
-    report = serializers.CharField()
-
-    class Meta:
-        model = Report
+class IngestPollsResponseSerializer(serializers.Serializer):
+    """Serializer for IngestPollsAPIView"""
+    received = serializers.IntegerField()
+    written = serializers.IntegerField()
+    stores_created = serializers.IntegerField()
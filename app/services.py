@@ -1,15 +1,101 @@
+import datetime
+import hashlib
+import uuid
+from typing import IO, Iterable, Iterator, List, Literal, Mapping, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .background.ingest import iter_poll_batches, iter_polls, load_store_pks, upsert_polls
+from .background.metrics import ReportMetricsSum, render_prometheus
+from .background.profiling import open_profile_file
+from .background.progress import get_report_progress
+from .background.storage import (
+    columnar_file_size,
+    iter_columnar_file,
+    iter_report_file,
+    open_columnar_file,
+    open_report_file,
+)
 from .background.task_signal import task_signal
-from .models import Report
+from .models import PollWatermark, Report, ReportMetricsTotal, Store, StoreHours, StoreStatus
 
 
 class ReportService:
     """Service class for report generation"""
 
     @classmethod
-    def start_report_generation(cls) -> str:
-        """Start the report generation process in the background and return the report ID."""
-        report = Report.objects.create()
-        task_signal.send(sender=cls.__name__, report_id=report.report_id)
+    def start_report_generation(
+        cls,
+        store_ids: Optional[List[str]] = None,
+        timezone: Optional[str] = None,
+        until: Optional[datetime.datetime] = None,
+        profile: Optional[str] = None,
+        scheduled: bool = False,
+    ) -> str:
+        """
+        Start the report generation process in the background and return the report ID.
+        The report covers the given stores, or the stores of the given timezone, up to the given
+        window end, every store up to the latest poll by default.
+        A report generated under the given profiler is always computed, and not reused by others.
+        A report of every store up to the latest poll is the latest scheduled report when it is fresh enough.
+        """
+        filters = dict(store_ids=store_ids, timezone=timezone)
+        fleet_report = profile is None and until is None and not any(filters.values())
+        if fleet_report and not scheduled and settings.REPORT_SCHEDULE_MAX_AGE:
+            latest = cls.get_latest_report(max_age=settings.REPORT_SCHEDULE_MAX_AGE)
+            if latest is not None:
+                return latest.report_id
+        if profile is not None:
+            report = Report.objects.create()
+            task_signal.send(
+                sender=cls.__name__,
+                report_id=report.report_id,
+                last_updated_timestamp=until.isoformat() if until else None,
+                profile=profile,
+                **filters,
+            )
+            return report.report_id
+        if not settings.REPORT_CACHE:
+            report = Report.objects.create(scheduled=scheduled)
+            task_signal.send(
+                sender=cls.__name__,
+                report_id=report.report_id,
+                last_updated_timestamp=until.isoformat() if until else None,
+                **filters,
+            )
+            return report.report_id
+        last_updated_timestamp = until or WatermarkService.get_last_updated_timestamp()
+        fingerprint = ReportCacheService.get_fingerprint(last_updated_timestamp, **filters)
+        # a report of the same data is already complete, the new one points to its file
+        cached = (
+            Report.objects.filter(fingerprint=fingerprint, status="Complete")
+            .exclude(file_path="")
+            .order_by("-generated_at")
+            .first()
+        )
+        if cached is not None:
+            report = Report.objects.create(
+                fingerprint=fingerprint,
+                scheduled=scheduled,
+                status="Complete",
+                file_path=cached.file_path,
+                file_size=cached.file_size,
+                content_size=cached.content_size,
+                checksum=cached.checksum,
+                columnar_files=cached.columnar_files,
+            )
+            return report.report_id
+        # the report is created before taking the lock, so that it is completed by the task in flight
+        report = Report.objects.create(fingerprint=fingerprint, scheduled=scheduled)
+        if ReportCacheService.acquire_inflight(fingerprint, report.report_id):
+            task_signal.send(
+                sender=cls.__name__,
+                report_id=report.report_id,
+                last_updated_timestamp=last_updated_timestamp.isoformat(),
+                **filters,
+            )
         return report.report_id
 
     @classmethod
@@ -17,3 +103,249 @@ class ReportService:
         """Get the report data for the given report ID."""
         report = Report.objects.get(report_id=report_id)
         return report
+
+    @classmethod
+    def get_latest_report(cls, max_age: Optional[int] = None) -> Optional[Report]:
+        """Latest complete scheduled report, only when generated in the last max_age seconds if given."""
+        reports = Report.objects.filter(scheduled=True, status="Complete")
+        if max_age is not None:
+            reports = reports.filter(
+                generated_at__gte=datetime.datetime.now(datetime.timezone.utc)
+                - datetime.timedelta(seconds=max_age)
+            )
+        return reports.order_by("-generated_at").first()
+
+    @classmethod
+    def get_report_progress(cls, report: Report) -> Optional[Mapping]:
+        """Progress of a running report, read from the cache, or of the report in flight computing it."""
+        progress = get_report_progress(report.report_id)
+        if progress is None and report.fingerprint:
+            inflight_report_id = cache.get(f"report-inflight:{report.fingerprint}")
+            if inflight_report_id is not None:
+                progress = get_report_progress(inflight_report_id)
+        return progress
+
+    @classmethod
+    def add_report_metrics(cls, metrics: Mapping) -> None:
+        """Add the metrics of a computed report to their sum, so that a scrape reads a single row."""
+        with transaction.atomic():
+            ReportMetricsTotal.objects.get_or_create(pk=1)
+            # locked, the reports completed at the same time by other workers are added after
+            total = ReportMetricsTotal.objects.select_for_update().get(pk=1)
+            metrics_sum = ReportMetricsSum(total.metrics)
+            metrics_sum.add(metrics)
+            total.metrics = metrics_sum.to_dict()
+            total.save(update_fields=["metrics", "updated_at"])
+
+    @classmethod
+    def render_metrics(cls) -> str:
+        """Prometheus text exposition of the metrics of the reports computed so far."""
+        total = ReportMetricsTotal.objects.filter(pk=1).first()
+        return render_prometheus(ReportMetricsSum(total.metrics if total else None))
+
+    @classmethod
+    def open_report_file(cls, report: Report, compressed: bool = True) -> IO[bytes]:
+        """Open the csv file of a complete report, gzip compressed or not."""
+        return open_report_file(report, compressed=compressed)
+
+    @classmethod
+    def open_columnar_file(cls, report: Report, format: str) -> IO[bytes]:
+        """Open the Parquet or Arrow file of a complete report."""
+        return open_columnar_file(report, format)
+
+    @classmethod
+    def open_profile_file(cls, report: Report) -> IO[bytes]:
+        """Open the profile of a report generated under a profiler."""
+        return open_profile_file(report)
+
+    @classmethod
+    def iter_report_file(
+        cls, report: Report, compressed: bool, start: int, end: int, chunk_size: int
+    ) -> Iterator[bytes]:
+        """Stream a byte range of the csv file of a complete report, gzip compressed or not."""
+        return iter_report_file(report, compressed, start, end, chunk_size)
+
+    @classmethod
+    def get_columnar_file_size(cls, report: Report, format: str) -> int:
+        """Size of the Parquet or Arrow file of a complete report."""
+        return columnar_file_size(report, format)
+
+    @classmethod
+    def iter_columnar_file(
+        cls, report: Report, format: str, start: int, end: int, chunk_size: int
+    ) -> Iterator[bytes]:
+        """Stream a byte range of the Parquet or Arrow file of a complete report."""
+        return iter_columnar_file(report, format, start, end, chunk_size)
+
+
+class WatermarkService:
+    """Service class for the timestamp of the latest ingested poll"""
+
+    cache_key = "poll-watermark"
+
+    @classmethod
+    def get_last_updated_timestamp(cls) -> datetime.datetime:
+        """Get the timestamp of the latest poll from the cache, falling back to the watermark row."""
+        timestamp = cache.get(cls.cache_key)
+        if timestamp is None:
+            watermark = PollWatermark.objects.filter(pk=1).first()
+            timestamp = watermark.timestamp_utc if watermark else None
+            if timestamp is None:
+                # no watermark yet, seed it from the polls
+                timestamp = (
+                    StoreStatus.objects.order_by("-timestamp_utc").first().timestamp_utc
+                )
+                cls.advance(timestamp)
+            cache.set(
+                cls.cache_key, timestamp, timeout=settings.REPORT_WATERMARK_CACHE_TIMEOUT
+            )
+        return timestamp
+
+    @classmethod
+    def advance(cls, timestamp: Optional[datetime.datetime]) -> None:
+        """Move the watermark forward to the given poll timestamp, it never moves back."""
+        if timestamp is None:
+            return
+        PollWatermark.objects.get_or_create(pk=1)
+        updated = (
+            PollWatermark.objects.filter(pk=1)
+            .exclude(timestamp_utc__gte=timestamp)
+            .update(timestamp_utc=timestamp)
+        )
+        if updated:
+            # the next read refills the cache from the watermark row
+            cache.delete(cls.cache_key)
+
+
+class ReportCacheService:
+    """Service class for reusing the reports computed from the same polls and store data"""
+
+    store_data_cache_key = "store-data-hash"
+    poll_data_cache_key = "poll-data-version"
+
+    @classmethod
+    def get_store_data_hash(cls) -> str:
+        """Hash of the timezones and business hours of every store, cached until one of them changes."""
+        store_data_hash = cache.get(cls.store_data_cache_key)
+        if store_data_hash is None:
+            digest = hashlib.sha256()
+            stores = Store.objects.order_by("store_id").values_list("store_id", "timezone")
+            store_hours = StoreHours.objects.order_by(
+                "store__store_id", "day_of_week", "start_time_local", "end_time_local"
+            ).values_list(
+                "store__store_id", "day_of_week", "start_time_local", "end_time_local"
+            )
+            for rows in (stores, store_hours):
+                for row in rows.iterator(chunk_size=settings.REPORT_STATUS_CHUNK_SIZE):
+                    digest.update(repr(row).encode())
+            store_data_hash = digest.hexdigest()
+            cache.set(cls.store_data_cache_key, store_data_hash, timeout=None)
+        return store_data_hash
+
+    @classmethod
+    def invalidate_store_data_hash(cls) -> None:
+        cache.delete(cls.store_data_cache_key)
+
+    @classmethod
+    def get_poll_data_version(cls) -> str:
+        """Version of the polls, changed by every ingested batch and every status saved on its own."""
+        version = cache.get(cls.poll_data_cache_key)
+        if version is None:
+            # a version lost with the cache is replaced by a new one, the next reports are computed again
+            cache.add(cls.poll_data_cache_key, uuid.uuid4().hex, timeout=None)
+            version = cache.get(cls.poll_data_cache_key)
+        return version
+
+    @classmethod
+    def bump_poll_data_version(cls) -> None:
+        """Reports computed before polls were written are not reused, even when the watermark did not move."""
+        cache.set(cls.poll_data_cache_key, uuid.uuid4().hex, timeout=None)
+
+    @classmethod
+    def get_fingerprint(
+        cls,
+        last_updated_timestamp: datetime.datetime,
+        store_ids: Optional[List[str]] = None,
+        timezone: Optional[str] = None,
+    ) -> str:
+        """Fingerprint of a report of the given stores computed up to the given poll timestamp with the current polls and store data."""
+        store_filter = ",".join(sorted(store_ids)) if store_ids is not None else "*"
+        return hashlib.sha256(
+            f"{last_updated_timestamp.isoformat()}|{cls.get_poll_data_version()}"
+            f"|{cls.get_store_data_hash()}|{store_filter}|{timezone or '*'}".encode()
+        ).hexdigest()
+
+    @classmethod
+    def acquire_inflight(cls, fingerprint: str, report_id: str) -> bool:
+        """Whether the report is the first one of its fingerprint in flight, and so computes it."""
+        return cache.add(
+            f"report-inflight:{fingerprint}",
+            report_id,
+            timeout=settings.REPORT_INFLIGHT_TIMEOUT,
+        )
+
+    @classmethod
+    def complete_merged_reports(cls, report: Report) -> List[str]:
+        """Point the reports triggered while the given one was in flight to its file, and return their IDs."""
+        if not report.fingerprint:
+            return []
+        # the lock is released first, a report created after the update below starts its own task
+        cache.delete(f"report-inflight:{report.fingerprint}")
+        report_ids = list(
+            Report.objects.filter(fingerprint=report.fingerprint, status="Running").values_list(
+                "report_id", flat=True
+            )
+        )
+        Report.objects.filter(report_id__in=report_ids).update(
+            status="Complete",
+            file_path=report.file_path,
+            file_size=report.file_size,
+            content_size=report.content_size,
+            checksum=report.checksum,
+            columnar_files=report.columnar_files,
+        )
+        return report_ids
+
+    @classmethod
+    def fail_merged_reports(cls, report: Report) -> List[str]:
+        """Fail the reports triggered while the given failed one was in flight, and return their IDs."""
+        if not report.fingerprint:
+            return []
+        # the lock is released, so that the next trigger computes the report again
+        cache.delete(f"report-inflight:{report.fingerprint}")
+        report_ids = list(
+            Report.objects.filter(fingerprint=report.fingerprint, status="Running").values_list(
+                "report_id", flat=True
+            )
+        )
+        Report.objects.filter(report_id__in=report_ids).update(status="Failed")
+        return report_ids
+
+
+class IngestService:
+    """Service class for the ingestion of poll batches"""
+
+    @classmethod
+    def ingest_polls(
+        cls,
+        stream: Iterable[bytes],
+        format: Literal["csv", "ndjson"],
+        batch_size: Optional[int] = None,
+    ) -> Mapping[str, int]:
+        """Stream the polls into the database in batches and return the number of polls and stores written."""
+        batch_size = batch_size or settings.POLL_INGEST_BATCH_SIZE
+        # store_id -> pk of every store, extended with the stores created on the way
+        store_pks = load_store_pks()
+        received = written = stores_created = 0
+        for batch in iter_poll_batches(iter_polls(stream, format), batch_size):
+            batch_written, batch_stores_created, latest = upsert_polls(batch, store_pks)
+            received += len(batch)
+            written += batch_written
+            stores_created += batch_stores_created
+            if batch_stores_created:
+                ReportCacheService.invalidate_store_data_hash()
+            # late polls and changed statuses at or before the watermark change the reports too
+            ReportCacheService.bump_poll_data_version()
+            # bulk inserts do not send post_save, the watermark is advanced once per batch
+            WatermarkService.advance(latest)
+        return {"received": received, "written": written, "stores_created": stores_created}
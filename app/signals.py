@@ -0,0 +1,80 @@
+import datetime
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import (
+    Store,
+    StoreDailyRollup,
+    StoreHours,
+    StoreSchedule,
+    StoreStatus,
+    StoreUptimeState,
+)
+from .background.online import update_uptime_states
+from .services import ReportCacheService, WatermarkService
+
+
+@receiver(post_save, sender=StoreStatus, weak=False)
+def advance_watermark(sender, instance: StoreStatus, **kwargs):
+    """Advance the poll watermark when a status is saved on its own, bulk ingestion advances it per batch."""
+    WatermarkService.advance(instance.timestamp_utc)
+
+
+@receiver(post_save, sender=StoreStatus, weak=False)
+@receiver(post_delete, sender=StoreStatus, weak=False)
+def bump_poll_data_version(sender, instance: StoreStatus, **kwargs):
+    """Reports computed before a status was saved or deleted on its own are not reused."""
+    ReportCacheService.bump_poll_data_version()
+
+
+@receiver(post_save, sender=StoreStatus, weak=False)
+def invalidate_daily_rollup(sender, instance: StoreStatus, **kwargs):
+    """Drop the rollup of the utc day of a status saved on its own, bulk ingestion drops them per batch."""
+    StoreDailyRollup.objects.filter(
+        store_id=instance.store_id,
+        date=instance.timestamp_utc.astimezone(datetime.timezone.utc).date(),
+    ).delete()
+
+
+@receiver(post_save, sender=StoreStatus, weak=False)
+def update_uptime_state(sender, instance: StoreStatus, **kwargs):
+    """Add a status saved on its own to the online state of its store, bulk ingestion adds them per batch."""
+    update_uptime_states({(instance.store_id, instance.timestamp_utc): instance.status})
+
+
+@receiver(post_save, sender=StoreHours, weak=False)
+@receiver(post_delete, sender=StoreHours, weak=False)
+def invalidate_store_schedule(sender, instance: StoreHours, **kwargs):
+    """Drop the precomputed schedule, the daily rollups and the online state of a store whose business hours changed."""
+    StoreSchedule.objects.filter(store_id=instance.store_id).delete()
+    StoreDailyRollup.objects.filter(store_id=instance.store_id).delete()
+    StoreUptimeState.objects.filter(store_id=instance.store_id).delete()
+    ReportCacheService.invalidate_store_data_hash()
+
+
+@receiver(post_save, sender=Store, weak=False)
+@receiver(post_delete, sender=Store, weak=False)
+def invalidate_store_data_hash(sender, instance: Store, **kwargs):
+    """Reports computed before a store or its timezone changed are not reused."""
+    ReportCacheService.invalidate_store_data_hash()
+
+
+@receiver(pre_save, sender=Store, weak=False)
+def remember_timezone(sender, instance: Store, update_fields=None, **kwargs):
+    """Keep the timezone a store was saved with, to tell on post_save whether it changed."""
+    if instance._state.adding or (update_fields is not None and "timezone" not in update_fields):
+        instance._saved_timezone = instance.timezone
+        return
+    instance._saved_timezone = (
+        Store.objects.filter(pk=instance.pk).values_list("timezone", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Store, weak=False)
+def invalidate_uptime_state(sender, instance: Store, created: bool, **kwargs):
+    """The daily rollups and the online state of a store are built again from its polls when its timezone changed."""
+    if not created and instance.timezone == getattr(instance, "_saved_timezone", None):
+        return
+    StoreDailyRollup.objects.filter(store_id=instance.pk).delete()
+    StoreUptimeState.objects.filter(store_id=instance.pk).delete()
@@ -0,0 +1,85 @@
+import datetime
+import random
+from typing import List, Mapping, Optional, Tuple
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from app.background.fleet import iter_store_polls
+from app.models import PollWatermark, Store, StoreHours, StoreStatus
+
+# latest poll of the test fleet, the week before it crosses the change to daylight saving time in the US
+LAST_UPDATED = datetime.datetime(2023, 3, 14, 18, 13, 22, 479220, tzinfo=datetime.timezone.utc)
+
+# (store_id, timezone, {week day: (start, end)} of its business hours, minutes between its polls)
+# a week day without hours is open all day, and a store without any hours is open all day every day
+FLEET: List[Tuple[str, str, Optional[Mapping[int, Tuple[datetime.time, datetime.time]]], int]] = [
+    (
+        "chicago-business",
+        "America/Chicago",
+        {day: (datetime.time(9), datetime.time(17)) for day in range(7)},
+        13,
+    ),
+    (
+        "kolkata-overnight",
+        "Asia/Kolkata",
+        {day: (datetime.time(22), datetime.time(6)) for day in range(7)},
+        31,
+    ),
+    ("new-york-no-hours", "America/New_York", None, 47),
+    (
+        "sydney-some-days",
+        "Australia/Sydney",
+        {
+            0: (datetime.time(7, 30), datetime.time(21, 30)),
+            2: (datetime.time(10), datetime.time(14, 45)),
+            5: (datetime.time(20), datetime.time(2)),
+        },
+        19,
+    ),
+    ("utc-all-day", "UTC", {day: (datetime.time(0), datetime.time(23, 59, 59)) for day in range(7)}, 60),
+    (
+        "berlin-sparse",
+        "Europe/Berlin",
+        {day: (datetime.time(8), datetime.time(20)) for day in range(5)},
+        300,
+    ),
+]
+
+
+def create_test_fleet(seed: int = 0, days: int = 9) -> None:
+    """Write the stores of the test fleet, their business hours and their polls of the given days up to LAST_UPDATED."""
+    rng = random.Random(seed)
+    polls: List[StoreStatus] = list()
+    for store_id, timezone, hours, poll_minutes in FLEET:
+        store = Store.objects.create(store_id=store_id, timezone=timezone)
+        StoreHours.objects.bulk_create(
+            StoreHours(store=store, day_of_week=day, start_time_local=start, end_time_local=end)
+            for day, (start, end) in (hours or dict()).items()
+        )
+        polls.extend(
+            iter_store_polls(
+                rng,
+                store.pk,
+                LAST_UPDATED - datetime.timedelta(days=days),
+                LAST_UPDATED,
+                datetime.timedelta(minutes=poll_minutes),
+                uptime=0.8,
+            )
+        )
+    # bulk inserts do not send post_save, the watermark is set once for the fleet
+    StoreStatus.objects.bulk_create(polls)
+    PollWatermark.objects.update_or_create(pk=1, defaults={"timestamp_utc": LAST_UPDATED})
+
+
+class FleetTestCase(TestCase):
+    """Test case on the test fleet, written once for the tests of the case."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_test_fleet()
+
+    def setUp(self):
+        # the watermark, the store data hash and the progress of the reports are cached
+        cache.clear()
+        self.addCleanup(cache.clear)
@@ -0,0 +1,391 @@
+import datetime
+from typing import List, Mapping, Tuple
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from app.background.fleet import create_fleet
+from app.background.metrics import ReportMetrics
+from app.background.rollups import get_closed_days
+from app.background.loaders import iter_store_statuses, load_store_hours, load_store_timezones
+from app.background.sweep import build_report_data_sweep
+from app.background.tasks import build_complete_report, business_window_hit_rate
+from app.background.utils import business_window_to_utc
+from app.models import (
+    Store,
+    StoreDailyRollup,
+    StoreHours,
+    StoreSchedule,
+    StoreStatus,
+    StoreUptimeState,
+)
+
+from .fixtures import FLEET, LAST_UPDATED, FleetTestCase
+
+
+class EngineTestCase(FleetTestCase):
+    def build_report(self, engine: str, **kwargs) -> str:
+        options = dict(shards=1, incremental=False, online=False)
+        return build_complete_report(engine=engine, **{**options, **kwargs})
+
+
+class VectorizedEngineTest(EngineTestCase):
+    def test_same_report_as_tick(self):
+        report = self.build_report("vectorized")
+        self.assertEqual(len(report.splitlines()), len(FLEET) + 1)
+        self.assertEqual(report, self.build_report("tick"))
+
+    def test_same_report_as_tick_in_batches(self):
+        with self.settings(REPORT_BATCH_SIZE=2):
+            self.assertEqual(self.build_report("vectorized"), self.build_report("tick"))
+
+    def test_same_report_as_tick_before_latest_poll(self):
+        last_updated = LAST_UPDATED - datetime.timedelta(days=2, hours=5, minutes=7)
+        self.assertEqual(
+            self.build_report("vectorized", last_updated_timestamp=last_updated),
+            self.build_report("tick", last_updated_timestamp=last_updated),
+        )
+
+
+class ShardedReportTest(EngineTestCase):
+    def test_same_report_as_tick(self):
+        report = self.build_report("tick")
+        self.assertEqual(self.build_report("vectorized", shards=3), report)
+        self.assertEqual(self.build_report("tick", shards=2), report)
+
+
+class TimezoneFilterTest(EngineTestCase):
+    def report_rows(self, report: str) -> Mapping[str, str]:
+        return {row.split(",", 1)[0]: row for row in report.splitlines()[1:]}
+
+    def test_stores_of_the_timezone(self):
+        for engine, options in [
+            ("tick", dict()),
+            ("vectorized", dict(incremental=True)),
+            ("vectorized", dict(online=True)),
+            ("sql", dict()),
+        ]:
+            with self.subTest(engine=engine, **options):
+                rows = self.report_rows(self.build_report(engine, **options))
+                with CaptureQueriesContext(connection) as queries:
+                    report = self.build_report(engine, timezone="America/Chicago", **options)
+                self.assertEqual(
+                    self.report_rows(report), {"chicago-business": rows["chicago-business"]}
+                )
+                if options:
+                    # the incremental and online reports load the stores they recompute by their ids
+                    continue
+                # the stores of the timezone are filtered in a subquery, their ids are never sent back
+                for query in queries:
+                    self.assertNotIn("'chicago-business'", query["sql"])
+
+
+class StatusLoaderTest(EngineTestCase):
+    def test_statuses_fetched_in_pages(self):
+        since = LAST_UPDATED - datetime.timedelta(days=7)
+        exclude = (
+            LAST_UPDATED - datetime.timedelta(days=3),
+            LAST_UPDATED - datetime.timedelta(days=1),
+        )
+        store_ids = ["chicago-business", "utc-all-day"]
+        for filters in (dict(), dict(exclude=exclude, store_ids=store_ids)):
+            with self.subTest(**filters):
+                with self.settings(REPORT_STATUS_CHUNK_SIZE=10**6):
+                    expected = list(iter_store_statuses(since=since, **filters))
+                statuses = sum(len(store_statuses) for _, store_statuses in expected)
+                with self.settings(REPORT_STATUS_CHUNK_SIZE=97):
+                    with CaptureQueriesContext(connection) as queries:
+                        store_statuses = list(iter_store_statuses(since=since, **filters))
+                self.assertEqual(store_statuses, expected)
+                # every page is a query of its own, of at most the page size
+                self.assertEqual(len(queries), statuses // 97 + 1)
+                for query in queries:
+                    self.assertIn("LIMIT 97", query["sql"])
+
+
+class StoreScheduleTest(EngineTestCase):
+    def test_schedule_rebuilt_on_hours_change(self):
+        load_store_hours()
+        store = Store.objects.get(store_id="sydney-some-days")
+        self.assertTrue(StoreSchedule.objects.filter(store=store).exists())
+        hours = StoreHours.objects.get(store=store, day_of_week=2)
+        hours.end_time_local = datetime.time(18)
+        hours.save()
+        self.assertFalse(StoreSchedule.objects.filter(store=store).exists())
+        store_hours = load_store_hours()
+        self.assertEqual(store_hours["sydney-some-days"][2], (datetime.time(10), datetime.time(18)))
+        # a day without hours is open all day
+        hours.delete()
+        self.assertEqual(
+            load_store_hours()["sydney-some-days"][2], (datetime.time(0), datetime.time(23, 59, 59))
+        )
+        # the schedules of the other stores are kept
+        self.assertEqual(StoreSchedule.objects.count(), len(FLEET))
+        self.assertEqual(
+            store_hours["chicago-business"], [(datetime.time(9), datetime.time(17))] * 7
+        )
+
+    def test_schedule_kept_on_timezone_change(self):
+        store_hours = load_store_hours()
+        store = Store.objects.get(store_id="chicago-business")
+        store.timezone = "Asia/Tokyo"
+        store.save()
+        # the schedule is in local time, the same hours apply in the new timezone
+        self.assertEqual(load_store_hours(), store_hours)
+        StoreSchedule.objects.all().delete()
+        self.assertEqual(load_store_hours(), store_hours)
+        self.assertEqual(self.build_report("vectorized"), self.build_report("tick"))
+
+
+def sweep_reference(
+    polls: List[Tuple[datetime.datetime, str]],
+    hours: List[Tuple[datetime.time, datetime.time]],
+    timezone: str,
+    last_updated: datetime.datetime,
+) -> Mapping[str, int]:
+    """Report data of a store from the status segments of its business hours, one utc day at a time."""
+    day_polls: Mapping[datetime.date, List[Tuple[datetime.datetime, str]]] = dict()
+    for timestamp, status in polls:
+        day_polls.setdefault(timestamp.date(), list()).append((timestamp, status))
+    segments = list()
+    for day, polls in day_polls.items():
+        start, end = business_window_to_utc(timezone, day, *hours[day.weekday()])
+        inside = [(timestamp, status) for timestamp, status in polls if start <= timestamp <= end]
+        if not inside:
+            if start <= end:
+                segments.append((start, end, "inactive"))
+            continue
+        # the first poll back to the start, each one up to the next and the last one up to the end
+        segments.append((start, inside[0][0], inside[0][1]))
+        ends = [timestamp for timestamp, _ in inside[1:]] + [end]
+        segments.extend(
+            (timestamp, next_timestamp, status)
+            for (timestamp, status), next_timestamp in zip(inside, ends)
+        )
+    windows = {
+        "last_hour": (datetime.timedelta(hours=1), datetime.timedelta(minutes=1)),
+        "last_day": (datetime.timedelta(days=1), datetime.timedelta(hours=1)),
+        "last_week": (datetime.timedelta(days=7), datetime.timedelta(hours=1)),
+    }
+    totals = {
+        f"{prefix}_{window}": datetime.timedelta()
+        for prefix in ("uptime", "downtime")
+        for window in windows
+    }
+    for start, end, status in segments:
+        for window, (width, _) in windows.items():
+            overlap = min(end, last_updated) - max(start, last_updated - width)
+            if overlap > datetime.timedelta():
+                prefix = "uptime" if status == "active" else "downtime"
+                totals[f"{prefix}_{window}"] += overlap
+    return {key: total // windows[key.split("_", 1)[1]][1] for key, total in totals.items()}
+
+
+class SweepEngineTest(EngineTestCase):
+    def test_same_report_as_reference(self):
+        store_hours, stores_timezones = load_store_hours(), load_store_timezones()
+        earlier = LAST_UPDATED - datetime.timedelta(days=2, hours=5, minutes=7)
+        for last_updated in (LAST_UPDATED, earlier):
+            with self.subTest(last_updated=last_updated):
+                store_statuses = list(
+                    iter_store_statuses(
+                        since=last_updated - datetime.timedelta(days=7),
+                        until=last_updated + datetime.timedelta(microseconds=1),
+                    )
+                )
+                self.assertEqual(len(store_statuses), len(FLEET))
+                expected = [
+                    {
+                        **sweep_reference(
+                            polls, store_hours[store_id], stores_timezones[store_id], last_updated
+                        ),
+                        "store_id": store_id,
+                    }
+                    for store_id, polls in store_statuses
+                ]
+                # the stores are computed in batches of stores
+                with self.settings(REPORT_BATCH_SIZE=4):
+                    report_data = build_report_data_sweep(
+                        store_statuses, store_hours, stores_timezones, last_updated
+                    )
+                self.assertEqual(report_data, expected)
+
+
+class SqlEngineTest(EngineTestCase):
+    def test_same_report_as_sweep(self):
+        report = self.build_report("sweep")
+        self.assertEqual(len(report.splitlines()), len(FLEET) + 1)
+        self.assertEqual(self.build_report("sql"), report)
+
+    def test_same_report_as_sweep_before_latest_poll(self):
+        last_updated = LAST_UPDATED - datetime.timedelta(days=3, hours=2, minutes=11)
+        self.assertEqual(
+            self.build_report("sql", last_updated_timestamp=last_updated),
+            self.build_report("sweep", last_updated_timestamp=last_updated),
+        )
+
+    def test_same_report_as_sweep_for_some_stores(self):
+        store_ids = ["kolkata-overnight", "sydney-some-days"]
+        report = self.build_report("sql", store_ids=store_ids)
+        self.assertEqual(len(report.splitlines()), len(store_ids) + 1)
+        self.assertEqual(report, self.build_report("sweep", store_ids=store_ids))
+
+
+class BusinessWindowCacheTest(EngineTestCase):
+    def test_lookups_counted_per_report(self):
+        self.build_report("tick")
+        # the windows of the second report are all cached by the first one
+        metrics = ReportMetrics()
+        self.build_report("tick", metrics=metrics)
+        self.assertGreater(metrics.counts["business_window_cache_hits"], 0)
+        self.assertEqual(metrics.counts["business_window_cache_misses"], 0)
+        self.assertEqual(business_window_hit_rate(metrics), 1.0)
+
+
+class IncrementalReportTest(EngineTestCase):
+    def build_incremental_report(self, **kwargs) -> str:
+        return self.build_report("vectorized", incremental=True, **kwargs)
+
+    def test_fleet_has_closed_days(self):
+        closed_days = get_closed_days(
+            load_store_hours(), load_store_timezones(), LAST_UPDATED
+        )
+        self.assertGreater(len(closed_days), 2)
+
+    def test_same_report_as_tick(self):
+        report = self.build_report("tick")
+        self.assertEqual(self.build_incremental_report(), report)
+        self.assertTrue(StoreDailyRollup.objects.exists())
+        # the second report sums the rollups written by the first
+        self.assertEqual(self.build_incremental_report(), report)
+
+    def test_same_report_as_tick_before_latest_poll(self):
+        last_updated = LAST_UPDATED - datetime.timedelta(days=1, hours=3, minutes=41)
+        self.assertEqual(
+            self.build_incremental_report(last_updated_timestamp=last_updated),
+            self.build_report("tick", last_updated_timestamp=last_updated),
+        )
+
+    def test_status_saved_on_a_closed_day(self):
+        self.build_incremental_report()
+        store = Store.objects.get(store_id="utc-all-day")
+        timestamp = LAST_UPDATED - datetime.timedelta(days=4, minutes=30, microseconds=250)
+        self.assertTrue(
+            StoreDailyRollup.objects.filter(store=store, date=timestamp.date()).exists()
+        )
+        StoreStatus.objects.create(
+            store=store, timestamp_utc=timestamp, status=StoreStatus.Status.INACTIVE
+        )
+        self.assertFalse(
+            StoreDailyRollup.objects.filter(store=store, date=timestamp.date()).exists()
+        )
+        self.assertEqual(self.build_incremental_report(), self.build_report("tick"))
+
+    def test_timezone_changed(self):
+        self.build_incremental_report()
+        store = Store.objects.get(store_id="chicago-business")
+        store.timezone = "Asia/Tokyo"
+        store.save()
+        self.assertFalse(StoreDailyRollup.objects.filter(store=store).exists())
+        self.assertEqual(self.build_incremental_report(), self.build_report("tick"))
+
+
+class OnlineReportTest(EngineTestCase):
+    def build_online_report(self, **kwargs) -> str:
+        return self.build_report("vectorized", online=True, **kwargs)
+
+    def create_poll(self, **kwargs) -> StoreStatus:
+        return StoreStatus.objects.create(
+            store=Store.objects.get(store_id="chicago-business"),
+            timestamp_utc=LAST_UPDATED + datetime.timedelta(minutes=7),
+            status=StoreStatus.Status.INACTIVE,
+            **kwargs,
+        )
+
+    def test_same_report_as_tick(self):
+        report = self.build_report("tick")
+        self.assertEqual(self.build_online_report(), report)
+        self.assertEqual(StoreUptimeState.objects.count(), len(FLEET))
+        # the second report reads the states built by the first
+        self.assertEqual(self.build_online_report(), report)
+
+    def test_poll_added_to_state(self):
+        self.build_online_report()
+        with self.settings(REPORT_ONLINE=True):
+            self.create_poll()
+        state = StoreUptimeState.objects.get(store__store_id="chicago-business")
+        self.assertEqual(state.last_timestamp_utc, LAST_UPDATED + datetime.timedelta(minutes=7))
+        self.assertEqual(self.build_online_report(), self.build_report("tick"))
+
+    def test_state_kept_unless_timezone_changed(self):
+        self.build_online_report()
+        store = Store.objects.get(store_id="chicago-business")
+        store.save()
+        store.save(update_fields=["store_id"])
+        self.assertTrue(StoreUptimeState.objects.filter(store=store).exists())
+        store.timezone = "Asia/Tokyo"
+        store.save()
+        self.assertFalse(StoreUptimeState.objects.filter(store=store).exists())
+        self.assertEqual(self.build_online_report(), self.build_report("tick"))
+
+    @mock.patch("app.background.online.uptime_states_marked_stale", False)
+    def test_online_reports_disabled(self):
+        with self.settings(REPORT_ONLINE=True):
+            self.build_online_report()
+        state = StoreUptimeState.objects.get(store__store_id="chicago-business")
+        with self.settings(REPORT_ONLINE=False), CaptureQueriesContext(connection) as queries:
+            self.create_poll()
+        # the states are neither updated nor deleted one poll at a time
+        self.assertFalse(
+            [query for query in queries if StoreUptimeState._meta.db_table in query["sql"]]
+        )
+        self.assertEqual(
+            StoreUptimeState.objects.get(pk=state.pk).last_timestamp_utc, state.last_timestamp_utc
+        )
+        # the states are built again once the online reports are enabled
+        with self.settings(REPORT_ONLINE=True):
+            self.assertEqual(self.build_online_report(), self.build_report("tick"))
+        state = StoreUptimeState.objects.get(store__store_id="chicago-business")
+        self.assertEqual(state.last_timestamp_utc, LAST_UPDATED + datetime.timedelta(minutes=7))
+
+
+class LegacyRoundingTest(TestCase):
+    """
+    A fleet where the exact total of a store lands on a whole minute, which the float seconds
+    summed by the tick engine fall just below, so it reports one minute less.
+    """
+
+    until = datetime.datetime(2024, 10, 1, 18, 13, 22, tzinfo=datetime.timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        create_fleet(
+            stores=20,
+            until=cls.until,
+            hours_shape="business",
+            poll_interval=datetime.timedelta(minutes=7),
+            seed=0,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def build_report(self, **kwargs) -> str:
+        options = dict(engine="vectorized", shards=1, incremental=False, online=False)
+        return build_complete_report(**{**options, **kwargs})
+
+    def test_incremental_report(self):
+        metrics = ReportMetrics()
+        self.assertEqual(
+            self.build_report(incremental=True, metrics=metrics), self.build_report()
+        )
+        self.assertGreater(metrics.counts["stores_replayed"], 0)
+
+    def test_online_report(self):
+        metrics = ReportMetrics()
+        self.assertEqual(self.build_report(online=True, metrics=metrics), self.build_report())
+        self.assertGreater(metrics.counts["stores_replayed"], 0)
@@ -0,0 +1,113 @@
+import json
+from typing import List, Mapping, Optional
+from unittest import mock
+
+import redis
+from django.test import TestCase
+from django.urls import reverse
+
+from app.background.notifications import publish_report_status
+from app.models import Report
+
+
+class FakeSubscription:
+    """Subscription handing out the queued notifications instead of reading them from redis."""
+
+    notifications: List[Optional[Mapping[str, str]]] = []
+    instances: List["FakeSubscription"] = []
+
+    def __init__(self, report_id: str):
+        self.report_id = report_id
+        self.closed = False
+        self.instances.append(self)
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        self.closed = True
+
+    async def get(self, timeout: float) -> Optional[Mapping[str, str]]:
+        return self.notifications.pop(0) if self.notifications else None
+
+
+class UnavailableSubscription(FakeSubscription):
+    async def open(self) -> None:
+        raise redis.ConnectionError("redis is down")
+
+
+class ReportEventsTest(TestCase):
+    def setUp(self):
+        self.report = Report.objects.create()
+        FakeSubscription.notifications = list()
+        FakeSubscription.instances = list()
+
+    def notify(self, *statuses: Optional[str]) -> None:
+        FakeSubscription.notifications.extend(
+            None if status is None else {"report_id": str(self.report.report_id), "status": status}
+            for status in statuses
+        )
+
+    async def get_events(self, subscription=FakeSubscription, report_id=None, **kwargs):
+        url = reverse("report_events", args=[report_id or self.report.report_id])
+        with mock.patch("app.views.ReportSubscription", subscription):
+            return await self.async_client.get(url, **kwargs)
+
+    async def test_long_poll_answered_on_completion(self):
+        self.notify("Complete")
+        response = await self.get_events()
+        self.assertEqual(response.json()["status"], "Complete")
+        self.assertTrue(FakeSubscription.instances[0].closed)
+
+    async def test_long_poll_times_out(self):
+        response = await self.get_events(data={"timeout": "0.01"})
+        self.assertEqual(response.json()["status"], "Running")
+
+    async def test_long_poll_without_redis(self):
+        response = await self.get_events(subscription=UnavailableSubscription)
+        self.assertEqual(response.json()["status"], "Running")
+
+    async def test_server_sent_events(self):
+        self.notify(None, "Complete")
+        response = await self.get_events(headers={"Accept": "text/event-stream"})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        content = "".join([chunk.decode() async for chunk in response.streaming_content])
+        events = [
+            json.loads(line.removeprefix("data: "))["status"]
+            for line in content.splitlines()
+            if line.startswith("data: ")
+        ]
+        self.assertEqual(events, ["Running", "Complete"])
+        self.assertIn(": keep-alive", content)
+        self.assertTrue(FakeSubscription.instances[0].closed)
+
+    async def test_server_sent_events_end_on_failure(self):
+        self.notify("Failed")
+        response = await self.get_events(headers={"Accept": "text/event-stream"})
+        content = "".join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertTrue(content.endswith('"status": "Failed"}\n\n'))
+
+    async def test_invalid_requests(self):
+        response = await self.get_events(report_id="unknown")
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(FakeSubscription.instances[0].closed)
+        response = await self.get_events(data={"timeout": "soon"})
+        self.assertEqual(response.status_code, 400)
+
+
+class PublishReportStatusTest(TestCase):
+    def test_publish(self):
+        with mock.patch("app.background.notifications.get_redis") as get_redis:
+            publish_report_status(["a", "b"], "Complete")
+        get_redis().publish.assert_has_calls(
+            [
+                mock.call("report:a", json.dumps({"report_id": "a", "status": "Complete"})),
+                mock.call("report:b", json.dumps({"report_id": "b", "status": "Complete"})),
+            ]
+        )
+
+    def test_redis_unavailable(self):
+        with mock.patch("app.background.notifications.get_redis") as get_redis:
+            get_redis().publish.side_effect = redis.ConnectionError("redis is down")
+            # the clients fall back to get_report, the report task does not fail
+            publish_report_status(["a"], "Complete")
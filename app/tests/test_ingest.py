@@ -0,0 +1,140 @@
+import datetime
+import io
+import json
+
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.test import RequestFactory, TestCase
+from django.test.client import FakePayload
+from django.urls import reverse
+
+from app.models import PollWatermark, Store, StoreStatus
+from app.services import IngestService, WatermarkService
+from app.views import IngestPollsAPIView
+
+POLLS_CSV = (
+    "store_id,status,timestamp_utc\n"
+    "ingest-a,active,2023-03-05 18:31:44.690668 UTC\n"
+    "ingest-a,inactive,2023-03-05 19:13:22.479220 UTC\n"
+    "ingest-b,active,2023-03-05 19:20:00 UTC\n"
+)
+
+
+class IngestPollsEndpointTest(TestCase):
+    def post(self, body: str, content_type: str):
+        return self.client.post(reverse("ingest_polls"), body, content_type=content_type)
+
+    def test_csv(self):
+        response = self.post(POLLS_CSV, "text/csv")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"received": 3, "written": 3, "stores_created": 2})
+        self.assertEqual(StoreStatus.objects.count(), 3)
+        self.assertEqual(
+            PollWatermark.objects.get().timestamp_utc.isoformat(), "2023-03-05T19:20:00+00:00"
+        )
+
+    def test_ndjson_sent_again(self):
+        body = "\n".join(
+            json.dumps({"store_id": "ingest-a", "status": status, "timestamp_utc": timestamp})
+            for status, timestamp in [
+                ("active", "2023-03-05 18:31:44.690668 UTC"),
+                ("inactive", "2023-03-05 19:13:22.479220 UTC"),
+            ]
+        )
+        self.post(body, "application/x-ndjson")
+        response = self.post(body, "application/x-ndjson")
+        self.assertEqual(response.json(), {"received": 2, "written": 2, "stores_created": 0})
+        self.assertEqual(StoreStatus.objects.count(), 2)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.post(POLLS_CSV, "application/json").status_code, 415)
+        empty = self.client.post(
+            reverse("ingest_polls"), CONTENT_TYPE="text/csv", CONTENT_LENGTH="0"
+        )
+        self.assertEqual(empty.status_code, 400)
+        invalid = "store_id,status,timestamp_utc\ningest-a,open,2023-03-05 UTC\n"
+        response = self.post(invalid, "text/csv")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("line 2", response.json()["detail"])
+
+    def test_chunked_asgi_upload(self):
+        # an ASGI server passes the whole body of a chunked upload, which has no Content-Length
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": reverse("ingest_polls"),
+            "headers": [(b"content-type", b"text/csv"), (b"transfer-encoding", b"chunked")],
+        }
+        request = ASGIRequest(scope, io.BytesIO(POLLS_CSV.encode()))
+        self.assertNotIn("CONTENT_LENGTH", request.META)
+        response = IngestPollsAPIView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["received"], 3)
+        self.assertEqual(Store.objects.count(), 2)
+
+    def test_chunked_wsgi_upload(self):
+        # a WSGI request reads no more of the body than its Content-Length
+        request = RequestFactory().request(
+            REQUEST_METHOD="POST",
+            PATH_INFO=reverse("ingest_polls"),
+            CONTENT_TYPE="text/csv",
+            HTTP_TRANSFER_ENCODING="chunked",
+            **{"wsgi.input": FakePayload(POLLS_CSV)},
+        )
+        self.assertNotIn("CONTENT_LENGTH", request.META)
+        response = IngestPollsAPIView.as_view()(request)
+        self.assertEqual(response.status_code, 411)
+        self.assertFalse(StoreStatus.objects.exists())
+
+
+class WatermarkServiceTest(TestCase):
+    timestamp = datetime.datetime(2023, 3, 5, 19, 20, tzinfo=datetime.timezone.utc)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_advance_never_moves_back(self):
+        WatermarkService.advance(self.timestamp)
+        WatermarkService.advance(self.timestamp - datetime.timedelta(hours=1))
+        WatermarkService.advance(None)
+        self.assertEqual(PollWatermark.objects.get().timestamp_utc, self.timestamp)
+        later = self.timestamp + datetime.timedelta(minutes=1)
+        WatermarkService.advance(later)
+        self.assertEqual(WatermarkService.get_last_updated_timestamp(), later)
+
+    def test_cache_and_fallback(self):
+        WatermarkService.advance(self.timestamp)
+        self.assertEqual(WatermarkService.get_last_updated_timestamp(), self.timestamp)
+        # the cached timestamp is read without the watermark row
+        later = self.timestamp + datetime.timedelta(hours=1)
+        PollWatermark.objects.update(timestamp_utc=later)
+        self.assertEqual(WatermarkService.get_last_updated_timestamp(), self.timestamp)
+        # the row is read once the cache is lost
+        cache.clear()
+        self.assertEqual(WatermarkService.get_last_updated_timestamp(), later)
+        # without a watermark, it is seeded from the latest poll
+        store = Store.objects.create(store_id="watermark")
+        earlier = self.timestamp - datetime.timedelta(days=1)
+        StoreStatus.objects.bulk_create(
+            [
+                StoreStatus(store=store, timestamp_utc=self.timestamp, status=1),
+                StoreStatus(store=store, timestamp_utc=earlier, status=0),
+            ]
+        )
+        PollWatermark.objects.all().delete()
+        cache.clear()
+        self.assertEqual(WatermarkService.get_last_updated_timestamp(), self.timestamp)
+        self.assertEqual(PollWatermark.objects.get().timestamp_utc, self.timestamp)
+
+    def test_bulk_ingest(self):
+        WatermarkService.advance(self.timestamp - datetime.timedelta(days=1))
+        # the cached timestamp is replaced by the ingested batches
+        WatermarkService.get_last_updated_timestamp()
+        IngestService.ingest_polls(io.BytesIO(POLLS_CSV.encode()), "csv", batch_size=1)
+        self.assertEqual(WatermarkService.get_last_updated_timestamp(), self.timestamp)
+        # polls older than the watermark do not move it back
+        polls = "store_id,status,timestamp_utc\ningest-b,inactive,2023-03-04 10:00:00 UTC\n"
+        IngestService.ingest_polls(io.BytesIO(polls.encode()), "csv")
+        self.assertEqual(WatermarkService.get_last_updated_timestamp(), self.timestamp)
+        self.assertEqual(PollWatermark.objects.get().timestamp_utc, self.timestamp)
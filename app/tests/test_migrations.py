@@ -0,0 +1,115 @@
+import datetime
+import gzip
+import hashlib
+
+from django.apps import apps as global_apps
+from django.core.files.storage import storages
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import TransactionTestCase, override_settings
+
+
+@override_settings(MIGRATION_MODULES={})
+class DataMigrationTest(TransactionTestCase):
+    """
+    Forward and backward runs of the data migrations on seeded rows. The tables of the app are
+    created from its migrations instead of its models, and 0002 is recorded without loading data/.
+    """
+
+    timestamp = datetime.datetime(2023, 3, 5, 18, 31, 44, tzinfo=datetime.timezone.utc)
+
+    def setUp(self):
+        with connection.schema_editor() as editor:
+            for model in global_apps.get_app_config("app").get_models():
+                editor.delete_model(model)
+        self.migrate("0001_initial")
+        MigrationRecorder(connection).record_applied("app", "0002_load_data")
+        self.addCleanup(self.migrate_to_models)
+
+    def migrate(self, target: str):
+        executor = MigrationExecutor(connection)
+        executor.migrate([("app", target)])
+        return executor.loader.project_state([("app", target)]).apps
+
+    def migrate_to_models(self) -> None:
+        # the tables of the models are back for the other tests, as if the app had no migrations
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes("app"))
+        MigrationRecorder.Migration.objects.filter(app="app").delete()
+
+    def test_compact_statuses(self):
+        apps = self.migrate("0005_storedailyrollup")
+        Store = apps.get_model("app", "Store")
+        StoreStatus = apps.get_model("app", "StoreStatus")
+        store = Store.objects.create(store_id="migrated")
+        polls = [
+            (self.timestamp + datetime.timedelta(hours=2), "inactive"),
+            (self.timestamp, "active"),
+            (self.timestamp + datetime.timedelta(hours=1), "active"),
+        ]
+        for timestamp, status in polls:
+            StoreStatus.objects.create(store=store, timestamp_utc=timestamp, status=status)
+        # the statuses become integers, numbered in the order they were polled
+        apps = self.migrate("0006_compact_storestatus")
+        StoreStatus = apps.get_model("app", "StoreStatus")
+        statuses = StoreStatus.objects.order_by("id")
+        self.assertEqual(
+            list(statuses.values_list("store_id", "timestamp_utc", "status")),
+            [
+                (str(store.pk), timestamp, int(status == "active"))
+                for timestamp, status in sorted(polls)
+            ],
+        )
+        # and strings with uuid keys again once migrated back
+        apps = self.migrate("0005_storedailyrollup")
+        StoreStatus = apps.get_model("app", "StoreStatus")
+        self.assertEqual(
+            sorted(StoreStatus.objects.values_list("timestamp_utc", "status")), sorted(polls)
+        )
+        self.assertEqual(len(StoreStatus.objects.first().pk), 36)
+
+    def test_duplicate_polls_removed(self):
+        apps = self.migrate("0007_pollwatermark")
+        Store = apps.get_model("app", "Store")
+        StoreStatus = apps.get_model("app", "StoreStatus")
+        store = Store.objects.create(store_id="migrated")
+        later = self.timestamp + datetime.timedelta(hours=1)
+        for timestamp, status in [(self.timestamp, 1), (later, 0), (later, 1), (later, 1)]:
+            StoreStatus.objects.create(store=store, timestamp_utc=timestamp, status=status)
+        latest = StoreStatus.objects.latest("id")
+        # only the latest status of a poll stored more than once is kept
+        apps = self.migrate("0008_storestatus_unique_store_status_poll")
+        StoreStatus = apps.get_model("app", "StoreStatus")
+        first = StoreStatus.objects.earliest("id")
+        self.assertEqual(
+            list(StoreStatus.objects.order_by("timestamp_utc").values_list("timestamp_utc", "id")),
+            [(self.timestamp, first.id), (later, latest.id)],
+        )
+        # the constraint is dropped on the way back, the polls removed are not restored
+        apps = self.migrate("0007_pollwatermark")
+        StoreStatus = apps.get_model("app", "StoreStatus")
+        StoreStatus.objects.create(store_id=store.pk, timestamp_utc=later, status=0)
+        self.assertEqual(StoreStatus.objects.count(), 3)
+
+    def test_report_files(self):
+        apps = self.migrate("0009_storeschedule")
+        Report = apps.get_model("app", "Report")
+        csv = "store_id,uptime_last_hour(in minutes)\nmigrated,60\n"
+        complete = Report.objects.create(status="Complete", report=csv)
+        running = Report.objects.create()
+        # the csv of the complete reports is moved to gzip files
+        apps = self.migrate("0010_report_file")
+        Report = apps.get_model("app", "Report")
+        report = Report.objects.get(pk=complete.pk)
+        with storages["reports"].open(report.file_path, "rb") as file:
+            compressed = file.read()
+        self.assertEqual(gzip.decompress(compressed).decode(), csv)
+        self.assertEqual(report.file_size, len(compressed))
+        self.assertEqual(report.checksum, hashlib.sha256(compressed).hexdigest())
+        self.assertEqual(Report.objects.get(pk=running.pk).file_path, "")
+        # and back to the database
+        apps = self.migrate("0009_storeschedule")
+        Report = apps.get_model("app", "Report")
+        self.assertEqual(Report.objects.get(pk=complete.pk).report, csv)
+        self.assertEqual(Report.objects.get(pk=running.pk).report, "")
@@ -0,0 +1,141 @@
+import datetime
+from typing import List
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+
+from app.background.partitions import manage_partitions, partition_table
+from app.models import StoreStatus
+
+from .fixtures import LAST_UPDATED, FleetTestCase
+
+TODAY = LAST_UPDATED.date()
+
+
+class MySQLPartitionsTest(FleetTestCase):
+    """Partitions of a MySQL table, with the partitions and statements of its connection faked."""
+
+    def setUp(self):
+        super().setUp()
+        # names returned by each read of the partitions of the table
+        self.partitions: List[List[str]] = list()
+        cursor = mock.MagicMock()
+        cursor.fetchall.side_effect = lambda: [(name,) for name in self.partitions.pop(0)]
+        self.cursor = cursor
+        fake_connection = mock.MagicMock(vendor="mysql")
+        fake_connection.cursor.return_value.__enter__.return_value = cursor
+        fake_connection.ops.quote_name = lambda name: f"`{name}`"
+        patcher = mock.patch("app.background.partitions.connection", fake_connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def statements(self) -> List[str]:
+        # the reads of the partitions are not statements on the table
+        return [
+            call.args[0]
+            for call in self.cursor.execute.call_args_list
+            if not call.args[0].startswith("SELECT")
+        ]
+
+    def daily_partitions(self, start: datetime.date, end: datetime.date) -> List[str]:
+        days = (end - start).days + 1
+        return [f"p{start + datetime.timedelta(days=day):%Y%m%d}" for day in range(days)]
+
+    def test_partition_table(self):
+        self.partitions = [[]]
+        created = partition_table(retention_days=7, ahead_days=2, today=TODAY)
+        # the day before the first kept day holds the older polls, dropped with the expired days
+        last_day = TODAY + datetime.timedelta(days=2)
+        self.assertEqual(created, self.daily_partitions(datetime.date(2023, 3, 6), last_day))
+        [statement] = self.statements()
+        self.assertTrue(
+            statement.startswith(
+                "ALTER TABLE `app_storestatus` DROP PRIMARY KEY, "
+                "ADD PRIMARY KEY (id, timestamp_utc) "
+                "PARTITION BY RANGE (TO_DAYS(timestamp_utc)) "
+                "(PARTITION p20230306 VALUES LESS THAN (TO_DAYS('2023-03-07')), "
+            )
+        )
+        self.assertTrue(
+            statement.endswith(
+                "PARTITION p20230316 VALUES LESS THAN (TO_DAYS('2023-03-17')), "
+                "PARTITION pfuture VALUES LESS THAN MAXVALUE)"
+            )
+        )
+        # the table is rebuilt only once
+        self.partitions = [created + ["pfuture"]]
+        with self.assertRaisesMessage(ValueError, "already partitioned"):
+            partition_table(today=TODAY)
+
+    def test_table_not_partitioned(self):
+        # celery beat does not rebuild the table, nor deletes the polls without a retention
+        self.partitions = [[]]
+        partitions = manage_partitions(ahead_days=2, today=TODAY)
+        self.assertEqual(partitions, {"created": [], "dropped": [], "deleted": 0})
+        self.assertEqual(self.statements(), [])
+
+    def test_partitions_created_ahead(self):
+        existing = self.daily_partitions(datetime.date(2023, 3, 1), TODAY) + ["pfuture"]
+        self.partitions = [existing]
+        partitions = manage_partitions(ahead_days=2, today=TODAY)
+        self.assertEqual(partitions["created"], ["p20230315", "p20230316"])
+        self.assertEqual(partitions["dropped"], [])
+        self.assertEqual(
+            self.statements(),
+            [
+                "ALTER TABLE `app_storestatus` REORGANIZE PARTITION pfuture INTO ("
+                "PARTITION p20230315 VALUES LESS THAN (TO_DAYS('2023-03-16')), "
+                "PARTITION p20230316 VALUES LESS THAN (TO_DAYS('2023-03-17')), "
+                "PARTITION pfuture VALUES LESS THAN MAXVALUE)"
+            ],
+        )
+        # the partitions ahead are already there on the next run
+        self.cursor.execute.reset_mock()
+        self.partitions = [existing[:-1] + partitions["created"] + ["pfuture"]]
+        self.assertEqual(manage_partitions(ahead_days=2, today=TODAY)["created"], [])
+        self.assertEqual(self.statements(), [])
+
+    def test_expired_partitions_dropped(self):
+        existing = self.daily_partitions(datetime.date(2023, 3, 1), TODAY) + ["pfuture"]
+        self.partitions = [existing, existing]
+        polls = StoreStatus.objects.count()
+        partitions = manage_partitions(retention_days=7, ahead_days=0, today=TODAY)
+        # the days before the 7 days of polls before the latest one
+        dropped = self.daily_partitions(datetime.date(2023, 3, 1), datetime.date(2023, 3, 6))
+        self.assertEqual(partitions, {"created": [], "dropped": dropped, "deleted": 0})
+        self.assertEqual(
+            self.statements(),
+            [f"ALTER TABLE `app_storestatus` DROP PARTITION {', '.join(dropped)}"],
+        )
+        # the polls are dropped with their partitions, not deleted
+        self.assertEqual(StoreStatus.objects.count(), polls)
+
+
+class RetentionTest(FleetTestCase):
+    def test_expired_polls_deleted(self):
+        cutoff = datetime.datetime(2023, 3, 7, tzinfo=datetime.timezone.utc)
+        expired = StoreStatus.objects.filter(timestamp_utc__lt=cutoff).count()
+        self.assertGreater(expired, 0)
+        polls = StoreStatus.objects.count()
+        partitions = manage_partitions(retention_days=7, today=TODAY)
+        self.assertEqual(partitions, {"created": [], "dropped": [], "deleted": expired})
+        self.assertEqual(StoreStatus.objects.count(), polls - expired)
+        self.assertFalse(StoreStatus.objects.filter(timestamp_utc__lt=cutoff).exists())
+
+    def test_every_poll_kept_by_default(self):
+        polls = StoreStatus.objects.count()
+        with self.settings(POLL_RETENTION_DAYS=None):
+            self.assertEqual(manage_partitions(today=TODAY)["deleted"], 0)
+        self.assertEqual(StoreStatus.objects.count(), polls)
+
+    def test_retention_validated(self):
+        for retention_days in (0, 6):
+            with self.subTest(retention_days=retention_days):
+                with self.assertRaisesMessage(ValueError, "at least 7 days"):
+                    manage_partitions(retention_days=retention_days)
+                with self.assertRaisesMessage(CommandError, "at least 7 days"):
+                    call_command("manage_partitions", retention_days=retention_days)
+
+    def test_partition_table_on_mysql_only(self):
+        with self.assertRaisesMessage(CommandError, "on MySQL only"):
+            call_command("partition_polls")
@@ -0,0 +1,26 @@
+from django.test import TestCase
+
+from app.background.storage import iter_report_file, open_report_file, save_report_file
+from app.models import Report
+
+REPORT_CSV = "store_id,uptime_last_hour\nstore-a,60\n"
+
+
+class ReportFileTest(TestCase):
+    def setUp(self):
+        self.report = Report(status="Complete")
+        save_report_file(self.report, REPORT_CSV)
+        self.report.save()
+
+    def test_uncompressed_reader_closes_storage_file(self):
+        reader = open_report_file(self.report, compressed=False)
+        storage_file = reader.fileobj
+        self.assertEqual(reader.read(), REPORT_CSV.encode())
+        reader.close()
+        self.assertTrue(storage_file.closed)
+        # closing again is a no-op
+        reader.close()
+
+    def test_uncompressed_range(self):
+        chunks = iter_report_file(self.report, False, 9, 24, chunk_size=4)
+        self.assertEqual(b"".join(chunks), REPORT_CSV.encode()[9:25])
@@ -0,0 +1,186 @@
+import datetime
+import io
+from unittest import mock
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from app.background.progress import ReportProgress, get_report_progress
+from app.background.tasks import (
+    fail_report_chunks,
+    generate_report,
+    generate_report_distributed,
+)
+from app.models import Report, Store, StoreStatus
+from app.services import IngestService, ReportCacheService, ReportService
+
+from .fixtures import FLEET, LAST_UPDATED, FleetTestCase
+
+
+class ReportFailureTest(FleetTestCase):
+    def setUp(self):
+        super().setUp()
+        fingerprint = ReportCacheService.get_fingerprint(LAST_UPDATED)
+        # the report computing the fingerprint, and one triggered while it is in flight
+        self.report = Report.objects.create(fingerprint=fingerprint)
+        self.assertTrue(ReportCacheService.acquire_inflight(fingerprint, self.report.report_id))
+        self.merged = Report.objects.create(fingerprint=fingerprint)
+        self.inflight_key = f"report-inflight:{fingerprint}"
+
+    def assertReportsFailed(self):
+        for report in (self.report, self.merged):
+            report.refresh_from_db()
+            self.assertEqual(report.status, "Failed")
+        self.assertIsNone(cache.get(self.inflight_key))
+
+    def test_generate_report(self):
+        with mock.patch(
+            "app.background.tasks.build_report_columns", side_effect=RuntimeError("boom")
+        ):
+            result = generate_report.apply(
+                kwargs=dict(report_id=self.report.report_id), throw=False
+            )
+        self.assertTrue(result.failed())
+        self.assertReportsFailed()
+        response = self.client.get(reverse("get_report"), {"report_id": self.merged.report_id})
+        self.assertEqual(response.json()["status"], "Failed")
+        response = self.client.get(reverse("report_events", args=[self.merged.report_id]))
+        self.assertEqual(response.json()["status"], "Failed")
+        # the next trigger computes the report again
+        with self.settings(REPORT_SCHEDULE_MAX_AGE=0):
+            report_id = ReportService.start_report_generation()
+        self.assertEqual(Report.objects.get(report_id=report_id).status, "Complete")
+
+    def test_generate_report_distributed(self):
+        with mock.patch(
+            "app.background.tasks.build_complete_report", side_effect=RuntimeError("boom")
+        ):
+            result = generate_report_distributed.apply(
+                kwargs=dict(report_id=self.report.report_id), throw=False
+            )
+        self.assertTrue(result.failed())
+        self.assertReportsFailed()
+
+    def test_chord_error_callback(self):
+        fail_report_chunks.si(report_id=self.report.report_id).apply()
+        self.assertReportsFailed()
+
+    def test_complete_report_not_failed(self):
+        Report.objects.filter(pk=self.report.pk).update(status="Complete")
+        fail_report_chunks.si(report_id=self.report.report_id).apply()
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, "Complete")
+
+
+class ReportCacheTest(FleetTestCase):
+    def start_report(self) -> Report:
+        with self.settings(REPORT_SCHEDULE_MAX_AGE=0):
+            return Report.objects.get(report_id=ReportService.start_report_generation())
+
+    def read_csv(self, report: Report) -> bytes:
+        with ReportService.open_report_file(report, compressed=False) as file:
+            return file.read()
+
+    def assertRecomputed(self, cached: Report) -> None:
+        report = self.start_report()
+        self.assertNotEqual(report.fingerprint, cached.fingerprint)
+        self.assertNotEqual(report.file_path, cached.file_path)
+        with self.settings(REPORT_CACHE=False):
+            self.assertEqual(self.read_csv(report), self.read_csv(self.start_report()))
+
+    def test_same_polls_reused(self):
+        report = self.start_report()
+        self.assertEqual(self.start_report().file_path, report.file_path)
+
+    def test_late_poll_ingested(self):
+        report = self.start_report()
+        late = LAST_UPDATED - datetime.timedelta(minutes=30)
+        polls = f"store_id,status,timestamp_utc\nutc-all-day,inactive,{late:%Y-%m-%d %H:%M:%S} UTC"
+        IngestService.ingest_polls(io.BytesIO(polls.encode()), "csv")
+        # the watermark did not move, the report is computed again with the late poll
+        self.assertRecomputed(report)
+
+    def test_status_saved(self):
+        report = self.start_report()
+        poll = StoreStatus.objects.filter(
+            store=Store.objects.get(store_id="utc-all-day"), timestamp_utc__lt=LAST_UPDATED
+        ).latest("timestamp_utc")
+        poll.status = 1 - poll.status
+        poll.save()
+        self.assertRecomputed(report)
+
+
+class DistributedReportTest(FleetTestCase):
+    def generate(self, task) -> Report:
+        report = Report.objects.create()
+        task.apply(kwargs=dict(report_id=report.report_id))
+        report.refresh_from_db()
+        self.assertEqual(report.status, "Complete")
+        return report
+
+    def test_same_file_as_generate_report(self):
+        report = self.generate(generate_report)
+        with self.settings(REPORT_CHUNK_SIZE=2):
+            distributed = self.generate(generate_report_distributed)
+        # the chunks are joined in the order of the serial report, with the same checksum
+        with ReportService.open_report_file(distributed, compressed=False) as file:
+            content = file.read()
+        with ReportService.open_report_file(report, compressed=False) as file:
+            self.assertEqual(content, file.read())
+        self.assertEqual(distributed.checksum, report.checksum)
+
+
+class ReportProgressTest(FleetTestCase):
+    def generate(self, task=generate_report):
+        """Generate a report, and return it with the progress read after each of its updates."""
+        report = Report.objects.create()
+        published = list()
+        publish = ReportProgress.publish
+
+        def read_progress(progress, force=False):
+            publish(progress, force=force)
+            published.append(get_report_progress(report.report_id))
+
+        with mock.patch.object(ReportProgress, "publish", read_progress):
+            with self.settings(REPORT_PROGRESS_INTERVAL=0):
+                task.apply(kwargs=dict(report_id=report.report_id), throw=False)
+        report.refresh_from_db()
+        return report, published
+
+    def phases(self, published) -> list:
+        phases = list()
+        for progress in published:
+            if progress is not None and progress["phase"] not in phases:
+                phases.append(progress["phase"])
+        return phases
+
+    def test_published_and_cleared(self):
+        report, published = self.generate()
+        self.assertEqual(report.status, "Complete")
+        self.assertEqual(self.phases(published), ["loading", "computing", "formatting", "saving"])
+        computing = [progress for progress in published if progress["phase"] == "computing"]
+        self.assertEqual({progress["stores_total"] for progress in computing}, {len(FLEET)})
+        self.assertEqual(
+            [progress["stores_processed"] for progress in computing], list(range(len(FLEET) + 1))
+        )
+        self.assertIn("loading", computing[-1]["phases"])
+        self.assertIsNone(get_report_progress(report.report_id))
+        response = self.client.get(reverse("get_report"), {"report_id": report.report_id})
+        self.assertEqual(response.status_code, 200)
+
+    def test_cleared_on_failure(self):
+        with mock.patch(
+            "app.background.tasks.generate_csv_from_columns", side_effect=RuntimeError("boom")
+        ):
+            report, published = self.generate()
+        self.assertEqual(report.status, "Failed")
+        self.assertEqual(self.phases(published), ["loading", "computing", "formatting"])
+        self.assertIsNone(get_report_progress(report.report_id))
+
+    def test_distributed_report(self):
+        with self.settings(REPORT_CHUNK_SIZE=2):
+            report, published = self.generate(generate_report_distributed)
+        self.assertEqual(report.status, "Complete")
+        self.assertEqual(self.phases(published), ["loading", "computing", "saving"])
+        self.assertEqual(published[-1]["stores_processed"], len(FLEET))
+        self.assertIsNone(get_report_progress(report.report_id))
@@ -0,0 +1,288 @@
+import datetime
+import gzip
+import json
+import marshal
+import re
+import unittest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from app.background.columnar import COLUMNAR_MEDIA_TYPES, pyarrow
+from app.background.metrics import STORE_COMPUTE_BUCKETS
+from app.background.profiling import PROFILE_FILES, PROFILERS
+from app.background.tasks import materialize_report
+from app.models import Report
+from app.services import ReportService
+
+from .fixtures import FLEET, FleetTestCase
+
+
+class ReportViewTestCase(FleetTestCase):
+    """Test case on a report of the test fleet, generated once for the tests of the case."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.report = Report.objects.get(report_id=ReportService.start_report_generation())
+
+    def read_csv(self) -> bytes:
+        with ReportService.open_report_file(self.report, compressed=False) as file:
+            return file.read()
+
+    def read_columnar(self, format: str) -> bytes:
+        with ReportService.open_columnar_file(self.report, format) as file:
+            return file.read()
+
+
+class DownloadReportTest(ReportViewTestCase):
+    def download(self, report_id=None, **headers):
+        url = reverse("download_report", args=[report_id or self.report.report_id])
+        response = self.client.get(url, headers=headers)
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_csv(self):
+        response, content = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(content, self.read_csv())
+        self.assertEqual(response["ETag"], f'"{self.report.checksum}"')
+        self.assertTrue(content.startswith(b"store_id,"))
+
+    def test_gzip(self):
+        response, content = self.download(accept_encoding="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(content), self.read_csv())
+        self.assertEqual(int(response["Content-Length"]), self.report.file_size)
+
+    def test_not_modified_and_range(self):
+        etag = self.download()[0]["ETag"]
+        self.assertEqual(self.download(if_none_match=etag)[0].status_code, 304)
+        response, content = self.download(range="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(content, self.read_csv()[10:20])
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{self.report.content_size}")
+        # a range of another version of the report sends the whole file
+        response, content = self.download(range="bytes=10-19", if_range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, self.read_csv())
+        response, _ = self.download(range=f"bytes={self.report.content_size}-")
+        self.assertEqual(response.status_code, 416)
+
+    def test_unknown_and_running_reports(self):
+        self.assertEqual(self.download(report_id="unknown")[0].status_code, 404)
+        running = Report.objects.create()
+        self.assertEqual(self.download(report_id=running.report_id)[0].status_code, 409)
+
+    def test_missing_columnar_format(self):
+        Report.objects.filter(pk=self.report.pk).update(columnar_files={})
+        response, _ = self.download(accept=COLUMNAR_MEDIA_TYPES["parquet"])
+        self.assertEqual(response.status_code, 406)
+        # other types get the csv
+        response, content = self.download(accept="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, self.read_csv())
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_columnar_formats(self):
+        for format, media_type in COLUMNAR_MEDIA_TYPES.items():
+            with self.subTest(format=format):
+                response, content = self.download(accept=media_type, accept_encoding="gzip")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Type"], media_type)
+                self.assertNotIn("Content-Encoding", response)
+                self.assertEqual(content, self.read_columnar(format))
+                self.assertIn(f'{self.report.report_id}.{format}"', response["Content-Disposition"])
+                etag = response["ETag"]
+                self.assertNotEqual(etag, f'"{self.report.checksum}"')
+                response, _ = self.download(accept=media_type, if_none_match=etag)
+                self.assertEqual(response.status_code, 304)
+                response, content = self.download(
+                    accept=media_type, range="bytes=-16", if_range=etag
+                )
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(content, self.read_columnar(format)[-16:])
+
+
+class GetReportTest(ReportViewTestCase):
+    def get_report(self, **headers):
+        response = self.client.get(
+            reverse("get_report"), {"report_id": self.report.report_id}, headers=headers
+        )
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_csv(self):
+        response, content = self.get_report()
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(content, self.read_csv())
+        response, content = self.get_report(accept_encoding="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(content), self.read_csv())
+
+    def test_running_report(self):
+        running = Report.objects.create()
+        response = self.client.get(reverse("get_report"), {"report_id": running.report_id})
+        self.assertEqual(response.json(), {"status": "Running", "progress": None})
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_columnar_formats(self):
+        csv_rows = self.read_csv().decode().splitlines()
+        for format, media_type in COLUMNAR_MEDIA_TYPES.items():
+            with self.subTest(format=format):
+                response, content = self.get_report(accept=f"text/csv;q=0.5, {media_type}")
+                self.assertEqual(response["Content-Type"], media_type)
+                self.assertIn("Accept", response["Vary"])
+                if format == "parquet":
+                    table = pyarrow.parquet.read_table(pyarrow.BufferReader(content))
+                else:
+                    table = pyarrow.ipc.open_file(pyarrow.BufferReader(content)).read_all()
+                # the same rows as the csv
+                self.assertEqual(",".join(table.column_names), csv_rows[0])
+                self.assertEqual(
+                    [",".join(map(str, row.values())) for row in table.to_pylist()], csv_rows[1:]
+                )
+
+    def test_missing_columnar_format(self):
+        Report.objects.filter(pk=self.report.pk).update(columnar_files={})
+        response, content = self.get_report(accept=COLUMNAR_MEDIA_TYPES["arrow"])
+        self.assertEqual(response.status_code, 406)
+        self.assertEqual(json.loads(content)["available"], ["text/csv"])
+        # every format accepted alike gets the csv
+        response, content = self.get_report(accept="*/*")
+        self.assertEqual(content, self.read_csv())
+
+
+class DownloadProfileTest(ReportViewTestCase):
+    def download(self, report_id):
+        response = self.client.get(reverse("download_profile", args=[report_id]))
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_profiled_reports(self):
+        for profiler in PROFILERS:
+            with self.subTest(profiler=profiler), self.settings(REPORT_PROFILE_INTERVAL=0.001):
+                report = Report.objects.get(
+                    report_id=ReportService.start_report_generation(profile=profiler)
+                )
+                self.assertEqual(report.status, "Complete")
+                suffix, content_type = PROFILE_FILES[profiler]
+                self.assertTrue(report.profile_path.endswith(f".{suffix}"))
+                with ReportService.open_profile_file(report) as file:
+                    profile = file.read()
+                response, content = self.download(report.report_id)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Type"], content_type)
+                self.assertIn(f'{report.report_id}.{suffix}"', response["Content-Disposition"])
+                self.assertEqual(content, profile)
+                if profiler == "cprofile":
+                    # the stats of pstats, one entry per function called
+                    self.assertTrue(marshal.loads(profile))
+                else:
+                    # collapsed stacks, each followed by its sample count
+                    for line in profile.decode().splitlines():
+                        self.assertRegex(line, r"^\S.* \d+$")
+                # a profiled report is computed, not pointed to the file of the fleet report
+                self.assertNotEqual(report.file_path, self.report.file_path)
+
+    def test_not_profiled(self):
+        response, _ = self.download(self.report.report_id)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["detail"], "Report was not profiled")
+        self.assertEqual(self.download("unknown")[0].status_code, 404)
+        running = Report.objects.create()
+        self.assertEqual(self.download(running.report_id)[0].status_code, 409)
+
+
+class LatestReportTest(FleetTestCase):
+    def trigger_report(self, **params) -> str:
+        return self.client.get(reverse("trigger_report"), params).json()["report_id"]
+
+    def test_no_scheduled_report(self):
+        self.trigger_report()
+        response = self.client.get(reverse("get_report"))
+        self.assertEqual(response.status_code, 404)
+
+    def test_scheduled_report(self):
+        materialize_report.apply()
+        scheduled = Report.objects.get(scheduled=True)
+        self.assertEqual(scheduled.status, "Complete")
+        for params in ({}, {"report_id": "latest"}):
+            response = self.client.get(reverse("get_report"), params)
+            with ReportService.open_report_file(scheduled, compressed=False) as file:
+                self.assertEqual(b"".join(response.streaming_content), file.read())
+        # the reports of every store up to the latest poll are the scheduled one while it is fresh
+        self.assertEqual(self.trigger_report(), str(scheduled.report_id))
+        self.assertNotEqual(self.trigger_report(timezone="UTC"), str(scheduled.report_id))
+        with self.settings(REPORT_SCHEDULE_MAX_AGE=0):
+            self.assertNotEqual(self.trigger_report(), str(scheduled.report_id))
+        Report.objects.filter(pk=scheduled.pk).update(
+            generated_at=timezone.now() - datetime.timedelta(hours=2)
+        )
+        self.assertNotEqual(self.trigger_report(), str(scheduled.report_id))
+        # the latest scheduled report is served even once it is not fresh
+        materialize_report.apply()
+        latest = Report.objects.filter(scheduled=True).latest("generated_at")
+        self.assertNotEqual(latest.pk, scheduled.pk)
+        self.assertEqual(
+            self.client.get(reverse("get_report"))["Content-Disposition"],
+            f'attachment; filename="{latest.report_id}.csv"',
+        )
+
+
+class MetricsEndpointTest(FleetTestCase):
+    # a sample of the text exposition format: the metric name, its labels and its value
+    sample = re.compile(r'^([a-z_]+)(\{[a-z]+="[^"]*"(,[a-z]+="[^"]*")*\})? (\d+(\.\d+)?)$')
+
+    def scrape(self) -> dict:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("report_metrics"))
+        # the sum of the metrics is read from a single row, whatever the number of reports
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        samples = dict()
+        for line in response.content.decode().splitlines():
+            if line.startswith("# "):
+                self.assertRegex(line, r"^# (HELP|TYPE) [a-z_]+ ")
+                continue
+            match = self.sample.match(line)
+            self.assertIsNotNone(match, line)
+            samples[line.rsplit(" ", 1)[0]] = float(match.group(4))
+        return samples
+
+    def test_no_reports(self):
+        samples = self.scrape()
+        self.assertEqual(samples["report_generated_total"], 0)
+        self.assertEqual(samples["report_store_compute_seconds_count"], 0)
+
+    def test_computed_reports(self):
+        with self.settings(REPORT_SCHEDULE_MAX_AGE=0):
+            report_ids = [ReportService.start_report_generation() for _ in range(2)]
+            with self.settings(REPORT_CACHE=False):
+                report_ids.append(ReportService.start_report_generation())
+        reports = Report.objects.filter(report_id__in=report_ids).exclude(metrics={})
+        # the second report reused the file of the first one, it has no metrics of its own
+        self.assertEqual(len(reports), 2)
+        samples = self.scrape()
+        self.assertEqual(samples["report_generated_total"], 2)
+        for name in ("statuses", "stores_polled"):
+            self.assertEqual(
+                samples[f'report_rows_total{{kind="{name}"}}'],
+                sum(report.metrics["counts"][name] for report in reports),
+            )
+        self.assertEqual(samples['report_phase_seconds_count{phase="compute"}'], 2)
+        self.assertAlmostEqual(
+            samples['report_phase_seconds_sum{phase="compute"}'],
+            sum(report.metrics["phases"]["compute"] for report in reports),
+            places=5,
+        )
+        buckets = [
+            samples[f'report_store_compute_seconds_bucket{{le="{bound}"}}']
+            for bound in [*map(str, STORE_COMPUTE_BUCKETS), "+Inf"]
+        ]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], samples["report_store_compute_seconds_count"])
+        self.assertEqual(buckets[-1], 2 * len(FLEET))
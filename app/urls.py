@@ -5,4 +5,17 @@ from . import views
 urlpatterns = [
     path("trigger_report/", views.TriggerReportAPIView.as_view(), name="trigger_report"),
     path("get_report/", views.GetReportAPIView.as_view(), name="get_report"),
+    path(
+        "reports/<str:report_id>/download/",
+        views.DownloadReportAPIView.as_view(),
+        name="download_report",
+    ),
+    path(
+        "reports/<str:report_id>/profile/",
+        views.DownloadProfileAPIView.as_view(),
+        name="download_profile",
+    ),
+    path("reports/<str:report_id>/events/", views.report_events, name="report_events"),
+    path("metrics/", views.report_metrics, name="report_metrics"),
+    path("ingest_polls/", views.IngestPollsAPIView.as_view(), name="ingest_polls"),
 ]
\ No newline at end of file
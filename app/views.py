@@ -1,29 +1,419 @@
+import asyncio
+import json
+from typing import AsyncIterator, Mapping, Optional, Tuple
+
+import redis
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseNotModified,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from rest_framework import status
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .background.columnar import COLUMNAR_MEDIA_TYPES
+from .background.notifications import ReportSubscription
+from .background.profiling import PROFILE_FILES
+from .models import Report
 from .serializers import (
-    GetReportCompleteResponseSerializer,
     GetReportRunningResponseSerializer,
+    IngestPollsResponseSerializer,
+    TriggerReportRequestSerializer,
     TriggerReportResponseSerializer,
 )
-from .services import ReportService
+from .services import IngestService, ReportService
 
 
 class TriggerReportAPIView(APIView):
     def get(self, request):
-        report_id = ReportService.start_report_generation()
+        # optional filters of the stores and window of the report
+        params = TriggerReportRequestSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        report_id = ReportService.start_report_generation(**params.validated_data)
         serializer = TriggerReportResponseSerializer({"report_id": report_id})
         return Response(serializer.data)
 
 
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows a gzip response."""
+    for coding in accept_encoding.split(","):
+        name, _, quality = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            try:
+                return float(quality.strip().removeprefix("q=") or 1) > 0
+            except ValueError:
+                return False
+    return False
+
+
+def matches_etag(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header matches the etag, compared weakly."""
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def parse_byte_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    First and last byte of the single byte range of a Range header, None when the header is not one
+    and the whole file is sent. Raises ValueError when the range starts after the end of the file.
+    """
+    unit, _, byte_range = range_header.partition("=")
+    first, separator, last = (part.strip() for part in byte_range.strip().partition("-"))
+    if unit.strip().lower() != "bytes" or "," in byte_range or not separator:
+        return None
+    if not first.isdigit() and not (first == "" and last.isdigit()):
+        return None
+    if last and not last.isdigit():
+        return None
+    if not first:
+        # suffix range of the last bytes of the file
+        if not int(last):
+            raise ValueError("Empty suffix range")
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and start > end:
+        return None
+    if start >= size:
+        raise ValueError("Range starts after the end of the file")
+    return start, min(end, size - 1)
+
+
+def negotiate_report_format(accept: str, media_types: Mapping[str, str]) -> Optional[str]:
+    """
+    Format of a report the Accept header prefers among the given formats and their media types,
+    the most specific match winning ties, None when the header accepts none of them.
+    """
+    if not accept.strip():
+        return next(iter(media_types))
+    best, best_score = None, (0.0, 0)
+    for item in accept.split(","):
+        media_type, *params = [part.strip().lower() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        for format, format_media_type in media_types.items():
+            if media_type == format_media_type:
+                specificity = 2
+            elif media_type == format_media_type.split("/")[0] + "/*":
+                specificity = 1
+            elif media_type == "*/*":
+                specificity = 0
+            else:
+                continue
+            if quality > 0 and (quality, specificity) > best_score:
+                best, best_score = format, (quality, specificity)
+    return best
+
+
+def report_media_types(report: Report) -> Mapping[str, str]:
+    """Media types of the formats of a report, the csv first so that it is sent when all are accepted alike."""
+    return {
+        "csv": "text/csv",
+        **{format: COLUMNAR_MEDIA_TYPES[format] for format in report.columnar_files},
+    }
+
+
+def select_report_format(accept: str, media_types: Mapping[str, str]) -> Optional[str]:
+    """Format of a report to send for an Accept header, None when it accepts only formats the report lacks."""
+    report_format = negotiate_report_format(accept, media_types)
+    if report_format is None and not any(
+        media_type in accept.lower() for media_type in COLUMNAR_MEDIA_TYPES.values()
+    ):
+        # clients asking for other types, such as json, get the csv as they always did
+        return "csv"
+    return report_format
+
+
+def format_not_acceptable(media_types: Mapping[str, str]) -> Response:
+    return Response(
+        {
+            "detail": "Report is not available in the requested format",
+            "available": list(media_types.values()),
+        },
+        status=status.HTTP_406_NOT_ACCEPTABLE,
+    )
+
+
+class ReportContentNegotiation(DefaultContentNegotiation):
+    """Negotiation of the status responses, the formats of a complete report are negotiated by the view."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+
 class GetReportAPIView(APIView):
+    content_negotiation_class = ReportContentNegotiation
+
     def get(self, request):
         params = request.query_params
-        report = ReportService.test_report_generation(report_id=params.get("report_id"))
+        report_id = params.get("report_id", "latest")
+        if report_id == "latest":
+            # the latest scheduled report of every store, computed ahead of the requests
+            report = ReportService.get_latest_report()
+            if report is None:
+                return Response(
+                    {"detail": "No scheduled report is complete yet"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+        else:
+            report = ReportService.test_report_generation(report_id=report_id)
         # If the report is running, return only the status
         if report.status == "Running":
-            serializer = GetReportRunningResponseSerializer(report)
-        else:
-            # If the report is complete, return the status and the report data
-            serializer = GetReportCompleteResponseSerializer(report)
+            serializer = GetReportRunningResponseSerializer(
+                {"status": report.status, "progress": ReportService.get_report_progress(report)}
+            )
+            return Response(serializer.data)
+        if report.status == "Failed":
+            return Response(
+                {"status": report.status, "detail": "Report generation failed, trigger it again"}
+            )
+        media_types = report_media_types(report)
+        report_format = select_report_format(request.headers.get("Accept", ""), media_types)
+        if report_format is None:
+            return format_not_acceptable(media_types)
+        if report_format != "csv":
+            response = FileResponse(
+                ReportService.open_columnar_file(report, report_format),
+                content_type=media_types[report_format],
+                as_attachment=True,
+                filename=f"{report.report_id}.{report_format}",
+            )
+            response["Vary"] = "Accept"
+            return response
+        # If the report is complete, stream its csv file, as stored when the client accepts gzip
+        compressed = accepts_gzip(request.headers.get("Accept-Encoding", ""))
+        response = FileResponse(
+            ReportService.open_report_file(report, compressed=compressed),
+            content_type="text/csv",
+            as_attachment=True,
+            filename=f"{report.report_id}.csv",
+        )
+        if compressed:
+            response["Content-Encoding"] = "gzip"
+        response["Vary"] = "Accept, Accept-Encoding"
+        return response
+
+
+class IngestPollsAPIView(APIView):
+    # content types of the poll formats, the body is streamed instead of parsed at once
+    formats = {"text/csv": "csv", "application/x-ndjson": "ndjson"}
+
+    def post(self, request):
+        poll_format = self.formats.get(request.content_type.split(";")[0].strip())
+        if poll_format is None:
+            return Response(
+                {"detail": f"Content type must be one of {', '.join(self.formats)}"},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        # rest framework streams only the bodies of a known length, a chunked upload without
+        # Content-Length is read line by line with the file interface of the django request,
+        # which rest framework proxies
+        chunked = "CONTENT_LENGTH" not in request.META
+        stream = iter(request.readline, b"") if chunked else request.stream
+        if stream is None:
+            return Response(
+                {"detail": "Empty request body"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            counts = IngestService.ingest_polls(stream, poll_format)
+        except ValueError as error:
+            # the batches before the invalid poll are written, sending them again is safe
+            return Response({"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        if chunked and not counts["received"]:
+            # a WSGI server passes no more of the body than its Content-Length
+            return Response(
+                {"detail": "Content-Length is required by this server"},
+                status=status.HTTP_411_LENGTH_REQUIRED,
+            )
+        serializer = IngestPollsResponseSerializer(counts)
         return Response(serializer.data)
+
+
+class DownloadReportAPIView(APIView):
+    content_negotiation_class = ReportContentNegotiation
+    # size of the chunks streamed from the reports storage
+    chunk_size = 64 * 1024
+
+    def get(self, request, report_id):
+        try:
+            report = ReportService.test_report_generation(report_id=report_id)
+        except Report.DoesNotExist:
+            return Response({"detail": "Report not found"}, status=status.HTTP_404_NOT_FOUND)
+        if report.status != "Complete":
+            return Response(
+                {"detail": "Report is not complete", "status": report.status},
+                status=status.HTTP_409_CONFLICT,
+            )
+        media_types = report_media_types(report)
+        report_format = select_report_format(request.headers.get("Accept", ""), media_types)
+        if report_format is None:
+            return format_not_acceptable(media_types)
+        compressed = False
+        if report_format == "csv":
+            # the stored gzip file and the csv are two representations with their own etag and length
+            compressed = accepts_gzip(request.headers.get("Accept-Encoding", ""))
+            etag = f'"{report.checksum}-gzip"' if compressed else f'"{report.checksum}"'
+            size = report.file_size if compressed else report.content_size
+        else:
+            # the columnar files are written from the same columns as the csv, so its checksum identifies them too
+            etag = f'"{report.checksum}-{report_format}"'
+            size = ReportService.get_columnar_file_size(report, report_format)
+        headers = {"ETag": etag, "Accept-Ranges": "bytes", "Vary": "Accept, Accept-Encoding"}
+        if matches_etag(request.headers.get("If-None-Match", ""), etag):
+            return HttpResponseNotModified(headers=headers)
+        byte_range = None
+        # a range is served only if the client still has the same version of the report
+        if "Range" in request.headers and request.headers.get("If-Range", etag) == etag:
+            try:
+                byte_range = parse_byte_range(request.headers["Range"], size)
+            except ValueError:
+                return Response(
+                    {"detail": "Range not satisfiable"},
+                    status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                    headers={**headers, "Content-Range": f"bytes */{size}"},
+                )
+        start, end = byte_range or (0, size - 1)
+        if report_format == "csv":
+            chunks = ReportService.iter_report_file(
+                report, compressed=compressed, start=start, end=end, chunk_size=self.chunk_size
+            )
+        else:
+            chunks = ReportService.iter_columnar_file(
+                report, report_format, start=start, end=end, chunk_size=self.chunk_size
+            )
+        response = StreamingHttpResponse(
+            chunks,
+            status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+            content_type=media_types[report_format],
+            headers={
+                **headers,
+                "Content-Length": str(end - start + 1),
+                "Content-Disposition": f'attachment; filename="{report.report_id}.{report_format}"',
+            },
+        )
+        if byte_range:
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        if compressed:
+            response["Content-Encoding"] = "gzip"
+        return response
+
+
+class DownloadProfileAPIView(APIView):
+    def get(self, request, report_id):
+        try:
+            report = ReportService.test_report_generation(report_id=report_id)
+        except Report.DoesNotExist:
+            return Response({"detail": "Report not found"}, status=status.HTTP_404_NOT_FOUND)
+        if report.status != "Complete":
+            return Response(
+                {"detail": "Report is not complete", "status": report.status},
+                status=status.HTTP_409_CONFLICT,
+            )
+        if not report.profile_path:
+            return Response(
+                {"detail": "Report was not profiled"}, status=status.HTTP_404_NOT_FOUND
+            )
+        suffix = report.profile_path.rsplit(".", 1)[-1]
+        content_type = dict(PROFILE_FILES.values()).get(suffix, "application/octet-stream")
+        return FileResponse(
+            ReportService.open_profile_file(report),
+            content_type=content_type,
+            as_attachment=True,
+            filename=f"{report.report_id}.{suffix}",
+        )
+
+
+def report_metrics(request):
+    """Timings and row counts of the generated reports, in the Prometheus text format."""
+    return HttpResponse(
+        ReportService.render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+# statuses a report does not leave, the events of its status end with them
+REPORT_FINAL_STATUSES = ("Complete", "Failed")
+
+
+def format_event(data: Mapping[str, str]) -> str:
+    return f"event: status\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_report_events(
+    subscription: Optional[ReportSubscription], data: Mapping[str, str], timeout: float
+) -> AsyncIterator[str]:
+    """Server-sent events of the status of a report until it completes or fails, or the timeout is reached."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        yield format_event(data)
+        while (
+            subscription is not None
+            and data["status"] not in REPORT_FINAL_STATUSES
+            and (remaining := deadline - loop.time()) > 0
+        ):
+            message = await subscription.get(min(remaining, settings.REPORT_EVENTS_KEEPALIVE))
+            if message is None:
+                # a comment keeps the idle connection open through proxies
+                yield ": keep-alive\n\n"
+            else:
+                data = message
+                yield format_event(data)
+    finally:
+        if subscription is not None:
+            await subscription.close()
+
+
+async def report_events(request, report_id):
+    """
+    Wait for a report to complete, notified through redis instead of polling the database:
+    server-sent events when the client accepts text/event-stream, otherwise a long-poll answered
+    as soon as the report completes or fails, or the timeout is reached.
+    """
+    try:
+        timeout = min(
+            float(request.GET.get("timeout", settings.REPORT_EVENTS_TIMEOUT)),
+            settings.REPORT_EVENTS_TIMEOUT,
+        )
+    except ValueError:
+        return JsonResponse({"detail": "Invalid timeout"}, status=status.HTTP_400_BAD_REQUEST)
+    subscription = ReportSubscription(report_id)
+    try:
+        # subscribing before reading the status, so that a completion in between is not missed
+        await subscription.open()
+    except redis.RedisError:
+        # without notifications the current status is returned and the client asks again
+        subscription = None
+    report = await Report.objects.filter(report_id=report_id).afirst()
+    if report is None:
+        if subscription is not None:
+            await subscription.close()
+        return JsonResponse({"detail": "Report not found"}, status=status.HTTP_404_NOT_FOUND)
+    data = {"report_id": report.report_id, "status": report.status}
+    if "text/event-stream" in request.headers.get("Accept", ""):
+        return StreamingHttpResponse(
+            stream_report_events(subscription, data, timeout),
+            content_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    if subscription is not None:
+        try:
+            if data["status"] not in REPORT_FINAL_STATUSES:
+                data = await subscription.get(timeout) or data
+        finally:
+            await subscription.close()
+    return JsonResponse(data)
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -124,11 +126,118 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+
+# Storages
+# https://docs.djangoproject.com/en/5.1/ref/settings/#storages
+
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", BASE_DIR / "media")
+
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+    # generated reports, any django storage backend such as an object store can be configured
+    "reports": {
+        "BACKEND": os.environ.get(
+            "REPORT_STORAGE_BACKEND", "django.core.files.storage.FileSystemStorage"
+        ),
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://localhost:6379/1",
+    }
+}
+
+
 # Celery settings
 CELERY_BROKER_URL = "redis://localhost:6379/0"
+# the result backend collects the results of the chunk tasks of distributed reports
+CELERY_RESULT_BACKEND = "redis://localhost:6379/0"
+# run by celery beat: the daily partitions of the polls created ahead and the expired ones dropped, every hour,
+# once the table is partitioned by the partition_polls command
+CELERY_BEAT_SCHEDULE = {
+    "manage-poll-partitions": {
+        "task": "app.background.tasks.manage_poll_partitions",
+        "schedule": 3600.0,
+    },
+}
+
+
+# Report settings
+# engine computing the uptime and downtime of the stores: "vectorized", "tick", "sweep" or "sql"
+REPORT_ENGINE = os.environ.get("REPORT_ENGINE", "vectorized")
+# number of processes the stores are sharded over while generating a report, 1 computes them serially
+REPORT_SHARDS = int(os.environ.get("REPORT_SHARDS", 1))
+# split each report into chunks of stores computed by separate tasks across the worker nodes
+REPORT_DISTRIBUTED = os.environ.get("REPORT_DISTRIBUTED", "false").lower() == "true"
+# number of stores in each chunk of a distributed report
+REPORT_CHUNK_SIZE = int(os.environ.get("REPORT_CHUNK_SIZE", 1000))
+# number of statuses fetched from the database per query while streaming them into a report
+REPORT_STATUS_CHUNK_SIZE = int(os.environ.get("REPORT_STATUS_CHUNK_SIZE", 10000))
+# number of stores computed together by the vectorized and sweep engines
+REPORT_BATCH_SIZE = int(os.environ.get("REPORT_BATCH_SIZE", 2000))
+# sum the days closed before the last day of the report from persisted daily rollups
+REPORT_INCREMENTAL = os.environ.get("REPORT_INCREMENTAL", "false").lower() == "true"
+# seconds the timestamp of the latest poll stays cached before it is read again from its watermark row
+REPORT_WATERMARK_CACHE_TIMEOUT = int(os.environ.get("REPORT_WATERMARK_CACHE_TIMEOUT", 300))
+# number of polls written by each multi-row upsert while ingesting a batch of polls
+POLL_INGEST_BATCH_SIZE = int(os.environ.get("POLL_INGEST_BATCH_SIZE", 5000))
+# days of polls kept before the latest poll, older days are dropped with their partitions,
+# unset keeps every poll
+POLL_RETENTION_DAYS = (
+    int(os.environ["POLL_RETENTION_DAYS"]) if os.environ.get("POLL_RETENTION_DAYS") else None
+)
+# days of partitions of the polls created ahead of the current day
+POLL_PARTITIONS_AHEAD = int(os.environ.get("POLL_PARTITIONS_AHEAD", 3))
+# compute the reports of the latest poll from the online uptime state of each store, updated as polls are ingested
+REPORT_ONLINE = os.environ.get("REPORT_ONLINE", "false").lower() == "true"
+# reuse the report of the same polls and store data, and merge the reports triggered while it is computed
+REPORT_CACHE = os.environ.get("REPORT_CACHE", "true").lower() == "true"
+# seconds a report computed for the reports triggered with the same data is waited for
+REPORT_INFLIGHT_TIMEOUT = int(os.environ.get("REPORT_INFLIGHT_TIMEOUT", 3600))
+# seconds between the updates of the progress of a report published to the cache
+REPORT_PROGRESS_INTERVAL = float(os.environ.get("REPORT_PROGRESS_INTERVAL", 1))
+# redis the completion of the reports is published to, for the clients waiting on their events
+REPORT_EVENTS_REDIS_URL = os.environ.get("REPORT_EVENTS_REDIS_URL", "redis://localhost:6379/0")
+# longest wait, in seconds, of a long-poll or server-sent events request for a report
+REPORT_EVENTS_TIMEOUT = int(os.environ.get("REPORT_EVENTS_TIMEOUT", 60))
+# seconds between the keep-alive comments of an idle server-sent events stream
+REPORT_EVENTS_KEEPALIVE = int(os.environ.get("REPORT_EVENTS_KEEPALIVE", 15))
+# seconds between the stacks recorded by the sampling profiler of a profiled report
+REPORT_PROFILE_INTERVAL = float(os.environ.get("REPORT_PROFILE_INTERVAL", 0.005))
+# columnar formats written next to the csv of each report when pyarrow is installed: "parquet", "arrow"
+REPORT_COLUMNAR_FORMATS = os.environ.get("REPORT_COLUMNAR_FORMATS", "parquet,arrow")
+# number of business hour windows converted to utc kept in the cache of each process
+REPORT_WINDOW_CACHE_SIZE = int(os.environ.get("REPORT_WINDOW_CACHE_SIZE", 65536))
+# crontab, as "minute hour day month weekday", of the report of every store computed ahead of the requests
+# by celery beat, a few minutes past the hourly ingest by default, empty for none
+REPORT_SCHEDULE = os.environ.get("REPORT_SCHEDULE", "5 * * * *")
+# seconds the latest scheduled report is returned by trigger_report instead of computing a new one, 0 for never
+REPORT_SCHEDULE_MAX_AGE = int(os.environ.get("REPORT_SCHEDULE_MAX_AGE", 3600))
+if REPORT_SCHEDULE:
+    CELERY_BEAT_SCHEDULE["materialize-report"] = {
+        "task": "app.background.tasks.materialize_report",
+        "schedule": crontab(
+            **dict(
+                zip(
+                    ["minute", "hour", "day_of_month", "month_of_year", "day_of_week"],
+                    REPORT_SCHEDULE.split(),
+                )
+            )
+        ),
+    }
@@ -0,0 +1,33 @@
+"""
+Django settings for the report benchmarks, run with
+
+    python manage.py benchmark_report --settings=config.settings_bench
+
+The synthetic fleets are written to SQLite, in memory unless BENCH_DB names a file,
+so the benchmarks need neither MySQL nor Redis.
+"""
+
+from .settings import *  # noqa: F401,F403
+import os
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ.get("BENCH_DB", ":memory:"),
+    }
+}
+
+# the tables of the app are created from its models, without loading data/ as its migrations do
+MIGRATION_MODULES = {"app": None}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# every report is computed, none is reused from an earlier run
+REPORT_CACHE = False
+
+# the benchmark deletes the stores and polls of the database, it refuses to run with any other settings
+REPORT_BENCHMARK = True
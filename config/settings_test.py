@@ -0,0 +1,36 @@
+"""
+Django settings for the tests, run with
+
+    python manage.py test --settings=config.settings_test
+
+The tests run on an in-memory SQLite database with the report tasks run in the test process,
+so they need neither MySQL, Redis nor a Celery worker.
+"""
+
+from .settings import *  # noqa: F401,F403
+import tempfile
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    }
+}
+
+# the tables of the app are created from its models, without loading data/ as its migrations do,
+# the data migrations are run on seeded rows by test_migrations
+MIGRATION_MODULES = {"app": None}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# the reports are written to a directory of their own, removed with the temporary files of the system
+MEDIA_ROOT = tempfile.mkdtemp(prefix="store-monitoring-tests-")
+
+# the tasks run in the process that sends them, and their errors are raised there
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_BEAT_SCHEDULE = {}
@@ -30,19 +30,24 @@ def get_report(report_id: str) -> None:
     path = f"get_report/?report_id={report_id}"
     start_time = time.time()
     while True:
-        time.sleep(5)  # Setting the polling interval as 5 seconds
+        # Waiting for the report to complete, the server answers as soon as it is done
+        wait_start = time.time()
+        wait = requests.get(URL + f"reports/{report_id}/events/")
+        completed = wait.status_code == 200 and wait.json()["status"] == "Complete"
+        if not completed and time.time() - wait_start < 1:
+            time.sleep(5)  # Falling back to polling every 5 seconds without notifications
         response = requests.get(URL + path)
         if response.status_code == 200:
+            # If the report is complete, its csv file is streamed, print the report data
+            if response.headers.get("Content-Type", "").startswith("text/csv"):
+                df = pd.read_csv(io.StringIO(response.text))
+                df.to_csv("report.csv", index=False)
+                print(df)
+                break
             try:
                 parsed_data = json.loads(response.text)
-                # If the report is complete, print the report data
-                if parsed_data["status"] == "Complete":
-                    df = pd.read_csv(io.StringIO(parsed_data["report"]))
-                    df.to_csv("report.csv", index=False)
-                    print(df)
-                    break
                 # If the report is still running, print the time elapsed
-                elif parsed_data["status"] == "Running":
+                if parsed_data["status"] == "Running":
                     print(
                         "Report is still running. Time elapsed: %d s"
                         % int(time.time() - start_time),